@@ -1,41 +1,44 @@
+import argparse
 import csv
 import json
 import time
 import os
-import requests
-import urllib.parse
-import re  # Ensure re is imported for regex use
+from concurrent.futures import ThreadPoolExecutor
 from selenium import webdriver
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.options import Options
 from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
-from selenium.common.exceptions import TimeoutException, NoSuchElementException, StaleElementReferenceException
+from selenium.common.exceptions import (
+    TimeoutException, NoSuchElementException, StaleElementReferenceException, WebDriverException
+)
 from webdriver_manager.chrome import ChromeDriverManager
 from bs4 import BeautifulSoup
-
-def clean_text(text):
-    """
-    Clean and normalize text by removing excessive whitespace, newlines, and tabs.
-    
-    Args:
-        text: The text to clean
-        
-    Returns:
-        Cleaned text with normalized whitespace
-    """
-    if not text:
-        return ""
-        
-    # Replace newlines and tabs with spaces
-    text = text.replace('\n', ' ').replace('\t', ' ')
-    
-    # Replace multiple spaces with a single space using regex
-    text = re.sub(r'\s+', ' ', text)
-    
-    # Strip leading/trailing whitespace
-    return text.strip()
+from output_sinks import CrawlSinks, InstallerRecord, MediaRecord, ReviewRecord
+from sqlite_store import SQLiteStore, has_installers
+from search_index import SearchIndex
+from rate_limiter import DEFAULT_LIMITER
+from fetch_policy import DEFAULT_POLICY, FetchError, fetch, navigate
+from image_derivatives import attach_derivatives, thumbnails_column, with_real_extension
+from perceptual_hash import flag_near_duplicates
+from supplier_ids import SupplierIdMap, extract_supplier_id, legacy_scope
+from crawl_frontier import CrawlFrontier, CrawlState
+from columnar_export import parse_review_date
+from review_sync import ReviewSyncState, review_fingerprint as make_review_fingerprint
+from scrape_installers import create_driver
+from work_queue import DEFAULT_VISIBILITY_TIMEOUT, WorkQueue, default_worker_id
+from review_parser import (
+    clean_text, find_review_container, find_review_items, pagination_api_urls, parse_aggregate_rating,
+    parse_review_item, parse_review_total
+)
+from review_gaps import ReviewGapLog
+from reparse import iter_reparsed_details
+from selector_registry import DEFAULT_SELECTORS
+from profile_parser import (
+    absolute_url, find_gallery_elements, parse_gallery_element, parse_installer_profile, profile_company_name
+)
+from page_archive import DEFAULT_ARCHIVE_DIR, archive_page, close_archive, enable_archive
 
 def scrape_installer_gallery(driver, company_id, company_name):
     """
@@ -73,16 +76,10 @@ def scrape_installer_gallery(driver, company_id, company_name):
             print(f"Found gallery button: {gallery_button.get_attribute('href')}")
             
             # Get the href attribute instead of clicking to avoid potential navigation issues
-            gallery_url = gallery_button.get_attribute('href')
-            
-            # If the URL is relative, make it absolute
-            if gallery_url.startswith('/'):
-                parsed_url = urllib.parse.urlparse(driver.current_url)
-                base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                gallery_url = base_url + gallery_url
+            gallery_url = absolute_url(gallery_button.get_attribute('href'), driver.current_url)
             
             print(f"Navigating to gallery page: {gallery_url}")
-            driver.get(gallery_url)
+            navigate(driver, gallery_url)
             
             # Wait for gallery page to load
             WebDriverWait(driver, 15).until(
@@ -93,29 +90,11 @@ def scrape_installer_gallery(driver, company_id, company_name):
             
             # Parse the gallery page with BeautifulSoup
             gallery_source = driver.page_source
+            archive_page(gallery_url, gallery_source, 'gallery')
             gallery_soup = BeautifulSoup(gallery_source, 'html.parser')
             
             # Find all image and video elements in the gallery
-            media_elements = []
-            
-            # Find images
-            img_elements = gallery_soup.select('div.gallery img, div.photo-gallery img, img.gallery-image')
-            if not img_elements:
-                # Try alternative selectors if the specific ones don't work
-                img_elements = gallery_soup.select('img[src*="gallery"], img[src*="photo"]')
-            if not img_elements:
-                # Last resort: get all images on the page
-                img_elements = gallery_soup.select('img[src]')
-            
-            # Find video elements or links to videos
-            video_elements = gallery_soup.select('video, iframe[src*="youtube"], iframe[src*="vimeo"], a[href*="youtube"], a[href*="vimeo"]')
-            
-            # Add media elements to the list with their type
-            for img in img_elements:
-                media_elements.append({"element": img, "type": "image"})
-            
-            for video in video_elements:
-                media_elements.append({"element": video, "type": "video"})
+            media_elements = find_gallery_elements(gallery_soup)
             
             print(f"Found {len(media_elements)} potential media items in the gallery")
             
@@ -124,253 +103,163 @@ def scrape_installer_gallery(driver, company_id, company_name):
             
             # Process and download each media item
             for index, media_item in enumerate(media_elements):
-                element = media_item["element"]
-                media_type = media_item["type"]
+                media = parse_gallery_element(media_item["element"], media_item["type"], driver.current_url)
+                if media is None:
+                    if media_item["type"] == "image":
+                        print(f"No source URL found for image {index+1}, skipping")
+                    continue
                 
                 # Generate a unique ID for the media
                 # Format: company_id + timestamp + index
                 media_id = f"{company_id}_{int(time.time())}_{index+1}"
                 
-                # Process based on media type
-                if media_type == "image":
-                    # Process image
-                    img_url = element.get('src') or element.get('data-src')
+                if media["type"] == "video" and media["from_thumbnail"]:
+                    # A YouTube thumbnail: it's a video, not an image - create video metadata
+                    video_id = media["video_id"]
+                    img_url = media["thumbnail_url"]
+                    video_filename = f"{media_id}_youtube_{video_id}.jpg"  # Still save the thumbnail
+                    video_path = os.path.join(videos_folder, video_filename)
                     
-                    if not img_url:
-                        print(f"No source URL found for image {index+1}, skipping")
-                        continue
+                    try:
+                        # Download the thumbnail
+                        print(f"Downloading video thumbnail {index+1} (ID: {media_id}): {img_url}")
+                        response = fetch(img_url, stream=True, timeout=10)
+                        
+                        if response.status_code == 200:
+                            # Calculate a simple hash to detect duplicates
+                            content = response.content
+                            content_hash = hash(content)
+                            
+                            if content_hash in media_hashes:
+                                print(f"Skipping duplicate video {index+1}")
+                                continue
+                            
+                            media_hashes.add(content_hash)
+                            
+                            with open(video_path, 'wb') as img_file:
+                                img_file.write(content)
+                            
+                            print(f"Successfully saved video thumbnail to {video_path}")
+                            
+                            # Store video information
+                            video_info = {
+                                'id': media_id,
+                                'type': 'video',
+                                'platform': media["platform"],
+                                'video_id': video_id,
+                                'video_url': media["video_url"],
+                                'thumbnail_url': img_url,
+                                'thumbnail_path': video_path,
+                                'filename': video_filename
+                            }
+                            downloaded_media.append(video_info)
+                        else:
+                            print(f"Failed to download video thumbnail {index+1}: HTTP status {response.status_code}")
                     
-                    # Make relative URLs absolute
-                    if img_url.startswith('/'):
-                        parsed_url = urllib.parse.urlparse(driver.current_url)
-                        base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                        img_url = base_url + img_url
+                    except Exception as e:
+                        print(f"Error downloading video thumbnail {index+1}: {e}")
+                
+                elif media["type"] == "image":
+                    img_url = media["url"]
                     
-                    # Check if this is actually a video thumbnail (e.g., YouTube)
-                    is_youtube_thumbnail = False
-                    video_id = None
-                    video_platform = None
-                    video_url = None
+                    # Extract a descriptive part from the URL for the filename if possible
+                    url_parts = img_url.split('/')
+                    file_part = url_parts[-1].split('?')[0]  # Remove any query parameters
                     
-                    # YouTube thumbnail detection
-                    youtube_patterns = [
-                        r'img\.youtube\.com/vi/([^/]+)/',  # Standard YouTube thumbnail URL
-                        r'i\.ytimg\.com/vi/([^/]+)/'       # Alternative YouTube thumbnail URL
-                    ]
+                    # If the URL doesn't provide a meaningful name, use the ID
+                    if len(file_part) > 5 and '.' in file_part:
+                        # Use the original file name part; the extension is fixed up from the content below
+                        base_name = file_part.rsplit('.', 1)[0]
+                        img_filename = f"{media_id}_{base_name}.jpg"
+                    else:
+                        img_filename = f"{media_id}.jpg"
                     
-                    for pattern in youtube_patterns:
-                        match = re.search(pattern, img_url)
-                        if match:
-                            is_youtube_thumbnail = True
-                            video_id = match.group(1)
-                            video_platform = "youtube"
-                            video_url = f"https://www.youtube.com/watch?v={video_id}"
-                            print(f"Detected YouTube video (ID: {video_id}) from thumbnail: {img_url}")
-                            break
+                    img_path = os.path.join(images_folder, img_filename)
                     
-                    if is_youtube_thumbnail:
-                        # It's a video, not an image - create video metadata
-                        video_filename = f"{media_id}_youtube_{video_id}.jpg"  # Still save the thumbnail
-                        video_path = os.path.join(videos_folder, video_filename)
+                    try:
+                        # Download the image
+                        print(f"Downloading image {index+1} (ID: {media_id}): {img_url}")
+                        response = fetch(img_url, stream=True, timeout=10)
                         
-                        try:
-                            # Download the thumbnail
-                            print(f"Downloading video thumbnail {index+1} (ID: {media_id}): {img_url}")
-                            response = requests.get(img_url, stream=True, timeout=10)
+                        if response.status_code == 200:
+                            # Calculate a simple hash of the image data to detect duplicates
+                            content = response.content
+                            content_hash = hash(content)
                             
-                            if response.status_code == 200:
-                                # Calculate a simple hash to detect duplicates
-                                content = response.content
-                                content_hash = hash(content)
-                                
-                                if content_hash in media_hashes:
-                                    print(f"Skipping duplicate video {index+1}")
-                                    continue
-                                
-                                media_hashes.add(content_hash)
-                                
-                                with open(video_path, 'wb') as img_file:
-                                    img_file.write(content)
-                                
-                                print(f"Successfully saved video thumbnail to {video_path}")
-                                
-                                # Store video information
-                                video_info = {
-                                    'id': media_id,
-                                    'type': 'video',
-                                    'platform': video_platform,
-                                    'video_id': video_id,
-                                    'video_url': video_url,
-                                    'thumbnail_url': img_url,
-                                    'thumbnail_path': video_path,
-                                    'filename': video_filename
-                                }
-                                downloaded_media.append(video_info)
-                            else:
-                                print(f"Failed to download video thumbnail {index+1}: HTTP status {response.status_code}")
-                        
-                        except Exception as e:
-                            print(f"Error downloading video thumbnail {index+1}: {e}")
+                            if content_hash in media_hashes:
+                                print(f"Skipping duplicate image {index+1}")
+                                continue
                             
-                    else:
-                        # It's a regular image
-                        # Skip tiny thumbnails or icons
-                        if 'icon' in img_url.lower() or 'thumb' in img_url.lower():
-                            # Try to find a larger version
-                            data_full = element.get('data-full') or element.parent.get('href')
-                            if data_full:
-                                if data_full.startswith('/'):
-                                    parsed_url = urllib.parse.urlparse(driver.current_url)
-                                    base_url = f"{parsed_url.scheme}://{parsed_url.netloc}"
-                                    img_url = base_url + data_full
-                                else:
-                                    img_url = data_full
-                        
-                        # Extract a descriptive part from the URL for the filename if possible
-                        url_parts = img_url.split('/')
-                        file_part = url_parts[-1].split('?')[0]  # Remove any query parameters
-                        
-                        # If the URL doesn't provide a meaningful name, use the ID
-                        if len(file_part) > 5 and '.' in file_part:
-                            # Use the original file name part but ensure it ends with .jpg
-                            base_name = file_part.rsplit('.', 1)[0]
-                            img_filename = f"{media_id}_{base_name}.jpg"
+                            media_hashes.add(content_hash)
+                            
+                            # Save under the extension of the real format (galleries serve PNG and WebP too)
+                            img_path = with_real_extension(img_path, content)
+                            img_filename = os.path.basename(img_path)
+                            
+                            with open(img_path, 'wb') as img_file:
+                                img_file.write(content)
+                            
+                            print(f"Successfully saved image to {img_path}")
+                            
+                            # Store image information including ID, URL and local path
+                            image_info = {
+                                'id': media_id,
+                                'type': 'image',
+                                'url': img_url,
+                                'path': img_path,
+                                'filename': img_filename
+                            }
+                            downloaded_media.append(image_info)
                         else:
-                            img_filename = f"{media_id}.jpg"
-                        
-                        img_path = os.path.join(images_folder, img_filename)
-                        
+                            print(f"Failed to download image {index+1}: HTTP status {response.status_code}")
+                    
+                    except Exception as e:
+                        print(f"Error downloading image {index+1}: {e}")
+                
+                else:
+                    # A video element or link
+                    video_platform = media["platform"]
+                    video_id = media["video_id"]
+                    video_url = media["video_url"]
+                    thumbnail_url = media["thumbnail_url"]
+                    print(f"Found {video_platform} video (ID: {video_id}): {video_url}")
+                    
+                    # Generate a unique filename for the video
+                    video_filename = f"{media_id}_{video_platform}_{video_id}.jpg"  # For the thumbnail
+                    video_path = os.path.join(videos_folder, video_filename)
+                    
+                    # Try to download the thumbnail if available
+                    if thumbnail_url:
                         try:
-                            # Download the image
-                            print(f"Downloading image {index+1} (ID: {media_id}): {img_url}")
-                            response = requests.get(img_url, stream=True, timeout=10)
+                            print(f"Downloading video thumbnail for {video_platform} video {index+1} (ID: {media_id})")
+                            response = fetch(thumbnail_url, stream=True, timeout=10)
                             
                             if response.status_code == 200:
-                                # Calculate a simple hash of the image data to detect duplicates
-                                content = response.content
-                                content_hash = hash(content)
-                                
-                                if content_hash in media_hashes:
-                                    print(f"Skipping duplicate image {index+1}")
-                                    continue
+                                # Save the thumbnail
+                                with open(video_path, 'wb') as thumb_file:
+                                    thumb_file.write(response.content)
                                 
-                                media_hashes.add(content_hash)
-                                
-                                with open(img_path, 'wb') as img_file:
-                                    img_file.write(content)
-                                
-                                print(f"Successfully saved image to {img_path}")
-                                
-                                # Store image information including ID, URL and local path
-                                image_info = {
-                                    'id': media_id,
-                                    'type': 'image',
-                                    'url': img_url,
-                                    'path': img_path,
-                                    'filename': img_filename
-                                }
-                                downloaded_media.append(image_info)
+                                print(f"Successfully saved video thumbnail to {video_path}")
                             else:
-                                print(f"Failed to download image {index+1}: HTTP status {response.status_code}")
-                        
+                                print(f"Failed to download video thumbnail: HTTP status {response.status_code}")
+                                # If we can't download the thumbnail, we still want to record the video
+                                video_path = None
                         except Exception as e:
-                            print(f"Error downloading image {index+1}: {e}")
-                
-                elif media_type == "video":
-                    # Process video element
-                    video_url = None
-                    video_id = None
-                    video_platform = None
-                    
-                    # Check if it's an iframe
-                    if element.name == 'iframe':
-                        src = element.get('src', '')
-                        if 'youtube' in src:
-                            # Extract YouTube video ID
-                            youtube_id_match = re.search(r'(?:embed|v)/([^/?]+)', src)
-                            if youtube_id_match:
-                                video_id = youtube_id_match.group(1)
-                                video_platform = "youtube"
-                                video_url = f"https://www.youtube.com/watch?v={video_id}"
-                        elif 'vimeo' in src:
-                            # Extract Vimeo video ID
-                            vimeo_id_match = re.search(r'video/(\d+)', src)
-                            if vimeo_id_match:
-                                video_id = vimeo_id_match.group(1)
-                                video_platform = "vimeo"
-                                video_url = f"https://vimeo.com/{video_id}"
-                    
-                    # Check if it's a link
-                    elif element.name == 'a':
-                        href = element.get('href', '')
-                        if 'youtube' in href or 'youtu.be' in href:
-                            # Extract YouTube video ID
-                            if 'youtu.be' in href:
-                                youtube_id_match = re.search(r'youtu\.be/([^/?]+)', href)
-                            else:
-                                youtube_id_match = re.search(r'(?:v=|v/|embed/|youtu\.be/)([^/?&]+)', href)
-                            
-                            if youtube_id_match:
-                                video_id = youtube_id_match.group(1)
-                                video_platform = "youtube"
-                                video_url = f"https://www.youtube.com/watch?v={video_id}"
-                        elif 'vimeo' in href:
-                            # Extract Vimeo video ID
-                            vimeo_id_match = re.search(r'vimeo\.com/(\d+)', href)
-                            if vimeo_id_match:
-                                video_id = vimeo_id_match.group(1)
-                                video_platform = "vimeo"
-                                video_url = f"https://vimeo.com/{video_id}"
+                            print(f"Error downloading video thumbnail: {e}")
+                            video_path = None
                     
-                    # If we found a video, process it
-                    if video_id and video_platform:
-                        print(f"Found {video_platform} video (ID: {video_id}): {video_url}")
-                        
-                        # Generate a unique filename for the video
-                        video_filename = f"{media_id}_{video_platform}_{video_id}.jpg"  # For the thumbnail
-                        video_path = os.path.join(videos_folder, video_filename)
-                        
-                        # Construct thumbnail URL
-                        thumbnail_url = None
-                        if video_platform == "youtube":
-                            thumbnail_url = f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
-                        elif video_platform == "vimeo":
-                            # For Vimeo, getting thumbnails directly requires an API call
-                            # For simplicity, we'll just store the video URL for now
-                            thumbnail_url = f"https://vimeo.com/api/v2/video/{video_id}/pictures"
-                        
-                        # Try to download the thumbnail if available
-                        if thumbnail_url:
-                            try:
-                                print(f"Downloading video thumbnail for {video_platform} video {index+1} (ID: {media_id})")
-                                response = requests.get(thumbnail_url, stream=True, timeout=10)
-                                
-                                if response.status_code == 200:
-                                    # Save the thumbnail
-                                    with open(video_path, 'wb') as thumb_file:
-                                        thumb_file.write(response.content)
-                                    
-                                    print(f"Successfully saved video thumbnail to {video_path}")
-                                else:
-                                    print(f"Failed to download video thumbnail: HTTP status {response.status_code}")
-                                    # If we can't download the thumbnail, we still want to record the video
-                                    video_path = None
-                            except Exception as e:
-                                print(f"Error downloading video thumbnail: {e}")
-                                video_path = None
-                        
-                        # Store video information
-                        video_info = {
-                            'id': media_id,
-                            'type': 'video',
-                            'platform': video_platform,
-                            'video_id': video_id,
-                            'video_url': video_url,
-                            'thumbnail_url': thumbnail_url,
-                            'thumbnail_path': video_path,
-                            'filename': video_filename if video_path else None
-                        }
-                        downloaded_media.append(video_info)
+                    # Store video information
+                    video_info = {
+                        'id': media_id,
+                        'type': 'video',
+                        'platform': video_platform,
+                        'video_id': video_id,
+                        'video_url': video_url,
+                        'thumbnail_url': thumbnail_url,
+                        'thumbnail_path': video_path,
+                        'filename': video_filename if video_path else None
+                    }
+                    downloaded_media.append(video_info)
             
             # Report results
             image_count = sum(1 for item in downloaded_media if item['type'] == 'image')
@@ -379,6 +268,12 @@ def scrape_installer_gallery(driver, company_id, company_name):
             if downloaded_media:
                 print(f"Successfully processed {len(downloaded_media)} media items: {image_count} images and {video_count} videos")
                 
+                # Flag re-encoded or resized copies of photos already seen for any installer
+                flag_near_duplicates(downloaded_media, company_id)
+                
+                # Web-ready thumbnails, made in a process pool; dimensions and sizes go into the metadata
+                attach_derivatives(downloaded_media)
+                
                 # Save a metadata file with all media information
                 metadata_file = os.path.join(company_folder, "media_metadata.json")
                 with open(metadata_file, 'w', encoding='utf-8') as f:
@@ -390,12 +285,15 @@ def scrape_installer_gallery(driver, company_id, company_name):
         except (TimeoutException, NoSuchElementException) as e:
             print(f"Could not find gallery link: {e}")
     
+    except (FetchError, WebDriverException):
+        # The gallery page could not be fetched or the browser died: fail the installer, not just its gallery
+        raise
     except Exception as e:
         print(f"Error during gallery scraping: {e}")
     
     return downloaded_media
 
-def scrape_company_reviews(driver, company_id, company_name, profile_url):
+def scrape_company_reviews(driver, company_id, company_name, profile_url, known_fingerprints=None):
     """
     Function to scrape the company's reviews
     
@@ -404,6 +302,9 @@ def scrape_company_reviews(driver, company_id, company_name, profile_url):
         company_id: ID of the company
         company_name: Name of the company
         profile_url: Original profile URL of the company
+        known_fingerprints: Fingerprints of reviews captured by earlier runs; when given, pagination
+            stops after the page where the first known review appears (delta sync), provided every
+            review read so far is dated and the dates run newest first; otherwise all pages are read
     
     Returns:
         Dictionary with aggregate_rating and a list of individual reviews
@@ -418,7 +319,7 @@ def scrape_company_reviews(driver, company_id, company_name, profile_url):
     try:
         # First, return to the main installer page to get the aggregate rating and total count
         print(f"Navigating back to main installer page: {profile_url}")
-        driver.get(profile_url)
+        navigate(driver, profile_url)
         
         # Wait for the page to load
         WebDriverWait(driver, 15).until(
@@ -431,39 +332,10 @@ def scrape_company_reviews(driver, company_id, company_name, profile_url):
         soup = BeautifulSoup(page_source, 'html.parser')
         
         # Get aggregate rating if visible on main page
-        try:
-            # Look for clear rating indicators on the main page
-            rating_elements = soup.select('.rating, .supplier-rating, .energysage-rating, [class*="rating"]')
-            for rating_elem in rating_elements:
-                rating_text = rating_elem.get_text(strip=True)
-                # Check for patterns like "5.0", "5.0 out of 5", etc.
-                rating_match = re.search(r'(\d+\.\d+|\d+)\s*(?:/|out of)?', rating_text)
-                if rating_match:
-                    try:
-                        result["aggregate_rating"] = float(rating_match.group(1))
-                        print(f"Found aggregate rating on main page: {result['aggregate_rating']} stars")
-                        break
-                    except:
-                        pass
-                        
-        except Exception as e:
-            print(f"Error extracting aggregate rating from main page: {e}")
+        result["aggregate_rating"] = parse_aggregate_rating(soup)
         
         # Try to get the total number of reviews
-        total_reviews = 0
-        try:
-            # Find all text elements that might contain review counts
-            for element in soup.find_all(['span', 'div', 'button']):
-                text = element.get_text(strip=True)
-                if 'review' in text.lower():
-                    # Look for patterns like "327 reviews", "327 review(s)", etc.
-                    count_match = re.search(r'(\d+)\s*review', text, re.IGNORECASE)
-                    if count_match:
-                        total_reviews = int(count_match.group(1))
-                        print(f"Found total of {total_reviews} reviews")
-                        break
-        except Exception as e:
-            print(f"Error extracting total review count: {e}")
+        total_reviews = parse_review_total(soup)
         
         # Initialize variables
         valid_reviews = []
@@ -540,212 +412,90 @@ def scrape_company_reviews(driver, company_id, company_name, profile_url):
         max_pages = 100  # Safety limit
         reviews_processed = 0
         consecutive_empty_pages = 0  # Counter for pages with no new reviews
+        reached_known = False  # Delta sync: found a review an earlier run already captured
+        # The delta stop is only safe while the reviews read so far are dated and newest first
+        newest_first = True
+        previous_date = None
+        reading_all_pages = False
+        page_review_counts = {}  # Reviews parsed on each page read, for gap detection
+        page_api_urls = {}  # Pagination API URL of each review page, for the gap-fill stage
         
         while page_num <= max_pages:
             print(f"\n--- Processing reviews page {page_num} ---")
             
             # Get the current page source (after modal opened or page navigation)
             page_source = driver.page_source
+            archive_page(profile_url, page_source, 'reviews', page_num)
             soup = BeautifulSoup(page_source, 'html.parser')
             
-            # Find the modal container if present
-            modal_containers = soup.select('.modal.show, .modal.fade.in, .modal-dialog, [role="dialog"], [aria-modal="true"]')
-            if modal_containers:
-                print(f"Found {len(modal_containers)} modal containers")
-                # Use the first visible modal container
-                review_container = modal_containers[0]
-            else:
-                print("No modal container found, using full page")
-                review_container = soup
-            
-            # Find all review items within the container
-            review_items = []
-            
-            # Try specific review selectors first
-            review_selectors = [
-                '.review-item', '.review-card', '.review', '.testimonial', 
-                '[class*="review"]', '[id*="review"]'
-            ]
-            
-            for selector in review_selectors:
-                items = review_container.select(selector)
-                if items and len(items) > 0:
-                    print(f"Found {len(items)} review items with selector: {selector}")
-                    review_items = items
-                    break
-            
-            # If no review items found with specific selectors, look for more generic containers
-            if not review_items:
-                # Look for paragraphs inside the modal that might contain reviews
-                paragraph_containers = review_container.select('.modal-body p, .review-container p')
-                if paragraph_containers and len(paragraph_containers) > 1:
-                    print(f"Found {len(paragraph_containers)} paragraphs that might contain reviews")
-                    review_items = paragraph_containers
+            review_container = find_review_container(soup)
+            review_items = find_review_items(review_container)
+            page_api_urls.update(pagination_api_urls(soup))
             
             # Process each review item
             new_reviews_on_page = 0
+            known_reviews_on_page = 0
             
             if review_items:
                 print(f"Processing {len(review_items)} potential review items...")
+                reviews_on_page = 0
                 for idx, item in enumerate(review_items):
                     try:
-                        # Skip empty or very short items
-                        item_text = item.get_text(strip=True)
-                        if len(item_text) < 20:
-                            continue
-                        
-                        review_data = {}
-                        
                         # Generate unique review ID
                         review_id = f"{company_id}_review_{int(time.time())}_{reviews_processed+idx+1}"
-                        review_data['id'] = review_id
+                        fallback_rating = result["aggregate_rating"] if result["aggregate_rating"] > 0 else 5.0
+                        review_data = parse_review_item(item, review_id, fallback_rating)
+                        if review_data is None:
+                            continue
+                        reviews_on_page += 1
                         
-                        # Extract review text - focusing on paragraph elements which usually contain the actual review
-                        review_text = ""
-                        paragraphs = item.select('p')
-                        for p in paragraphs:
-                            p_text = clean_text(p.get_text())
-                            # Skip attribution paragraphs (usually shorter)
-                            if len(p_text) > 25 and 'Posted by' not in p_text and not p_text.startswith('on '):
-                                review_text = p_text
-                                break
+                        # Create a fingerprint to detect duplicate reviews, from the stored text
+                        # so it matches the fingerprints ReviewSyncState keeps
+                        review_fingerprint = make_review_fingerprint(
+                            review_data['reviewer_name'], review_data['date'], review_data['text']
+                        )
                         
-                        # If no paragraph with good content, try the item's full text
-                        if not review_text:
-                            # Try to get content from a div with the review text
-                            content_divs = item.select('.review-text, .review-content, .review-body')
-                            if content_divs:
-                                review_text = clean_text(content_divs[0].get_text())
-                            else:
-                                # Last resort: use the full item text but try to filter out metadata
-                                item_text = clean_text(item.get_text())
-                                # Keep only first 80% of text to avoid attribution info at the end
-                                review_text = item_text[:int(len(item_text) * 0.8)]
+                        review_date = parse_review_date(review_data['date'])
+                        if review_date is None or (previous_date is not None and review_date > previous_date):
+                            newest_first = False
+                        previous_date = review_date or previous_date
                         
-                        if review_text:
-                            review_data['text'] = review_text
-                            
-                            # Extract review title/heading if present
-                            heading_elements = item.select('h3, h4, h5, .review-title, .review-heading, strong')
-                            review_heading = None
-                            for heading_elem in heading_elements:
-                                heading_text = clean_text(heading_elem.get_text())
-                                if heading_text and len(heading_text) > 5 and len(heading_text) < 100:
-                                    review_heading = heading_text
-                                    break
-                            
-                            # Combine title and text if appropriate
-                            if review_heading and review_heading not in review_text:
-                                review_data['text'] = f"{review_heading}: {review_text}"
-                            
-                            # Extract review date
-                            review_date = "Unknown"
-                            
-                            # Look specifically for the EnergySage date format in text-gray-600 div
-                            date_container = item.select('div.text-gray-600 span.d-inline-block')
-                            if date_container:
-                                date_text = clean_text(date_container[0].get_text())
-                                if date_text:
-                                    review_date = date_text
-                                    print(f"Found date in EnergySage format: {review_date}")
-                            
-                            # If not found, try generic date elements
-                            if review_date == "Unknown":
-                                date_elements = item.select('.date, .review-date, .timestamp, [class*="date"]')
-                                if date_elements:
-                                    date_text = clean_text(date_elements[0].get_text())
-                                    if date_text and len(date_text) < 30:  # Reasonable date length
-                                        review_date = date_text
-                            
-                            # If still not found, try to extract from "on DATE" pattern
-                            if review_date == "Unknown":
-                                date_match = re.search(r'on\s+([A-Za-z]{3}\s+\d{1,2},?\s+\d{4}|[A-Za-z]{3}\s+\d{1,2})', item_text)
-                                if date_match:
-                                    review_date = date_match.group(1).strip()
-                            
-                            # If still not found, look for any date-like pattern in the text
-                            if review_date == "Unknown":
-                                date_pattern = re.search(r'([A-Za-z]{3,9}\s+\d{1,2},?\s+\d{4})', item_text)
-                                if date_pattern:
-                                    review_date = date_pattern.group(1).strip()
-                            
-                            review_data['date'] = review_date
-                            
-                            # Extract reviewer name
-                            reviewer_name = "Anonymous"
-                            
-                            # Look specifically for EnergySage reviewer format
-                            reviewer_match = re.search(r'Posted by\s+(\w+)\s+on', item_text)
-                            if reviewer_match:
-                                reviewer_name = reviewer_match.group(1).strip()
-                                print(f"Found reviewer in EnergySage format: {reviewer_name}")
-                            # If not found, try elements with reviewer name
-                            elif review_date == "Unknown":
-                                name_elements = item.select('.reviewer-name, .author, [class*="reviewer"], [class*="author"]')
-                                if name_elements:
-                                    name_text = clean_text(name_elements[0].get_text())
-                                    if name_text and len(name_text) < 50:  # Reasonable name length
-                                        reviewer_name = name_text
-                                        # Remove "Posted by" if present
-                                        if 'Posted by' in reviewer_name:
-                                            reviewer_name = reviewer_name.split('Posted by')[1].split('on')[0].strip()
-                            
-                            # If no specific element found, try to extract from "Posted by" text
-                            if reviewer_name == "Anonymous":
-                                posted_match = re.search(r'Posted by\s+([^on]{2,40}?)(?:\s+on\s|\n|$)', item_text)
-                                if posted_match:
-                                    reviewer_name = posted_match.group(1).strip()
-                            
-                            review_data['reviewer_name'] = reviewer_name
-                            
-                            # Extract rating (stars)
-                            stars = 0
-                            
-                            # Look for numeric rating in text
-                            rating_elements = item.select('.rating, .stars, [class*="rating"], [class*="star"]')
-                            for elem in rating_elements:
-                                rating_text = elem.get_text(strip=True)
-                                rating_match = re.search(r'(\d+\.?\d*)\s*/?\s*\d*', rating_text)
-                                if rating_match:
-                                    try:
-                                        stars = float(rating_match.group(1))
-                                        break
-                                    except:
-                                        pass
-                            
-                            # If no rating found in text, count star icons
-                            if stars == 0:
-                                filled_stars = len(item.select('.fa-star, .fas.fa-star, [class*="star-fill"], [class*="star-full"]'))
-                                if filled_stars > 0:
-                                    stars = filled_stars
-                            
-                            # Use aggregate rating as fallback
-                            if stars == 0:
-                                stars = result["aggregate_rating"] if result["aggregate_rating"] > 0 else 5.0
-                                
-                            review_data['rating'] = stars
-                            
-                            # Create a fingerprint to detect duplicate reviews
-                            review_fingerprint = f"{reviewer_name}|{review_date}|{review_text[:50]}"
-                            
-                            # Add to results if not a duplicate
+                        # Newest first, a known review means the rest are known too
+                        if known_fingerprints and review_fingerprint in known_fingerprints:
+                            reached_known = True
                             if review_fingerprint not in seen_reviews:
                                 seen_reviews.add(review_fingerprint)
-                                valid_reviews.append(review_data)
-                                new_reviews_on_page += 1
-                                reviews_processed += 1
-                                
-                                # Print review info (truncated to avoid excessive output)
-                                review_preview = review_text[:70] + "..." if len(review_text) > 70 else review_text
-                                print(f"Extracted review {len(valid_reviews)}: {reviewer_name}, {stars}★ - {review_preview}")
+                                known_reviews_on_page += 1
+                        # Add to results if not a duplicate
+                        elif review_fingerprint not in seen_reviews:
+                            seen_reviews.add(review_fingerprint)
+                            valid_reviews.append(review_data)
+                            new_reviews_on_page += 1
+                            reviews_processed += 1
+                            
+                            # Print review info (truncated to avoid excessive output)
+                            review_text = review_data['text']
+                            review_preview = review_text[:70] + "..." if len(review_text) > 70 else review_text
+                            print(f"Extracted review {len(valid_reviews)}: {review_data['reviewer_name']}, "
+                                  f"{review_data['rating']}★ - {review_preview}")
                     
                     except Exception as e:
                         print(f"Error processing review item {idx+1}: {e}")
                 
+                page_review_counts[page_num] = reviews_on_page
+                
                 print(f"Extracted {new_reviews_on_page} new reviews from page {page_num}. Total reviews so far: {len(valid_reviews)}")
                 
+                if reached_known and newest_first:
+                    print("Reached reviews captured by an earlier run. Stopping delta sync.")
+                    break
+                if reached_known and not reading_all_pages:
+                    # Newer reviews may still follow the known ones: keep reading
+                    print("Reviews are not listed newest first (or undated); reading all pages.")
+                    reading_all_pages = True
+                
                 # If we didn't find any new reviews on this page, increment counter
-                if new_reviews_on_page == 0:
+                if new_reviews_on_page == 0 and known_reviews_on_page == 0:
                     consecutive_empty_pages += 1
                     print(f"Warning: No new reviews found on page {page_num}. Consecutive empty pages: {consecutive_empty_pages}")
                     
@@ -795,10 +545,10 @@ def scrape_company_reviews(driver, company_id, company_name, profile_url):
                                     # Check if this is a numbered page
                                     page_text = item.text.strip()
                                     try:
-                                        page_num = int(page_text)
-                                        if page_num == current_page_num + 1:
+                                        link_page_num = int(page_text)
+                                        if link_page_num == current_page_num + 1:
                                             next_page_link = item
-                                            print(f"Found next page link to page {page_num}")
+                                            print(f"Found next page link to page {link_page_num}")
                                             break
                                     except ValueError:
                                         # This might be the "Next" button with arrow
@@ -849,6 +599,9 @@ def scrape_company_reviews(driver, company_id, company_name, profile_url):
         
         # Update the result with valid reviews
         result["reviews"] = valid_reviews
+        result["expected_reviews"] = total_reviews
+        result["page_review_counts"] = page_review_counts
+        result["page_api_urls"] = page_api_urls
         print(f"\nSuccessfully extracted {len(valid_reviews)} unique reviews")
         
         # If we found reviews but have no aggregate rating, calculate it
@@ -866,20 +619,67 @@ def scrape_company_reviews(driver, company_id, company_name, profile_url):
                 print(f"WARNING: Only captured {len(valid_reviews)} out of {total_reviews} expected reviews.")
                 print(f"Coverage: {(len(valid_reviews)/total_reviews)*100:.1f}% of expected reviews")
             
+    except (FetchError, WebDriverException):
+        # The profile could not be fetched or the browser died: fail the installer instead of recording no reviews
+        raise
     except Exception as e:
         print(f"Error in review extraction process: {e}")
     
     return result
 
-def scrape_installer_details(profile_url):
+def sync_company_reviews(driver, company_id, company_name, profile_url, review_sync=None):
+    """
+    Scrape a company's reviews, only reading the new ones when a sync state is given
+    
+    Args:
+        driver: Selenium WebDriver instance
+        company_id: ID of the company
+        company_name: Name of the company
+        profile_url: Original profile URL of the company
+        review_sync: Optional ReviewSyncState; reviews from earlier runs are merged into the result
+    
+    Returns:
+        Dictionary with aggregate_rating and a list of individual reviews (as scrape_company_reviews)
+    """
+    if review_sync is None:
+        return scrape_company_reviews(driver, company_id, company_name, profile_url)
+    
+    known_fingerprints = review_sync.known_fingerprints(company_id)
+    reviews_data = scrape_company_reviews(driver, company_id, company_name, profile_url, known_fingerprints)
+    new_count = len(reviews_data['reviews'])
+    reviews_data['reviews'] = review_sync.merge(company_id, reviews_data['reviews'])
+    print(f"Delta review sync: {new_count} new reviews, {len(reviews_data['reviews'])} in total")
+    return reviews_data
+
+def _scrape_reviews_in_own_browser(driver_future, company_id, company_name, profile_url, review_sync=None):
+    """
+    Run scrape_company_reviews on the second browser of scrape_installer_details
+    
+    Returns:
+        The reviews result, or None if the second browser could not be started
+    """
+    try:
+        reviews_driver = driver_future.result()
+    except Exception as e:
+        print(f"Could not start a second browser for reviews ({e}); they will run after the gallery")
+        return None
+    return sync_company_reviews(reviews_driver, company_id, company_name, profile_url, review_sync)
+
+def scrape_installer_details(profile_url, company_id=None, review_sync=None):
     """
     Test function to scrape details (states served, headquarters, and other locations) from a single installer's page
     
     Args:
         profile_url: URL of the installer's profile page
+        company_id: Stable record id used for media and review ids (defaults to the supplier id in the URL)
+        review_sync: Optional ReviewSyncState to read only reviews newer than the last crawl
         
     Returns:
         Dictionary with states_served, headquarters, and other_locations
+        
+    Raises:
+        The underlying error if the browser cannot start or a page cannot be fetched; no partial
+        result is returned, so a failed installer is retried rather than recorded as scraped
     """
     print(f"Setting up WebDriver for individual scraping test...")
     
@@ -896,9 +696,11 @@ def scrape_installer_details(profile_url):
     except Exception as e:
         print(f"Error setting up WebDriver: {e}")
         print("Please ensure you have Chrome and the correct ChromeDriver installed.")
-        return {"states_served": [], "headquarters": "Error retrieving", "other_locations": [], "gallery_images": [], "reviews_data": {"aggregate_rating": 0, "reviews": []}}
+        raise
     
     result = {
+        "logo_url": "",
+        "logo_alt": "",
         "states_served": [],
         "headquarters": "N/A",
         "other_locations": [],
@@ -906,15 +708,18 @@ def scrape_installer_details(profile_url):
         "reviews_data": {"aggregate_rating": 0, "reviews": []}
     }
     
-    # Track unique locations to avoid duplicates
-    unique_locations = set()
+    # The review stage gets its own browser so it can run alongside the gallery stage;
+    # start it now so its startup overlaps with PARTS 0-3
+    stage_executor = ThreadPoolExecutor(max_workers=2)
+    reviews_driver_future = stage_executor.submit(create_driver)
     
     try:
         print(f"Navigating to: {profile_url}")
-        driver.get(profile_url)
+        navigate(driver, profile_url)
         
-        # Extract company ID from URL
-        company_id = profile_url.split('/')[-2] if profile_url.endswith('/') else profile_url.split('/')[-1]
+        # Key media and reviews by the same supplier id as the installer row
+        if company_id is None:
+            company_id = extract_supplier_id(profile_url) or SupplierIdMap().id_for(profile_url)
         
         # Wait for page to load
         WebDriverWait(driver, 15).until(
@@ -926,271 +731,273 @@ def scrape_installer_details(profile_url):
         
         # Parse with BeautifulSoup
         page_source = driver.page_source
+        archive_page(profile_url, page_source, 'profile')
         soup = BeautifulSoup(page_source, 'html.parser')
         
         # Get company name from the page title
-        company_name = soup.title.string.split('|')[0].strip() if soup.title else "Unknown Company"
-        
-        # PART 0: Extract company logo
-        # Look for logo image in various locations on the page
-        print("Looking for company logo...")
-        logo_selectors = [
-            # EnergySage specific selectors based on observed HTML
-            'img[alt$="logo"]',  # Images with alt text ending with "logo"
-            'img[alt*="' + company_name + '"]',  # Images with company name in alt
-            'img[src*="cloudinary.com/energysage/image/fetch"]',  # Cloudinary hosted images like the example
-            'img[src*="es-media-prod"]',  # EnergySage media URLs
-            # Generic selectors
-            'img[alt*="logo" i]',  # Images with "logo" in alt text (case insensitive)
-            'img[src*="logo" i]',  # Images with "logo" in src URL
-            'img[alt*="' + company_name + '" i]',  # Images with company name in alt text
-            '.supplier-logo img', '.company-logo img',  # Common class names for logo containers
-            '.logo img', '#logo img',  # More common logo container selectors
-            '.header img', '.navbar-brand img'  # Header areas that might contain logos
-        ]
-        
-        for selector in logo_selectors:
-            logo_img = soup.select_one(selector)
-            if logo_img and logo_img.get('src'):
-                # Found a logo
-                result["logo_url"] = logo_img.get('src', '')
-                result["logo_alt"] = logo_img.get('alt', company_name + ' logo')
-                print(f"Found company logo: {result['logo_url']}")
-                break
-        
-        # If still not found, try more direct approach for EnergySage structure
-        if not result["logo_url"]:
-            # Try direct attribute search for width/height 200 images which are likely logos
-            logo_img = soup.find('img', attrs={'width': '200', 'height': '200'})
-            if logo_img and logo_img.get('src'):
-                result["logo_url"] = logo_img.get('src', '')
-                result["logo_alt"] = logo_img.get('alt', company_name + ' logo')
-                print(f"Found company logo with exact dimensions: {result['logo_url']}")
-        
-        if not result["logo_url"]:
-            print("No logo found with standard selectors, trying more generic approach...")
-            # If no logo found, try to find a prominent image at the top of the page
-            header_sections = soup.select('header, .header, .navbar, .company-header, .supplier-header')
-            for section in header_sections:
-                logo_img = section.find('img')
-                if logo_img and logo_img.get('src'):
-                    result["logo_url"] = logo_img.get('src', '')
-                    result["logo_alt"] = logo_img.get('alt', company_name + ' logo')
-                    print(f"Found potential logo in header: {result['logo_url']}")
-                    break
-        
-        # PART 1: Extract states served
-        # Try multiple potential selectors for states served
-        states_selectors = [
-            {'type': 'class', 'value': 'states-served'},
-            {'type': 'class', 'value': 'service-states'},
-            {'type': 'class', 'value': 'states'},
-            {'type': 'class', 'value': 'coverage-area'}
-        ]
-        
-        for selector in states_selectors:
-            states_div = soup.find('div', class_=selector['value'])
-            if states_div:
-                print(f"Found states using class='{selector['value']}'")
-                
-                # Try to find state links inside the container
-                state_links = states_div.find_all('a')
-                if state_links:
-                    states = [link.get_text(strip=True) for link in state_links if link.get_text(strip=True)]
-                    result["states_served"] = sorted(list(set(states)))  # Remove duplicates and sort
-                    break
-                
-                # If no links found, try to get text directly
-                if not result["states_served"] and states_div.text.strip():
-                    states_text = states_div.text.strip()
-                    print(f"Found states text: {states_text}")
-                    # Try to parse states from text (comma-separated list)
-                    if ',' in states_text:
-                        states = [state.strip() for state in states_text.split(',')]
-                        result["states_served"] = sorted(list(set(states)))
-                        break
-        
-        if result["states_served"]:
-            print(f"Found {len(result['states_served'])} states served: {', '.join(result['states_served'])}")
-        else:
-            print("No states served information found.")
-            
-            # Attempt to look for any text containing state abbreviations
-            page_text = soup.get_text()
-            common_states = ['MA', 'NH', 'VT', 'CT', 'RI', 'ME', 'NY', 'NJ', 'PA']
-            
-            print("Looking for state abbreviations in page content...")
-            found_states = []
-            for state in common_states:
-                # Look for state abbreviation as a word or with comma
-                if f" {state} " in page_text or f"{state}," in page_text:
-                    found_states.append(state)
-            
-            if found_states:
-                print(f"Potential states found in text: {', '.join(found_states)}")
-                result["states_served"] = found_states
-        
-        # PART 2: Extract headquarters information
-        # Try multiple potential selectors for headquarters
-        hq_selectors = [
-            {'type': 'class', 'value': 'headquarters'},
-            {'type': 'class', 'value': 'company-address'},
-            {'type': 'class', 'value': 'address'},
-            {'type': 'class', 'value': 'location'}
-        ]
-            
-        for selector in hq_selectors:
-            hq_div = soup.find('div', class_=selector['value'])
-            if hq_div:
-                print(f"Found headquarters using class='{selector['value']}'")
-                
-                # Try different patterns within the HQ div
-                address_li = hq_div.find('li', class_='supplier-address')
-                if address_li:
-                    address_p = address_li.find('p', class_='d-none d-md-block') or address_li.find('p')
-                    if address_p:
-                        # Apply clean_text function to normalize formatting
-                        result["headquarters"] = clean_text(' '.join(address_p.stripped_strings))
-                        break
-                else:
-                    # If no li.supplier-address, just get all text from div and clean it
-                    result["headquarters"] = clean_text(' '.join(hq_div.stripped_strings))
-                    break
-        
-        if result["headquarters"] != "N/A":
-            print(f"Found headquarters: {result['headquarters']}")
-        else:
-            print("No headquarters information found.")
-        
-        # PART 3: Extract other locations information
-        # Look for "Other Locations" section - typically this follows the headquarters section
-        other_locations_selectors = [
-            {'type': 'h3', 'text': 'Other Locations'},
-            {'type': 'class', 'value': 'other-locations'},
-            {'type': 'class', 'value': 'locations'},
-            {'type': 'class', 'value': 'branches'}  # Added based on HTML snippet provided
-        ]
-        
-        # First try to find the "Other Locations" heading
-        other_locations_heading = None
-        for selector in other_locations_selectors:
-            if selector['type'] == 'h3':
-                other_locations_heading = soup.find('h3', string=lambda text: text and selector['text'] in text)
-            elif selector['type'] == 'class':
-                other_locations_heading = soup.find(lambda tag: tag.has_attr('class') and selector['value'] in tag['class'])
-            
-            if other_locations_heading:
-                print(f"Found other locations section using {selector['type']}='{selector.get('text', selector.get('value'))}'")
-                break
+        company_name = profile_company_name(soup)
         
-        if other_locations_heading:
-            # Look for location list items following the heading
-            # First try to find the ul.list-unstyled directly following the heading
-            locations_list = other_locations_heading.find_next('ul', class_='list-unstyled')
-            
-            if not locations_list:
-                # If not found with class, try any ul element
-                locations_list = other_locations_heading.find_next('ul')
-            
-            if not locations_list:
-                # Try parent's next sibling 
-                parent = other_locations_heading.parent
-                if parent:
-                    locations_list = parent.find('ul', class_='list-unstyled') or parent.find_next('ul')
-            
-            if locations_list:
-                location_items = locations_list.find_all('li')
-                for item in location_items:
-                    # For each li, look for the desktop version first (more clean text)
-                    desktop_p = item.find('p', class_='d-none d-md-block')
-                    if desktop_p:
-                        # Convert newlines to commas and extract text, then clean it
-                        location_text = clean_text(desktop_p.get_text(separator=' ', strip=True).replace('\n', ', '))
-                        if location_text and location_text not in unique_locations:
-                            unique_locations.add(location_text)
-                            result["other_locations"].append(location_text)
-                            continue
-                    
-                    # If desktop version not found or empty, try mobile version
-                    mobile_p = item.find('p', class_='my-0')
-                    if mobile_p:
-                        # Process similar to desktop version
-                        location_text = clean_text(mobile_p.get_text(separator=' ', strip=True).replace('\n', ', '))
-                        # Remove the SVG icon text if present
-                        if 'M8.604' in location_text:
-                            location_text = location_text.split('M8.604')[0].strip()
-                        if location_text and location_text not in unique_locations:
-                            unique_locations.add(location_text)
-                            result["other_locations"].append(location_text)
-                            continue
-                    
-                    # If no p tags found, just get all text
-                    if not desktop_p and not mobile_p:
-                        location_text = clean_text(' '.join(item.stripped_strings))
-                        if location_text and location_text not in unique_locations:
-                            unique_locations.add(location_text)
-                            result["other_locations"].append(location_text)
-            
-            # If no list items found, try looking for paragraphs or div containers
-            if not result["other_locations"]:
-                location_containers = other_locations_heading.find_next_siblings(['p', 'div'])
-                for container in location_containers[:5]:  # Limit to first 5 to avoid going too far
-                    location_text = ' '.join(container.stripped_strings)
-                    if location_text.strip() and location_text.strip() not in unique_locations:
-                        unique_locations.add(location_text.strip())
-                        result["other_locations"].append(location_text.strip())
-        
-        # Alternative approach: look for location divs directly
-        if not result["other_locations"]:
-            print("Looking for other locations using alternative approach...")
-            
-            # Look for multiple address elements or location divs
-            address_elements = soup.find_all('li', class_='supplier-address')
-            if len(address_elements) > 1:  # If more than one address, the others are likely additional locations
-                for address in address_elements[1:]:  # Skip the first one (headquarters)
-                    address_p = address.find('p', class_='d-none d-md-block') or address.find('p')
-                    if address_p:
-                        location_text = ' '.join(address_p.stripped_strings)
-                        if location_text.strip() and location_text.strip() not in unique_locations:
-                            unique_locations.add(location_text.strip())
-                            result["other_locations"].append(location_text.strip())
+        # PARTS 0-3: logo, states served, headquarters and other locations
+        result.update(parse_installer_profile(soup, company_name))
         
-        if result["other_locations"]:
-            print(f"Found {len(result['other_locations'])} other locations:")
-            for idx, loc in enumerate(result["other_locations"]):
-                print(f"  {idx+1}. {loc}")
-        else:
-            print("No other locations found.")
+        # PARTS 4 and 5 are independent: reviews run in the second browser while this one does the gallery
+        reviews_future = stage_executor.submit(
+            _scrape_reviews_in_own_browser, reviews_driver_future, company_id, company_name, profile_url, review_sync
+        )
         
         # PART 4: Scrape the gallery images
         gallery_images = scrape_installer_gallery(driver, company_id, company_name)
         result["gallery_images"] = gallery_images
         
-        # PART 5: Scrape company reviews
-        reviews_data = scrape_company_reviews(driver, company_id, company_name, profile_url)
+        # PART 5: Scrape company reviews (falls back to this browser if the second one could not start)
+        reviews_data = reviews_future.result()
+        if reviews_data is None:
+            reviews_data = sync_company_reviews(driver, company_id, company_name, profile_url, review_sync)
         result["reviews_data"] = reviews_data
             
     except Exception as e:
+        # No placeholder result: callers must not record a failed scrape as done
         print(f"Error during scraping: {e}")
+        raise
     finally:
         print("Closing browser...")
         driver.quit()
+        # Waits for a review stage still in flight, then closes its browser
+        stage_executor.shutdown(wait=True)
+        try:
+            reviews_driver_future.result().quit()
+        except Exception:
+            pass
         
     return result
 
-def main():
-    # Load all installers from the CSV file
-    csv_file = 'massachusetts_solar_installers.csv'
-    all_output_file = 'all_massachusetts_installer_details.csv'
-    all_output_file_tsv = 'all_massachusetts_installer_details.tsv'
+def count_listing(csv_file):
+    """Number of installers in a listing CSV, read without keeping any rows"""
+    with open(csv_file, 'r', encoding='utf-8') as file:
+        return sum(1 for _ in csv.DictReader(file))
+
+def iter_listing(csv_file, id_map, crawl_state=None, prioritize=False, budget_minutes=None):
+    """
+    Pipeline stage 1: stream the installers of a listing CSV in crawl order
+    
+    Rows are read one at a time. Prioritized runs are the exception: the
+    frontier has to see every row to order them, but it keeps only the listing rows.
+    
+    Args:
+        csv_file: Listing CSV from scrape_installers.py or crawl_scheduler.py
+        id_map: SupplierIdMap giving each installer its stable record id
+        crawl_state: CrawlState used to prioritize (required when prioritize or budget_minutes is set)
+        prioritize: Crawl the stalest, most active installers first instead of in CSV order
+        budget_minutes: Stop yielding installers once this much time is used (implies prioritize)
+        
+    Yields:
+        (company_id, installer) tuples
+    """
+    with open(csv_file, 'r', encoding='utf-8') as file:
+        installers = csv.DictReader(file)
+        if prioritize or budget_minutes:
+            frontier = CrawlFrontier(crawl_state, id_map)
+            frontier.add_all(installers)
+            budget_seconds = budget_minutes * 60 if budget_minutes else None
+            installers = (installer for _, installer, _ in frontier.drain(budget_seconds))
+        
+        for installer in installers:
+            company_id = id_map.id_for(installer['profile_url'])
+            if installer.get('id') and installer['id'] != str(company_id):
+                id_map.remember_legacy(installer['id'], installer['profile_url'], legacy_scope(csv_file))
+            yield company_id, installer
+
+def _log_installer_error(log_file, installer, error):
+    error_message = f"Error processing installer {installer['company_name']}: {error}"
+    print(error_message)
+    
+    # Log error to file
+    with open(log_file, 'a', encoding='utf-8') as logf:
+        logf.write(f"\nERROR: {error_message}\n")
+        logf.write(f"Error occurred at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
+
+def iter_installer_details(listing, total_installers, review_sync=None, log_file='scraping_log.txt'):
+    """
+    Pipeline stage 2: scrape each installer from iter_listing
+    
+    Installers that fail to scrape are logged and skipped, so one bad
+    profile does not end the run.
+    
+    Args:
+        listing: Output of iter_listing
+        total_installers: Listing size, for progress messages
+        review_sync: Optional ReviewSyncState to read only reviews newer than the last crawl
+        log_file: Scraping log to append progress and errors to
+        
+    Yields:
+        (idx, company_id, installer, details, elapsed_seconds) tuples
+    """
+    for idx, (company_id, installer) in enumerate(listing, 1):
+        start_time = time.time()
+        try:
+            banner = f"\n{'='*50}"
+            print(f"{banner}")
+            print(f"Processing installer {idx}/{total_installers}: {installer['company_name']}")
+            print(f"{banner}")
+            print(f"ID: {company_id}")
+            print(f"Profile URL: {installer['profile_url']}")
+            
+            # Log to file
+            with open(log_file, 'a', encoding='utf-8') as logf:
+                logf.write(f"{banner}\n")
+                logf.write(f"Processing installer {idx}/{total_installers}: {installer['company_name']}\n")
+                logf.write(f"{banner}\n")
+                logf.write(f"ID: {company_id}\n")
+                logf.write(f"Profile URL: {installer['profile_url']}\n")
+                logf.write(f"Started at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            
+            # Scrape details for this installer
+            details = scrape_installer_details(installer['profile_url'], company_id, review_sync)
+        except Exception as e:
+            _log_installer_error(log_file, installer, e)
+            continue
+        yield idx, company_id, installer, details, time.time() - start_time
+
+def iter_media_rows(installer, company_id, details):
+    """
+    Pipeline stage 3: media catalog rows of a scraped installer
+    
+    Yields:
+        MediaRecord for each gallery item
+    """
+    for media_info in details['gallery_images']:
+        # Videos are catalogued by their thumbnail image
+        is_video = media_info.get('type') == 'video'
+        yield MediaRecord(
+            company_id=company_id,
+            company_name=installer['company_name'],
+            media_id=media_info['id'],
+            media_type=media_info.get('type', 'image'),  # Default to image for backward compatibility
+            url=media_info.get('thumbnail_url' if is_video else 'url', ''),
+            local_path=media_info.get('thumbnail_path' if is_video else 'path', ''),
+            filename=media_info.get('filename', ''),
+            video_platform=media_info.get('platform', '') if is_video else '',
+            video_id=media_info.get('video_id', '') if is_video else '',
+            video_url=media_info.get('video_url', '') if is_video else '',
+            # Real format, dimensions and thumbnails from the derivative stage
+            content_digest=media_info.get('content_digest', ''),
+            real_format=media_info.get('real_format', ''),
+            width=media_info.get('width', ''),
+            height=media_info.get('height', ''),
+            byte_size=media_info.get('byte_size', ''),
+            thumbnails=thumbnails_column(media_info),
+            phash=media_info.get('phash', ''),
+            duplicate_of=media_info.get('duplicate_of', '')
+        )
+
+def iter_review_rows(installer, company_id, details):
+    """
+    Pipeline stage 4: review catalog rows of a scraped installer
+    
+    Yields:
+        ReviewRecord for each review
+    """
+    for review in details['reviews_data']['reviews']:
+        yield ReviewRecord(
+            company_id=company_id,
+            company_name=installer['company_name'],
+            review_id=review['id'],
+            reviewer_name=review['reviewer_name'],
+            review_date=review['date'],
+            rating=review['rating'],
+            review_text=review['text']
+        )
+
+def write_installer_results(installer, company_id, details, sinks, search_index=None):
+    """
+    Print a scraped installer's results and write its installer, media and review rows
+    
+    Args:
+        installer: Listing row with company_name, description and profile_url
+        company_id: Stable record id of the installer
+        details: Output of scrape_installer_details
+        sinks: CrawlSinks or SQLiteStore receiving the rows
+        search_index: Optional SearchIndex to update
+        
+    Returns:
+        Tuple of (image_count, video_count)
+    """
+    print(f"\nResults for {installer['company_name']}:")
+    print(f"States Served: {', '.join(details['states_served']) if details['states_served'] else 'None found'}")
+    print(f"Headquarters: {details['headquarters']}")
+    print(f"Other Locations: {len(details['other_locations'])} found")
+    for loc_idx, loc in enumerate(details['other_locations']):
+        print(f"  {loc_idx+1}. {loc}")
+    
+    # Count images and videos
+    image_count = sum(1 for item in details['gallery_images'] if item.get('type') == 'image')
+    video_count = sum(1 for item in details['gallery_images'] if item.get('type') == 'video')
+    print(f"Gallery Media: {len(details['gallery_images'])} items total ({image_count} images, {video_count} videos)")
+    print(f"Reviews: {len(details['reviews_data']['reviews'])} found with aggregate rating {details['reviews_data']['aggregate_rating']}")
+    
+    # Format the other locations using a special separator that's compatible with Excel
+    # Using pipe symbols which are less likely to appear in addresses
+    other_locations_str = ' | '.join(details['other_locations']) if details['other_locations'] else ''
+    
+    # For gallery media, include the media IDs rather than URLs
+    media_ids = [media_info['id'] for media_info in details['gallery_images']] if details['gallery_images'] else []
+    gallery_media_str = ' | '.join(media_ids)
+    
+    # Prepare the row data
+    installer_row = InstallerRecord(
+        id=company_id,
+        company_name=installer['company_name'],
+        description=clean_text(installer['description'][:200] + "...") if len(installer['description']) > 200 else clean_text(installer['description']),
+        profile_url=installer['profile_url'],
+        states_served=','.join(details['states_served']) if details['states_served'] else '',
+        headquarters=details['headquarters'],
+        other_locations=other_locations_str,
+        gallery_media=gallery_media_str,
+        image_count=image_count,
+        video_count=video_count,
+        aggregate_rating=details['reviews_data']['aggregate_rating'],
+        review_count=len(details['reviews_data']['reviews'])
+    )
+    
+    # Stages 3 and 4 feed the sinks row by row
+    for media_row in iter_media_rows(installer, company_id, details):
+        sinks.write_media(media_row)
+    
+    for review_row in iter_review_rows(installer, company_id, details):
+        sinks.write_review(review_row)
+        if search_index:
+            search_index.add_review(review_row)
+    
+    # Write the installer row (CSV and TSV) and make this installer durable
+    sinks.write_installer(installer_row)
+    sinks.checkpoint()
+    if search_index:
+        # Index the full description, not the truncated catalog copy
+        search_index.add_installer(dict(installer_row, description=clean_text(installer['description'])))
+        search_index.checkpoint()
+    
+    return image_count, video_count
+
+def main(csv_file='massachusetts_solar_installers.csv', output_name='massachusetts', sqlite_path=None,
+         search_index_path=None, prioritize=False, budget_minutes=None, delta_reviews=False):
+    """
+    Scrape details, media and reviews for every installer in the listing CSV
+    
+    Args:
+        csv_file: Listing CSV from scrape_installers.py or crawl_scheduler.py
+        output_name: Name used in the installer details files (all_<name>_installer_details.csv/.tsv)
+        sqlite_path: Optional SQLite database to store results in instead of the CSV/TSV catalogs
+        search_index_path: Optional full-text search index to update with new reviews and descriptions
+        prioritize: Crawl the stalest, most active installers first instead of in CSV order
+        budget_minutes: Stop starting new installers once this much time is used (implies prioritize)
+        delta_reviews: Only read reviews newer than the last crawl and merge in the stored ones
+    """
+    # Output files for this run
+    all_output_file = f'all_{output_name}_installer_details.csv'
+    all_output_file_tsv = f'all_{output_name}_installer_details.tsv'
     all_media_catalog_file = 'all_media_catalog.csv'
     all_reviews_catalog_file = 'all_reviews_catalog.csv'
     
-    # Create a list to store all installer details
-    all_installer_details = []
-    all_media_items = []
-    all_reviews = []
-    
     # Create a log file for the scraping process
     log_file = 'scraping_log.txt'
     with open(log_file, 'a', encoding='utf-8') as logf:
@@ -1198,274 +1005,102 @@ def main():
         logf.write(f"SCRAPING SESSION STARTED: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
         logf.write(f"{'='*80}\n\n")
     
+    # Open the output backend once; CSV catalogs get headers only when new
+    if sqlite_path:
+        print(f"Storing results in SQLite database: {sqlite_path}")
+        sinks = SQLiteStore(sqlite_path)
+    else:
+        sinks = CrawlSinks(all_output_file, all_output_file_tsv, all_media_catalog_file, all_reviews_catalog_file)
+    
+    # Full-text index is updated as reviews arrive; already indexed reviews are skipped
+    search_index = SearchIndex(search_index_path) if search_index_path else None
+    
+    # Every output row is keyed by supplier id, whatever ids the input CSV used
+    id_map = SupplierIdMap()
+    
+    # Last crawl time and review activity per installer, used to prioritize later runs
+    crawl_state = CrawlState()
+    
+    # Reviews captured by earlier runs, so only new review pages need to be read
+    review_sync = ReviewSyncState() if delta_reviews else None
+    
+    # Installers whose reviews came up short, for the gap-fill stage (review_gaps.py)
+    review_gaps = ReviewGapLog()
+    
+    # Extractors try the selectors that matched on earlier runs first
+    DEFAULT_SELECTORS.load()
+    
     try:
-        # Define fieldnames for the output CSV
-        fieldnames = [
-            'id', 'company_name', 'description', 'profile_url', 
-            'states_served', 'headquarters', 'other_locations', 'gallery_media',
-            'image_count', 'video_count', 'aggregate_rating', 'review_count'
-        ]
-        
-        # Define fields for the media catalog
-        media_fieldnames = [
-            'company_id', 'company_name', 'media_id', 'media_type', 
-            'url', 'local_path', 'filename',
-            'video_platform', 'video_id', 'video_url'
-        ]
-        
-        # Define fields for the reviews catalog
-        reviews_fieldnames = [
-            'company_id', 'company_name', 'review_id', 'reviewer_name', 
-            'review_date', 'rating', 'review_text'
-        ]
-        
-        # Create CSV files with headers if they don't exist
-        # Installer details CSV
-        if not os.path.exists(all_output_file):
-            with open(all_output_file, 'w', newline='', encoding='utf-8-sig') as outfile:
-                writer = csv.DictWriter(outfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-                writer.writeheader()
+        total_installers = count_listing(csv_file)
+        listing = iter_listing(csv_file, id_map, crawl_state, prioritize, budget_minutes)
         
-        # Installer details TSV
-        if not os.path.exists(all_output_file_tsv):
-            with open(all_output_file_tsv, 'w', newline='', encoding='utf-8-sig') as outfile:
-                writer = csv.DictWriter(
-                    outfile, 
-                    fieldnames=fieldnames,
-                    quoting=csv.QUOTE_MINIMAL,
-                    delimiter='\t'  # Tab delimiter
-                )
-                writer.writeheader()
-        
-        # Media catalog
-        if not os.path.exists(all_media_catalog_file):
-            with open(all_media_catalog_file, 'w', newline='', encoding='utf-8-sig') as mediafile:
-                mediawriter = csv.DictWriter(
-                    mediafile,
-                    fieldnames=media_fieldnames,
-                    quoting=csv.QUOTE_ALL
-                )
-                mediawriter.writeheader()
-        
-        # Reviews catalog
-        if not os.path.exists(all_reviews_catalog_file):
-            with open(all_reviews_catalog_file, 'w', newline='', encoding='utf-8-sig') as reviewfile:
-                reviewwriter = csv.DictWriter(
-                    reviewfile,
-                    fieldnames=reviews_fieldnames,
-                    quoting=csv.QUOTE_ALL
-                )
-                reviewwriter.writeheader()
-        
-        # Open the CSV file with all installer data
-        with open(csv_file, 'r', encoding='utf-8') as file:
-            reader = csv.DictReader(file)
-            total_installers = sum(1 for _ in reader)
-            file.seek(0)  # Reset file pointer to beginning
-            next(reader)  # Skip header row
-            
-            # Process each installer
-            for idx, installer in enumerate(reader, 1):
-                start_time = time.time()
-                company_media_items = []
-                company_reviews = []
+        # Each installer flows through the stages and is dropped once its rows are written,
+        # so memory stays flat however many installers the listing has
+        for idx, company_id, installer, details, elapsed_time in iter_installer_details(
+                listing, total_installers, review_sync, log_file):
+            try:
+                image_count, video_count = write_installer_results(installer, company_id, details, sinks, search_index)
+                crawl_state.record(company_id, details['reviews_data'], elapsed_time)
+                review_gaps.record(company_id, installer['company_name'], installer['profile_url'],
+                                   details['reviews_data'])
                 
-                try:
-                    banner = f"\n{'='*50}"
-                    print(f"{banner}")
-                    print(f"Processing installer {idx}/{total_installers}: {installer['company_name']}")
-                    print(f"{banner}")
-                    print(f"ID: {installer['id']}")
-                    print(f"Profile URL: {installer['profile_url']}")
-                    
-                    # Log to file
-                    with open(log_file, 'a', encoding='utf-8') as logf:
-                        logf.write(f"{banner}\n")
-                        logf.write(f"Processing installer {idx}/{total_installers}: {installer['company_name']}\n")
-                        logf.write(f"{banner}\n")
-                        logf.write(f"ID: {installer['id']}\n")
-                        logf.write(f"Profile URL: {installer['profile_url']}\n")
-                        logf.write(f"Started at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                    
-                    # Scrape details for this installer
-                    details = scrape_installer_details(installer['profile_url'])
-                    
-                    print(f"\nResults for {installer['company_name']}:")
-                    print(f"States Served: {', '.join(details['states_served']) if details['states_served'] else 'None found'}")
-                    print(f"Headquarters: {details['headquarters']}")
-                    print(f"Other Locations: {len(details['other_locations'])} found")
+                # Log completion and timing information
+                completion_message = f"Completed processing for {installer['company_name']} ({idx}/{total_installers}) in {elapsed_time:.2f} seconds"
+                print(completion_message)
+                
+                # Log to file
+                with open(log_file, 'a', encoding='utf-8') as logf:
+                    logf.write(f"\nResults for {installer['company_name']}:\n")
+                    logf.write(f"States Served: {', '.join(details['states_served']) if details['states_served'] else 'None found'}\n")
+                    logf.write(f"Headquarters: {details['headquarters']}\n")
+                    logf.write(f"Other Locations: {len(details['other_locations'])} found\n")
                     for loc_idx, loc in enumerate(details['other_locations']):
-                        print(f"  {loc_idx+1}. {loc}")
-                    
-                    # Count images and videos
-                    image_count = sum(1 for item in details['gallery_images'] if item.get('type') == 'image')
-                    video_count = sum(1 for item in details['gallery_images'] if item.get('type') == 'video')
-                    print(f"Gallery Media: {len(details['gallery_images'])} items total ({image_count} images, {video_count} videos)")
-                    print(f"Reviews: {len(details['reviews_data']['reviews'])} found with aggregate rating {details['reviews_data']['aggregate_rating']}")
-                    
-                    # Format the other locations using a special separator that's compatible with Excel
-                    # Using pipe symbols which are less likely to appear in addresses
-                    other_locations_str = ' | '.join(details['other_locations']) if details['other_locations'] else ''
-                    
-                    # For gallery media, include the media IDs rather than URLs
-                    media_ids = [media_info['id'] for media_info in details['gallery_images']] if details['gallery_images'] else []
-                    gallery_media_str = ' | '.join(media_ids)
-                    
-                    # Prepare the row data
-                    installer_row = {
-                        'id': installer['id'],
-                        'company_name': installer['company_name'],
-                        'description': clean_text(installer['description'][:200] + "...") if len(installer['description']) > 200 else clean_text(installer['description']),
-                        'profile_url': installer['profile_url'],
-                        'states_served': ','.join(details['states_served']) if details['states_served'] else '',
-                        'headquarters': details['headquarters'],
-                        'other_locations': other_locations_str,
-                        'gallery_media': gallery_media_str,
-                        'image_count': image_count,
-                        'video_count': video_count,
-                        'aggregate_rating': details['reviews_data']['aggregate_rating'],
-                        'review_count': len(details['reviews_data']['reviews'])
-                    }
-                    
-                    # Add to our list of all installer details
-                    all_installer_details.append(installer_row)
-                    
-                    # Process media items for the catalog
-                    for media_info in details['gallery_images']:
-                        media_row = {
-                            'company_id': installer['id'],
-                            'company_name': installer['company_name'],
-                            'media_id': media_info['id'],
-                            'media_type': media_info.get('type', 'image')  # Default to image for backward compatibility
-                        }
-                        
-                        # Handle different media types
-                        if media_info.get('type') == 'video':
-                            # For videos
-                            media_row['url'] = media_info.get('thumbnail_url', '')
-                            media_row['local_path'] = media_info.get('thumbnail_path', '')
-                            media_row['filename'] = media_info.get('filename', '')
-                            media_row['video_platform'] = media_info.get('platform', '')
-                            media_row['video_id'] = media_info.get('video_id', '')
-                            media_row['video_url'] = media_info.get('video_url', '')
-                        else:
-                            # For images
-                            media_row['url'] = media_info.get('url', '')
-                            media_row['local_path'] = media_info.get('path', '')
-                            media_row['filename'] = media_info.get('filename', '')
-                            media_row['video_platform'] = ''
-                            media_row['video_id'] = ''
-                            media_row['video_url'] = ''
-                            
-                        all_media_items.append(media_row)
-                        company_media_items.append(media_row)
-                    
-                    # Process reviews for the catalog
-                    for review in details['reviews_data']['reviews']:
-                        review_row = {
-                            'company_id': installer['id'],
-                            'company_name': installer['company_name'],
-                            'review_id': review['id'],
-                            'reviewer_name': review['reviewer_name'],
-                            'review_date': review['date'],
-                            'rating': review['rating'],
-                            'review_text': review['text']
-                        }
-                        all_reviews.append(review_row)
-                        company_reviews.append(review_row)
-                    
-                    # Save the data for this installer immediately
-                    # Append to installer details CSV
-                    with open(all_output_file, 'a', newline='', encoding='utf-8-sig') as outfile:
-                        writer = csv.DictWriter(outfile, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
-                        writer.writerow(installer_row)
-                    
-                    # Append to installer details TSV
-                    with open(all_output_file_tsv, 'a', newline='', encoding='utf-8-sig') as outfile:
-                        writer = csv.DictWriter(
-                            outfile, 
-                            fieldnames=fieldnames,
-                            quoting=csv.QUOTE_MINIMAL,
-                            delimiter='\t'  # Tab delimiter
-                        )
-                        writer.writerow(installer_row)
-                    
-                    # Append media items to catalog
-                    if company_media_items:
-                        with open(all_media_catalog_file, 'a', newline='', encoding='utf-8-sig') as mediafile:
-                            mediawriter = csv.DictWriter(
-                                mediafile,
-                                fieldnames=media_fieldnames,
-                                quoting=csv.QUOTE_ALL
-                            )
-                            mediawriter.writerows(company_media_items)
-                    
-                    # Append reviews to catalog
-                    if company_reviews:
-                        with open(all_reviews_catalog_file, 'a', newline='', encoding='utf-8-sig') as reviewfile:
-                            reviewwriter = csv.DictWriter(
-                                reviewfile,
-                                fieldnames=reviews_fieldnames,
-                                quoting=csv.QUOTE_ALL
-                            )
-                            reviewwriter.writerows(company_reviews)
-                    
-                    # Log completion and timing information
-                    end_time = time.time()
-                    elapsed_time = end_time - start_time
-                    completion_message = f"Completed processing for {installer['company_name']} ({idx}/{total_installers}) in {elapsed_time:.2f} seconds"
-                    print(completion_message)
-                    
-                    # Log to file
-                    with open(log_file, 'a', encoding='utf-8') as logf:
-                        logf.write(f"\nResults for {installer['company_name']}:\n")
-                        logf.write(f"States Served: {', '.join(details['states_served']) if details['states_served'] else 'None found'}\n")
-                        logf.write(f"Headquarters: {details['headquarters']}\n")
-                        logf.write(f"Other Locations: {len(details['other_locations'])} found\n")
-                        for loc_idx, loc in enumerate(details['other_locations']):
-                            logf.write(f"  {loc_idx+1}. {loc}\n")
-                        logf.write(f"Gallery Media: {len(details['gallery_images'])} items total ({image_count} images, {video_count} videos)\n")
-                        logf.write(f"Reviews: {len(details['reviews_data']['reviews'])} found with aggregate rating {details['reviews_data']['aggregate_rating']}\n")
-                        logf.write(f"{completion_message}\n")
-                        logf.write(f"Completed at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                        logf.write(f"Data saved to CSV/TSV files\n\n")
-                    
-                except Exception as e:
-                    error_message = f"Error processing installer {installer['company_name']}: {e}"
-                    print(error_message)
-                    
-                    # Log error to file
-                    with open(log_file, 'a', encoding='utf-8') as logf:
-                        logf.write(f"\nERROR: {error_message}\n")
-                        logf.write(f"Error occurred at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n\n")
-            
-            # Final summary
-            print("\nAll installers processed. Final summary:")
-            print(f"Total companies processed: {len(all_installer_details)}")
-            print(f"Total media items: {len(all_media_items)}")
-            print(f"Total reviews: {len(all_reviews)}")
+                        logf.write(f"  {loc_idx+1}. {loc}\n")
+                    logf.write(f"Gallery Media: {len(details['gallery_images'])} items total ({image_count} images, {video_count} videos)\n")
+                    logf.write(f"Reviews: {len(details['reviews_data']['reviews'])} found with aggregate rating {details['reviews_data']['aggregate_rating']}\n")
+                    logf.write(f"{completion_message}\n")
+                    logf.write(f"Completed at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+                    logf.write(f"Data saved to CSV/TSV files\n\n")
+                
+            except Exception as e:
+                _log_installer_error(log_file, installer, e)
+        
+        # Final summary
+        print("\nAll installers processed. Final summary:")
+        print(f"Total companies processed: {sinks.installer_count}")
+        print(f"Total media items: {sinks.media_count}")
+        print(f"Total reviews: {sinks.review_count}")
+        print("Request pacing per host:")
+        for host_summary in DEFAULT_LIMITER.summaries() + DEFAULT_POLICY.summaries():
+            print(f"  {host_summary}")
+        DEFAULT_SELECTORS.report()
+        if sqlite_path:
+            print(f"\nAll data has been saved to: {os.path.abspath(sqlite_path)}")
+            print(f"Generate the CSV/TSV catalogs with: python sqlite_store.py {sqlite_path}")
+            print(f"Log File: {os.path.abspath(log_file)}")
+        else:
             print(f"\nAll data has been saved to:")
             print(f"1. Installer Details: {os.path.abspath(all_output_file)}")
             print(f"2. Installer Details (TSV): {os.path.abspath(all_output_file_tsv)}")
             print(f"3. Media Catalog: {os.path.abspath(all_media_catalog_file)}")
             print(f"4. Reviews Catalog: {os.path.abspath(all_reviews_catalog_file)}")
             print(f"5. Log File: {os.path.abspath(log_file)}")
-            
-            # Log final summary
-            with open(log_file, 'a', encoding='utf-8') as logf:
-                logf.write(f"\n{'='*80}\n")
-                logf.write(f"SCRAPING SESSION COMPLETED: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
-                logf.write(f"Final summary:\n")
-                logf.write(f"Total companies processed: {len(all_installer_details)}\n")
-                logf.write(f"Total media items: {len(all_media_items)}\n")
-                logf.write(f"Total reviews: {len(all_reviews)}\n")
-                logf.write(f"All data saved to:\n")
-                logf.write(f"1. Installer Details: {os.path.abspath(all_output_file)}\n")
-                logf.write(f"2. Installer Details (TSV): {os.path.abspath(all_output_file_tsv)}\n")
-                logf.write(f"3. Media Catalog: {os.path.abspath(all_media_catalog_file)}\n")
-                logf.write(f"4. Reviews Catalog: {os.path.abspath(all_reviews_catalog_file)}\n")
-                logf.write(f"{'='*80}\n")
-            
+
+        # Log final summary
+        with open(log_file, 'a', encoding='utf-8') as logf:
+            logf.write(f"\n{'='*80}\n")
+            logf.write(f"SCRAPING SESSION COMPLETED: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
+            logf.write(f"Final summary:\n")
+            logf.write(f"Total companies processed: {sinks.installer_count}\n")
+            logf.write(f"Total media items: {sinks.media_count}\n")
+            logf.write(f"Total reviews: {sinks.review_count}\n")
+            logf.write(f"All data saved to:\n")
+            logf.write(f"1. Installer Details: {os.path.abspath(all_output_file)}\n")
+            logf.write(f"2. Installer Details (TSV): {os.path.abspath(all_output_file_tsv)}\n")
+            logf.write(f"3. Media Catalog: {os.path.abspath(all_media_catalog_file)}\n")
+            logf.write(f"4. Reviews Catalog: {os.path.abspath(all_reviews_catalog_file)}\n")
+            logf.write(f"{'='*80}\n")
+
     except Exception as e:
         error_message = f"Error in main process: {e}"
         print(error_message)
@@ -1476,6 +1111,203 @@ def main():
             logf.write(f"CRITICAL ERROR: {error_message}\n")
             logf.write(f"Error occurred at: {time.strftime('%Y-%m-%d %H:%M:%S')}\n")
             logf.write(f"{'!'*80}\n")
+    finally:
+        # Flush, fsync and close all catalogs even if the run was interrupted
+        sinks.close()
+        if search_index:
+            search_index.close()
+        id_map.save()
+        crawl_state.close()
+        review_gaps.close()
+        DEFAULT_SELECTORS.save()
+        if review_sync:
+            review_sync.close()
+
+def run_worker(queue_path, worker_id=None, sqlite_path=None, search_index_path=None,
+               visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT, idle_exit=True, delta_reviews=False):
+    """
+    Pull installer jobs from a shared work queue until it is drained
+    
+    Each worker writes its own catalogs (suffixed with the worker id) or its own
+    SQLite database; merge them afterwards with `python work_queue.py merge`.
+    
+    Args:
+        queue_path: Work queue database shared by all workers
+        worker_id: Name of this worker (defaults to host name and process id)
+        sqlite_path: Optional SQLite database to store results in instead of the CSV/TSV catalogs
+        search_index_path: Optional full-text search index to update
+        visibility_timeout: Seconds a leased job stays with this worker; must exceed the slowest installer
+        idle_exit: Stop when no job is available instead of waiting for more
+        delta_reviews: Only read reviews newer than this worker's last crawl of the installer
+    """
+    worker_id = worker_id or default_worker_id()
+    print(f"Worker {worker_id} pulling jobs from {queue_path}")
+    
+    if sqlite_path:
+        sinks = SQLiteStore(sqlite_path)
+    else:
+        sinks = CrawlSinks(f'all_{worker_id}_installer_details.csv', f'all_{worker_id}_installer_details.tsv',
+                           f'all_{worker_id}_media_catalog.csv', f'all_{worker_id}_reviews_catalog.csv')
+    search_index = SearchIndex(search_index_path) if search_index_path else None
+    queue = WorkQueue(queue_path, visibility_timeout=visibility_timeout)
+    review_sync = ReviewSyncState() if delta_reviews else None
+    review_gaps = ReviewGapLog()
+    crawl_state = CrawlState()
+    DEFAULT_SELECTORS.load()
+    completed = 0
+    
+    try:
+        while True:
+            job = queue.lease(worker_id)
+            if job is None:
+                if idle_exit:
+                    break
+                time.sleep(30)
+                continue
+            
+            installer = job.payload
+            print(f"\n{'='*50}\nJob {job.job_id} (attempt {job.attempts}): {installer['company_name']}\n{'='*50}")
+            try:
+                start_time = time.time()
+                details = scrape_installer_details(installer['profile_url'], job.company_id, review_sync)
+                # The scrape can outlast the lease: extend it before writing, and leave the job to a
+                # worker that has taken it over in the meantime
+                if not queue.renew(job, worker_id):
+                    print(f"Job {job.job_id} was taken over by another worker; discarding this scrape")
+                    continue
+                write_installer_results(installer, job.company_id, details, sinks, search_index)
+                crawl_state.record(job.company_id, details['reviews_data'], time.time() - start_time)
+                review_gaps.record(job.company_id, installer['company_name'], installer['profile_url'],
+                                   details['reviews_data'])
+                # Rows are durable before the job is marked done, so a crash here only repeats the job
+                sinks.checkpoint()
+                if search_index:
+                    search_index.checkpoint()
+                queue.complete(job)
+                completed += 1
+            except Exception as e:
+                print(f"Job {job.job_id} failed: {e}")
+                queue.fail(job, worker_id, e)
+        
+        counts = queue.counts()
+        print(f"\nWorker {worker_id} finished: {completed} jobs completed by this worker")
+        print(f"Queue: {counts['pending']} pending, {counts['leased']} leased, "
+              f"{counts['done']} done, {counts['failed']} failed")
+        DEFAULT_SELECTORS.report()
+    finally:
+        sinks.close()
+        if search_index:
+            search_index.close()
+        queue.close()
+        review_gaps.close()
+        crawl_state.close()
+        DEFAULT_SELECTORS.save()
+        if review_sync:
+            review_sync.close()
+
+def reparse_archive(csv_file='massachusetts_solar_installers.csv', archive_path=DEFAULT_ARCHIVE_DIR,
+                    output_name='reparsed', sqlite_path=None, workers=None):
+    """
+    Rebuild the installer, media and review catalogs from archived pages, without a browser or network
+    
+    Runs the current extraction code over the newest archived profile, gallery
+    and review pages of every installer in the listing, so a selector fix can
+    be applied to the whole dataset without crawling again. Media already
+    downloaded by a crawl keep their files and ids; nothing new is downloaded.
+    
+    Args:
+        csv_file: Listing CSV from scrape_installers.py or crawl_scheduler.py
+        archive_path: Page archive written by earlier crawls (see page_archive.py)
+        output_name: Name used in the rebuilt catalogs (all_<name>_installer_details.csv, ...)
+        sqlite_path: Optional new (or empty) SQLite database to store results in instead of the CSV/TSV catalogs
+        workers: Parser processes (defaults to the number of CPUs)
+    """
+    if sqlite_path:
+        if has_installers(sqlite_path):
+            # Review and media ids change with the capture, so rebuilding into a crawl database would
+            # add every review and media item a second time
+            print(f"{sqlite_path} already holds installers. Rebuild into a new database.")
+            return
+        sinks = SQLiteStore(sqlite_path)
+    else:
+        output_files = [f'all_{output_name}_installer_details.csv', f'all_{output_name}_installer_details.tsv',
+                        f'all_{output_name}_media_catalog.csv', f'all_{output_name}_reviews_catalog.csv']
+        existing = [path for path in output_files if os.path.exists(path)]
+        if existing:
+            # Catalogs are appended to, so rebuilding over old output would duplicate every row
+            print(f"Output already exists: {', '.join(existing)}. Remove it or choose another --output-name.")
+            return
+        sinks = CrawlSinks(*output_files)
+    
+    id_map = SupplierIdMap()
+    DEFAULT_SELECTORS.load()
+    start_time = time.time()
+    total_installers = count_listing(csv_file)
+    print(f"Reparsing {total_installers} installers from {os.path.abspath(archive_path)}")
+    
+    try:
+        listing = iter_listing(csv_file, id_map)
+        for idx, company_id, installer, details, elapsed_time in iter_reparsed_details(listing, archive_path, workers):
+            try:
+                write_installer_results(installer, company_id, details, sinks)
+            except Exception as e:
+                print(f"Error writing results for {installer['company_name']}: {e}")
+        
+        print(f"\nReparsed {sinks.installer_count} of {total_installers} installers "
+              f"in {time.time() - start_time:.0f} seconds")
+        print(f"Total media items: {sinks.media_count}")
+        print(f"Total reviews: {sinks.review_count}")
+        DEFAULT_SELECTORS.report()
+    finally:
+        sinks.close()
+        id_map.save()
+        DEFAULT_SELECTORS.save()
 
 if __name__ == "__main__":
-    main() 
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Scrape installer details, media and reviews")
+    parser.add_argument('--input', default='massachusetts_solar_installers.csv',
+                        help="Listing CSV to read installers from (e.g. national_solar_installers.csv)")
+    parser.add_argument('--output-name',
+                        help="Name used in all_<name>_installer_details.csv/.tsv "
+                             "(default: massachusetts, or reparsed with --reparse)")
+    parser.add_argument('--sqlite', metavar='DB_PATH',
+                        help="Store results in this SQLite database instead of the CSV/TSV catalogs")
+    parser.add_argument('--search-index', metavar='DB_PATH',
+                        help="Incrementally update this full-text search index with new reviews")
+    parser.add_argument('--prioritize', action='store_true',
+                        help="Crawl stale and recently active installers first")
+    parser.add_argument('--budget-minutes', type=float,
+                        help="Refresh as much as possible within this many minutes, most valuable first")
+    parser.add_argument('--delta-reviews', action='store_true',
+                        help="Only read reviews newer than the last crawl (see review_sync.py)")
+    parser.add_argument('--queue', metavar='QUEUE_DB',
+                        help="Run as a worker pulling installer jobs from this shared work queue")
+    parser.add_argument('--worker-id', help="Worker name used in its output files (default: host-pid)")
+    parser.add_argument('--lease-seconds', type=int, default=DEFAULT_VISIBILITY_TIMEOUT,
+                        help="Seconds before an unfinished job is handed to another worker")
+    parser.add_argument('--wait', action='store_true', help="Keep polling when the queue is empty")
+    parser.add_argument('--archive', metavar='DIR', default=DEFAULT_ARCHIVE_DIR,
+                        help="Keep a compressed copy of every fetched page here (see page_archive.py)")
+    parser.add_argument('--no-archive', action='store_true', help="Do not archive fetched pages")
+    parser.add_argument('--reparse', action='store_true',
+                        help="Rebuild the catalogs from the pages in --archive instead of crawling")
+    parser.add_argument('--workers', type=int, help="Parser processes for --reparse (default: CPU count)")
+    args = parser.parse_args()
+    # A reparse reads the archive and fetches nothing, so there is nothing to archive
+    if not args.no_archive and not args.reparse:
+        enable_archive(args.archive)
+    try:
+        if args.reparse:
+            reparse_archive(csv_file=args.input, archive_path=args.archive,
+                            output_name=args.output_name or 'reparsed', sqlite_path=args.sqlite,
+                            workers=args.workers)
+        elif args.queue:
+            run_worker(args.queue, worker_id=args.worker_id, sqlite_path=args.sqlite,
+                       search_index_path=args.search_index, visibility_timeout=args.lease_seconds,
+                       idle_exit=not args.wait, delta_reviews=args.delta_reviews)
+        else:
+            main(csv_file=args.input, output_name=args.output_name or 'massachusetts', sqlite_path=args.sqlite,
+                 search_index_path=args.search_index, prioritize=args.prioritize,
+                 budget_minutes=args.budget_minutes, delta_reviews=args.delta_reviews)
+    finally:
+        close_archive()
@@ -0,0 +1,397 @@
+import argparse
+import csv
+import json
+import os
+import threading
+import time
+from collections import OrderedDict
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+from installer_index import InstallerIndex, parse_states
+from output_sinks import MEDIA_FIELDNAMES, REVIEW_FIELDNAMES
+from search_index import review_key
+
+DEFAULT_CATALOGS = {
+    'installers': 'all_massachusetts_installer_details.tsv',
+    'media': 'all_media_catalog.csv',
+    'reviews': 'all_reviews_catalog.csv'
+}
+
+DEFAULT_CACHE_SIZE = 2048
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+# How often (seconds) to check whether a new crawl has replaced the catalogs
+RELOAD_CHECK_INTERVAL = 2.0
+
+# Changed files are loaded only once they have stayed unchanged this long (seconds), so a crawl
+# still appending to them is not served half-written
+RELOAD_SETTLE_SECONDS = 30.0
+
+# Per-company rows are kept as tuples in catalog column order (minus the company columns)
+MEDIA_COLUMNS = [field for field in MEDIA_FIELDNAMES if field not in ('company_id', 'company_name')]
+REVIEW_COLUMNS = [field for field in REVIEW_FIELDNAMES if field not in ('company_id', 'company_name')]
+
+
+def _iter_catalog(path):
+    if not path or not os.path.exists(path):
+        return
+    delimiter = '\t' if path.endswith('.tsv') else ','
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file, delimiter=delimiter):
+            yield row
+
+
+def _to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+class CrawlDataset:
+    """
+    In-memory, read-only view of one crawl's catalogs.
+
+    Installers are kept as dicts keyed by id, while media and reviews are
+    grouped per company as tuples, which are far smaller than one dict per row.
+    The catalogs are append-only, so an installer crawled twice has two rows
+    (the last one wins) and its reviews appear twice (deduplicated with
+    search_index.review_key).
+    """
+
+    def __init__(self, installer_rows, media_rows, review_rows):
+        self.installers = {}
+        index_rows = {}
+        for row in installer_rows:
+            installer_id = _to_int(row.get('id'), None)
+            if installer_id is None:
+                continue
+            self.installers[installer_id] = {
+                'id': installer_id,
+                'company_name': row.get('company_name', ''),
+                'description': row.get('description', ''),
+                'profile_url': row.get('profile_url', ''),
+                'states_served': parse_states(row.get('states_served')),
+                'headquarters': row.get('headquarters', ''),
+                'other_locations': [loc.strip() for loc in (row.get('other_locations') or '').split('|') if loc.strip()],
+                'image_count': _to_int(row.get('image_count')),
+                'video_count': _to_int(row.get('video_count')),
+                'aggregate_rating': _to_float(row.get('aggregate_rating')),
+                'review_count': _to_int(row.get('review_count'))
+            }
+            index_rows[installer_id] = row
+        self.index = InstallerIndex.build(index_rows.values())
+
+        self.media = {}
+        for row in media_rows:
+            company_media = self.media.setdefault(_to_int(row.get('company_id')), [])
+            company_media.append(tuple(row.get(column, '') for column in MEDIA_COLUMNS))
+
+        self.reviews = {}
+        self.total_reviews = 0
+        seen_reviews = set()
+        for row in review_rows:
+            key = review_key(row)
+            if key in seen_reviews:
+                continue
+            seen_reviews.add(key)
+            company_reviews = self.reviews.setdefault(_to_int(row.get('company_id')), [])
+            values = [row.get(column, '') for column in REVIEW_COLUMNS]
+            values[REVIEW_COLUMNS.index('rating')] = _to_float(row.get('rating'))
+            company_reviews.append(tuple(values))
+            self.total_reviews += 1
+
+    @classmethod
+    def from_catalogs(cls, catalogs):
+        return cls(_iter_catalog(catalogs['installers']), _iter_catalog(catalogs['media']),
+                   _iter_catalog(catalogs['reviews']))
+
+    @classmethod
+    def from_sqlite(cls, db_path):
+        import sqlite_store
+        conn = sqlite_store.connect_readonly(db_path)
+        try:
+            return cls(sqlite_store.iter_installer_rows(conn), sqlite_store.iter_media_rows(conn),
+                       sqlite_store.iter_review_rows(conn))
+        finally:
+            conn.close()
+
+    def installers_by_state(self, state=None, min_rating=None, min_reviews=None):
+        if state:
+            states = [code for code in state.upper().split(',') if code]
+            matches = self.index.query(all_states=states, min_rating=min_rating, min_reviews=min_reviews)
+        else:
+            matches = self.index.query(min_rating=min_rating, min_reviews=min_reviews)
+        return [self._summary(self.installers[match['id']]) for match in matches]
+
+    def installer(self, installer_id, review_limit=DEFAULT_PAGE_SIZE):
+        installer = self.installers.get(installer_id)
+        if installer is None:
+            return None
+        result = dict(installer)
+        result['media'] = [dict(zip(MEDIA_COLUMNS, values)) for values in self.media.get(installer_id, [])]
+        result['reviews'] = self.review_page(installer_id, 1, review_limit)
+        return result
+
+    def review_page(self, installer_id, page, per_page):
+        company_reviews = self.reviews.get(installer_id, [])
+        start = (page - 1) * per_page
+        return {
+            'installer_id': installer_id,
+            'page': page,
+            'per_page': per_page,
+            'total': len(company_reviews),
+            'pages': (len(company_reviews) + per_page - 1) // per_page,
+            'reviews': [dict(zip(REVIEW_COLUMNS, values)) for values in company_reviews[start:start + per_page]]
+        }
+
+    @staticmethod
+    def _summary(installer):
+        return {key: installer[key] for key in
+                ('id', 'company_name', 'profile_url', 'states_served', 'headquarters',
+                 'aggregate_rating', 'review_count')}
+
+
+class ResponseCache:
+    """Thread-safe LRU cache of encoded JSON responses"""
+
+    def __init__(self, max_entries=DEFAULT_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+    def put(self, key, value):
+        with self._lock:
+            self._entries[key] = value
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class CrawlDataStore:
+    """
+    Holds the current dataset and swaps in a new one when a crawl lands.
+
+    The catalog files' modification times are checked at most every
+    RELOAD_CHECK_INTERVAL seconds. Changed files are reloaded once they
+    have stayed unchanged for RELOAD_SETTLE_SECONDS, so a crawl that is
+    still writing them is not loaded halfway. Every load gets a new
+    generation number; responses are cached under the generation of the
+    dataset they were built from, so one built from the old dataset while
+    a reload ran is never served for the new one.
+    """
+
+    def __init__(self, catalogs=None, sqlite_path=None, cache_size=DEFAULT_CACHE_SIZE,
+                 settle_seconds=RELOAD_SETTLE_SECONDS):
+        self.catalogs = catalogs or DEFAULT_CATALOGS
+        self.sqlite_path = sqlite_path
+        self.settle_seconds = settle_seconds
+        self.cache = ResponseCache(cache_size)
+        self._lock = threading.Lock()
+        self._last_check = 0.0
+        self._signature = None
+        self._changed_signature = None
+        self._changed_since = 0.0
+        self.current = (None, 0)  # (dataset, generation), swapped as one so readers see a matching pair
+        self.loaded_at = None
+        self.reload_if_changed(force=True)
+
+    @property
+    def dataset(self):
+        return self.current[0]
+
+    def _watched_paths(self):
+        if self.sqlite_path:
+            # WAL commits land in the -wal file before being checkpointed into the database
+            return [self.sqlite_path, f"{self.sqlite_path}-wal"]
+        return list(self.catalogs.values())
+
+    def _current_signature(self):
+        signature = []
+        for path in self._watched_paths():
+            try:
+                stat = os.stat(path)
+                signature.append((path, stat.st_mtime_ns, stat.st_size))
+            except FileNotFoundError:
+                signature.append((path, None, None))
+        return tuple(signature)
+
+    def reload_if_changed(self, force=False):
+        now = time.monotonic()
+        if not force and now - self._last_check < RELOAD_CHECK_INTERVAL:
+            return False
+        with self._lock:
+            self._last_check = now
+            signature = self._current_signature()
+            if not force:
+                if signature == self._signature:
+                    return False
+                if signature != self._changed_signature:
+                    # Still being written (or just finished): wait until it settles
+                    self._changed_signature = signature
+                    self._changed_since = now
+                    return False
+                if now - self._changed_since < self.settle_seconds:
+                    return False
+            start = time.time()
+            if self.sqlite_path:
+                dataset = CrawlDataset.from_sqlite(self.sqlite_path)
+            else:
+                dataset = CrawlDataset.from_catalogs(self.catalogs)
+            self.current = (dataset, self.current[1] + 1)
+            self._signature = signature
+            self._changed_signature = None
+            self.loaded_at = time.strftime('%Y-%m-%d %H:%M:%S')
+            self.cache.clear()
+            print(f"Loaded {len(dataset.installers)} installers and {dataset.total_reviews} reviews "
+                  f"in {time.time() - start:.2f} seconds")
+            return True
+
+
+def _query_value(query, name, convert, default=None):
+    values = query.get(name)
+    if not values:
+        return default
+    try:
+        return convert(values[0])
+    except ValueError:
+        raise ValueError(f"Invalid value for '{name}': {values[0]}")
+
+
+class CrawlApiHandler(BaseHTTPRequestHandler):
+    """
+    Read-only JSON API:
+
+        GET /health
+        GET /installers?state=NH[,MA]&min_rating=4.5&min_reviews=10
+        GET /installers/<id>
+        GET /installers/<id>/reviews?page=1&per_page=20
+    """
+
+    store = None
+    server_version = 'InstallerHubAPI/1.0'
+
+    def do_GET(self):
+        self.store.reload_if_changed()
+        dataset, generation = self.store.current
+        cache_key = (generation, self.path)
+        cached = self.store.cache.get(cache_key)
+        if cached is not None:
+            self._send(*cached)
+            return
+
+        try:
+            status, payload = self._route(dataset)
+        except ValueError as e:
+            status, payload = 400, {'error': str(e)}
+
+        body = json.dumps(payload, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+        # Health reports live counters, so it is never cached
+        if status == 200 and not self.path.startswith('/health'):
+            self.store.cache.put(cache_key, (status, body))
+        self._send(status, body)
+
+    def _route(self, dataset):
+        parsed = urlparse(self.path)
+        parts = [part for part in parsed.path.split('/') if part]
+        query = parse_qs(parsed.query)
+
+        if parts == ['health']:
+            return 200, {
+                'status': 'ok',
+                'installers': len(dataset.installers),
+                'reviews': dataset.total_reviews,
+                'loaded_at': self.store.loaded_at,
+                'generation': self.store.current[1],
+                'cache_hits': self.store.cache.hits,
+                'cache_misses': self.store.cache.misses
+            }
+
+        if parts == ['installers']:
+            installers = dataset.installers_by_state(
+                state=_query_value(query, 'state', str),
+                min_rating=_query_value(query, 'min_rating', float),
+                min_reviews=_query_value(query, 'min_reviews', int)
+            )
+            return 200, {'count': len(installers), 'installers': installers}
+
+        if len(parts) in (2, 3) and parts[0] == 'installers':
+            installer_id = _to_int(parts[1], None)
+            if installer_id is None or installer_id not in dataset.installers:
+                return 404, {'error': f"Installer not found: {parts[1]}"}
+            if len(parts) == 2:
+                return 200, dataset.installer(installer_id)
+            if parts[2] == 'reviews':
+                page = max(1, _query_value(query, 'page', int, 1))
+                per_page = min(MAX_PAGE_SIZE, max(1, _query_value(query, 'per_page', int, DEFAULT_PAGE_SIZE)))
+                return 200, dataset.review_page(installer_id, page, per_page)
+
+        return 404, {'error': f"Unknown endpoint: {parsed.path}"}
+
+    def _send(self, status, body):
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Cache-Control', 'public, max-age=60')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        # Per-request logging to stderr would dominate the cost of cached responses
+        pass
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Serve the crawled installer data as a read-only JSON API")
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8000)
+    parser.add_argument('--sqlite', metavar='DB_PATH', help="Serve from a crawl database instead of the catalogs")
+    parser.add_argument('--installers', default=DEFAULT_CATALOGS['installers'])
+    parser.add_argument('--media', default=DEFAULT_CATALOGS['media'])
+    parser.add_argument('--reviews', default=DEFAULT_CATALOGS['reviews'])
+    parser.add_argument('--cache-size', type=int, default=DEFAULT_CACHE_SIZE)
+    parser.add_argument('--settle-seconds', type=float, default=RELOAD_SETTLE_SECONDS,
+                        help="Reload changed catalogs once they have been unchanged this long")
+    args = parser.parse_args()
+
+    catalogs = {'installers': args.installers, 'media': args.media, 'reviews': args.reviews}
+    CrawlApiHandler.store = CrawlDataStore(catalogs, sqlite_path=args.sqlite, cache_size=args.cache_size,
+                                           settle_seconds=args.settle_seconds)
+
+    server = ThreadingHTTPServer((args.host, args.port), CrawlApiHandler)
+    print(f"Serving installer API on http://{args.host}:{args.port}/")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("Shutting down API server...")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    main()
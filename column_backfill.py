@@ -0,0 +1,193 @@
+import argparse
+import collections
+import csv
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+from supplier_ids import normalize_profile_url
+
+# Rows submitted ahead of the writer per worker; bounds memory however long the file is
+DEFAULT_WINDOW_PER_WORKER = 4
+
+
+def _atomic_replace(temp_path, path):
+    with open(temp_path, 'rb+') as f:
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def _compute(compute, row, resources):
+    if resources is None:
+        return compute(row, None)
+    with resources.checkout() as resource:
+        return compute(row, resource)
+
+
+def backfill_column(csv_path, column, compute, json_path=None, workers=4, resources=None,
+                    only_missing=False, json_value=None, key_field='profile_url'):
+    """
+    Fill or refresh one column of a listing CSV (and its JSON twin) in a single streaming pass.
+
+    Rows are computed by a pool of worker threads and written in their
+    original order to a temp file next to the CSV, which then atomically
+    replaces it. Only a bounded window of rows is in flight, so memory does
+    not grow with the file. If the run is interrupted, the rows already
+    computed are kept and the rest pass through unchanged, so a rerun with
+    only_missing=True picks up where it stopped; a crash before the rename
+    leaves the original file untouched.
+
+    The JSON file, if given, is updated from the same pass: values are
+    joined to its entries by normalized profile URL, never by list position.
+
+    Args:
+        csv_path: Listing CSV to update in place
+        column: Column to fill (appended to the header if new)
+        compute: Function (row, resource) returning the new cell value as a string
+        json_path: Optional JSON list of the same installers to update too
+        workers: Worker threads
+        resources: Optional worker_resources.WorkerResources lending each task a resource (e.g. a browser)
+        only_missing: Skip rows whose column already has a value
+        json_value: Converts a cell value to its JSON form (defaults to the cell value)
+        key_field: Row field identifying an installer in both files
+
+    Returns:
+        Dictionary with rows, computed, failed and skipped counts
+    """
+    temp_path = f"{csv_path}.{os.getpid()}.tmp"
+    window = max(1, workers) * DEFAULT_WINDOW_PER_WORKER
+    counts = {'rows': 0, 'computed': 0, 'failed': 0, 'skipped': 0}
+    values_by_key = {}
+    interrupted = False
+
+    def write(writer, row):
+        writer.writerow(row)
+        counts['rows'] += 1
+        key = normalize_profile_url(row.get(key_field))
+        if key:
+            values_by_key[key] = row.get(column, '')
+
+    def drain_one(writer, pending):
+        # The row leaves the window only once written, so an interrupt while waiting loses nothing
+        row, future = pending[0]
+        if future is not None:
+            try:
+                row[column] = future.result()
+                counts['computed'] += 1
+            except Exception as e:
+                counts['failed'] += 1
+                print(f"Could not compute {column} for {row.get(key_field)}: {e}")
+        pending.popleft()
+        write(writer, row)
+
+    def abandon(pending):
+        # Rows whose value is not ready go through unchanged; running jobs finish in the background
+        print("Interrupted: keeping the rows done so far, passing the rest through unchanged")
+        for position, (queued_row, future) in enumerate(pending):
+            if future is None:
+                continue
+            if future.done() and not future.cancelled() and future.exception() is None:
+                continue
+            future.cancel()
+            pending[position] = (queued_row, None)
+
+    executor = ThreadPoolExecutor(max_workers=workers)
+    try:
+        with open(csv_path, 'r', newline='', encoding='utf-8-sig') as source, \
+                open(temp_path, 'w', newline='', encoding='utf-8') as target:
+            reader = csv.DictReader(source)
+            fieldnames = list(reader.fieldnames or [])
+            if column not in fieldnames:
+                fieldnames.append(column)
+            writer = csv.DictWriter(target, fieldnames=fieldnames, quoting=csv.QUOTE_ALL)
+            writer.writeheader()
+
+            pending = collections.deque()
+            for row in reader:
+                row.setdefault(column, '')
+                if interrupted or (only_missing and row[column]):
+                    if not interrupted:
+                        counts['skipped'] += 1
+                    pending.append((row, None))
+                else:
+                    pending.append((row, executor.submit(_compute, compute, row, resources)))
+                try:
+                    while len(pending) >= window:
+                        drain_one(writer, pending)
+                except KeyboardInterrupt:
+                    interrupted = True
+                    abandon(pending)
+            try:
+                while pending:
+                    drain_one(writer, pending)
+            except KeyboardInterrupt:
+                abandon(pending)
+                while pending:
+                    drain_one(writer, pending)
+    except BaseException:
+        executor.shutdown(wait=True, cancel_futures=True)
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        raise
+    executor.shutdown(wait=True)
+
+    _atomic_replace(temp_path, csv_path)
+    print(f"Updated {column} in {csv_path}: {counts['computed']} computed, {counts['failed']} failed, "
+          f"{counts['skipped']} already filled, {counts['rows']} rows")
+
+    if json_path and os.path.exists(json_path):
+        updated = update_json_column(json_path, column, values_by_key, json_value, key_field)
+        print(f"Updated {column} for {updated} entries in {json_path}")
+    return counts
+
+
+def update_json_column(json_path, column, values_by_key, json_value=None, key_field='profile_url'):
+    """
+    Set one field on every entry of a JSON list, joined by normalized profile URL.
+
+    Args:
+        json_path: JSON file holding a list of installer objects
+        column: Field to set
+        values_by_key: Normalized profile URL to cell value, from backfill_column
+        json_value: Converts a cell value to its JSON form
+        key_field: Entry field holding the profile URL
+
+    Returns:
+        Number of entries updated
+    """
+    with open(json_path, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+
+    updated = 0
+    for entry in entries:
+        key = normalize_profile_url(entry.get(key_field))
+        if key in values_by_key:
+            value = values_by_key[key]
+            entry[column] = json_value(value) if json_value else value
+            updated += 1
+
+    temp_path = f"{json_path}.{os.getpid()}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        json.dump(entries, f, indent=2, ensure_ascii=False)
+    _atomic_replace(temp_path, json_path)
+    return updated
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Copy one column of a listing CSV into its JSON twin")
+    parser.add_argument('csv_file', help="Listing CSV, e.g. massachusetts_solar_installers.csv")
+    parser.add_argument('json_file', help="JSON list of the same installers")
+    parser.add_argument('column', help="Column to copy")
+    parser.add_argument('--list-separator', help="Split cell values on this separator into JSON lists (e.g. '|')")
+    args = parser.parse_args()
+
+    # A pass-through backfill: every row keeps its value and the JSON picks it up
+    json_value = None
+    if args.list_separator:
+        json_value = lambda value: value.split(args.list_separator) if value else []
+    backfill_column(args.csv_file, args.column, lambda row, resource: row.get(args.column, ''),
+                    json_path=args.json_file, workers=1, json_value=json_value)
+
+
+if __name__ == "__main__":
+    main()
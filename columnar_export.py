@@ -0,0 +1,299 @@
+import argparse
+import csv
+import os
+import re
+from datetime import datetime
+from functools import lru_cache
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pyarrow is only needed for this export
+    pa = None
+    pq = None
+
+# Rows per Parquet row group / Arrow record batch
+DEFAULT_ROW_GROUP_SIZE = 50000
+
+# Date layouts produced by the review scraper ("Mar 5, 2024", "March 5 2024", ...)
+REVIEW_DATE_FORMATS = [
+    '%b %d, %Y', '%B %d, %Y', '%b %d %Y', '%B %d %Y',
+    '%m/%d/%Y', '%m/%d/%y', '%Y-%m-%d'
+]
+
+
+@lru_cache(maxsize=8192)
+def parse_review_date(text):
+    """
+    Parse a scraped review date into a date object.
+
+    Args:
+        text: Date text as scraped, e.g. "Mar 5, 2024" or "Unknown"
+
+    Returns:
+        datetime.date, or None when the text is missing or not a recognizable date
+    """
+    if not text:
+        return None
+    text = re.sub(r'\s+', ' ', text.strip())
+    # "Sept 3, 2023" is common on review sites but not understood by %b
+    text = re.sub(r'^Sept\b', 'Sep', text)
+    for date_format in REVIEW_DATE_FORMATS:
+        try:
+            return datetime.strptime(text, date_format).date()
+        except ValueError:
+            continue
+    return None
+
+
+def _require_pyarrow():
+    if pa is None:
+        raise ImportError("Columnar export requires pyarrow. Install it with: pip install pyarrow")
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _RunningDictionary:
+    """
+    Dictionary encoder whose dictionary only ever grows.
+
+    Every batch references a prefix-extended version of the same dictionary,
+    which keeps the encoding valid across row groups and lets the Arrow IPC
+    writer emit dictionary deltas instead of full replacements.
+    """
+
+    def __init__(self):
+        self.codes = {}
+        self.values = []
+
+    def encode(self, items):
+        indices = []
+        for item in items:
+            if item is None:
+                indices.append(None)
+                continue
+            code = self.codes.get(item)
+            if code is None:
+                code = len(self.values)
+                self.codes[item] = code
+                self.values.append(item)
+            indices.append(code)
+        return pa.DictionaryArray.from_arrays(
+            pa.array(indices, type=pa.int32()), pa.array(self.values, type=pa.string())
+        )
+
+
+# Column layouts as (name, arrow type, converter from the catalog string value)
+def _review_columns():
+    return [
+        ('company_id', pa.int64(), _to_int),
+        ('company_name', pa.dictionary(pa.int32(), pa.string()), None),
+        ('review_id', pa.string(), str),
+        ('reviewer_name', pa.string(), str),
+        ('review_date', pa.date32(), parse_review_date),
+        ('review_date_raw', pa.string(), str),
+        ('rating', pa.float64(), _to_float),
+        ('review_text', pa.string(), str),
+    ]
+
+
+def _media_columns():
+    return [
+        ('company_id', pa.int64(), _to_int),
+        ('company_name', pa.dictionary(pa.int32(), pa.string()), None),
+        ('media_id', pa.string(), str),
+        ('media_type', pa.dictionary(pa.int32(), pa.string()), None),
+        ('url', pa.string(), str),
+        ('local_path', pa.string(), str),
+        ('filename', pa.string(), str),
+        ('video_platform', pa.dictionary(pa.int32(), pa.string()), None),
+        ('video_id', pa.string(), str),
+        ('video_url', pa.string(), str),
+        ('content_digest', pa.string(), str),
+        ('real_format', pa.dictionary(pa.int32(), pa.string()), None),
+        ('width', pa.int64(), _to_int),
+        ('height', pa.int64(), _to_int),
+        ('byte_size', pa.int64(), _to_int),
+        ('thumbnails', pa.string(), str),
+        ('phash', pa.string(), str),
+        ('duplicate_of', pa.string(), str),
+    ]
+
+
+class ColumnarWriter:
+    """
+    Streams catalog rows into a typed Parquet or Arrow IPC file one row group at a time.
+
+    Only the current row group is held in memory, plus the (small) dictionaries
+    of the dictionary-encoded columns.
+    """
+
+    def __init__(self, path, columns, file_format='parquet', row_group_size=DEFAULT_ROW_GROUP_SIZE):
+        _require_pyarrow()
+        self.path = path
+        self.columns = columns
+        self.file_format = file_format
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+
+        self.schema = pa.schema([(name, arrow_type) for name, arrow_type, _ in columns])
+        self._dictionaries = {
+            name: _RunningDictionary() for name, arrow_type, _ in columns
+            if pa.types.is_dictionary(arrow_type)
+        }
+        self._buffer = {name: [] for name, _, _ in columns}
+        self._buffered_rows = 0
+
+        if file_format == 'parquet':
+            self._writer = pq.ParquetWriter(path, self.schema, compression='zstd')
+        elif file_format == 'arrow':
+            options = pa.ipc.IpcWriteOptions(emit_dictionary_deltas=True)
+            self._sink = pa.OSFile(path, 'wb')
+            self._writer = pa.ipc.new_file(self._sink, self.schema, options=options)
+        else:
+            raise ValueError(f"Unsupported columnar format: {file_format}")
+
+    def write_row(self, row):
+        for name, _, convert in self.columns:
+            if name == 'review_date_raw':
+                value = row.get('review_date') or None
+            else:
+                value = row.get(name)
+                if value == '':
+                    value = None
+                if value is not None and convert is not None:
+                    value = convert(value)
+            self._buffer[name].append(value)
+        self._buffered_rows += 1
+        if self._buffered_rows >= self.row_group_size:
+            self.flush()
+
+    def flush(self):
+        """Write the buffered rows as one row group / record batch"""
+        if not self._buffered_rows:
+            return
+        arrays = []
+        for name, arrow_type, _ in self.columns:
+            values = self._buffer[name]
+            if name in self._dictionaries:
+                arrays.append(self._dictionaries[name].encode(values))
+            else:
+                arrays.append(pa.array(values, type=arrow_type))
+        batch = pa.RecordBatch.from_arrays(arrays, schema=self.schema)
+        if self.file_format == 'parquet':
+            self._writer.write_batch(batch, row_group_size=self._buffered_rows)
+        else:
+            self._writer.write_batch(batch)
+        self.rows_written += self._buffered_rows
+        self._buffer = {name: [] for name, _, _ in self.columns}
+        self._buffered_rows = 0
+
+    def close(self):
+        self.flush()
+        self._writer.close()
+        if self.file_format == 'arrow':
+            self._sink.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _iter_csv_rows(csv_path):
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file):
+            yield row
+
+
+def export_reviews(rows, output_path, file_format='parquet', row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Write review catalog rows to a typed columnar file.
+
+    Args:
+        rows: Iterable of review catalog rows (e.g. from all_reviews_catalog.csv)
+        output_path: Destination .parquet or .arrow file
+        file_format: 'parquet' or 'arrow'
+        row_group_size: Rows per row group
+
+    Returns:
+        Number of rows written
+    """
+    _require_pyarrow()
+    with ColumnarWriter(output_path, _review_columns(), file_format, row_group_size) as writer:
+        for row in rows:
+            writer.write_row(row)
+    return writer.rows_written
+
+
+def export_media(rows, output_path, file_format='parquet', row_group_size=DEFAULT_ROW_GROUP_SIZE):
+    """
+    Write media catalog rows to a typed columnar file.
+
+    Args:
+        rows: Iterable of media catalog rows (e.g. from all_media_catalog.csv)
+        output_path: Destination .parquet or .arrow file
+        file_format: 'parquet' or 'arrow'
+        row_group_size: Rows per row group
+
+    Returns:
+        Number of rows written
+    """
+    _require_pyarrow()
+    with ColumnarWriter(output_path, _media_columns(), file_format, row_group_size) as writer:
+        for row in rows:
+            writer.write_row(row)
+    return writer.rows_written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Export the review and media catalogs to Parquet or Arrow")
+    parser.add_argument('--reviews', default='all_reviews_catalog.csv', help="Reviews catalog CSV")
+    parser.add_argument('--media', default='all_media_catalog.csv', help="Media catalog CSV")
+    parser.add_argument('--sqlite', metavar='DB_PATH', help="Read from a crawl database instead of the CSV catalogs")
+    parser.add_argument('--format', choices=['parquet', 'arrow'], default='parquet')
+    parser.add_argument('--output-dir', default='columnar')
+    parser.add_argument('--row-group-size', type=int, default=DEFAULT_ROW_GROUP_SIZE)
+    args = parser.parse_args()
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    extension = 'parquet' if args.format == 'parquet' else 'arrow'
+    reviews_output = os.path.join(args.output_dir, f'reviews.{extension}')
+    media_output = os.path.join(args.output_dir, f'media.{extension}')
+
+    conn = None
+    if args.sqlite:
+        import sqlite_store
+        conn = sqlite_store.connect_readonly(args.sqlite)
+        review_rows = sqlite_store.iter_review_rows(conn)
+        media_rows = sqlite_store.iter_media_rows(conn)
+    else:
+        review_rows = _iter_csv_rows(args.reviews) if os.path.exists(args.reviews) else []
+        media_rows = _iter_csv_rows(args.media) if os.path.exists(args.media) else []
+
+    try:
+        count = export_reviews(review_rows, reviews_output, args.format, args.row_group_size)
+        print(f"Exported {count} reviews to {os.path.abspath(reviews_output)}")
+        count = export_media(media_rows, media_output, args.format, args.row_group_size)
+        print(f"Exported {count} media items to {os.path.abspath(media_output)}")
+    finally:
+        if conn is not None:
+            conn.close()
+
+
+if __name__ == "__main__":
+    main()
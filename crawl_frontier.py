@@ -0,0 +1,234 @@
+import argparse
+import csv
+import heapq
+import sqlite3
+import time
+from datetime import date
+
+from columnar_export import parse_review_date
+from supplier_ids import SupplierIdMap
+
+DEFAULT_CRAWL_STATE = 'crawl_state.db'
+
+# Installers older than this count as fully stale; staleness grows linearly up to it
+REFRESH_INTERVAL_DAYS = 30
+
+# Reviews posted within this window set an installer's review velocity
+VELOCITY_WINDOW_DAYS = 365
+
+# Score added when the listing page shows a different review count than we stored
+REVIEW_COUNT_CHANGED_BONUS = 50.0
+
+# Assumed seconds per installer before any crawl has been timed
+DEFAULT_CRAWL_SECONDS = 120.0
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS installer_state (
+    company_id     INTEGER PRIMARY KEY,
+    last_crawled   REAL NOT NULL,
+    review_count   INTEGER NOT NULL DEFAULT 0,
+    recent_reviews INTEGER NOT NULL DEFAULT 0,
+    crawl_seconds  REAL
+);
+"""
+
+
+def _to_int(value):
+    try:
+        return int(str(value).replace(',', ''))
+    except (TypeError, ValueError):
+        return None
+
+
+def count_recent_reviews(reviews, today=None, window_days=VELOCITY_WINDOW_DAYS):
+    """
+    Args:
+        reviews: Review dictionaries with a 'date' (scraper output) or 'review_date' (catalog row)
+        today: Reference date (defaults to today)
+        window_days: Size of the window in days
+
+    Returns:
+        Number of reviews dated within the window
+    """
+    today = today or date.today()
+    recent = 0
+    for review in reviews:
+        review_date = parse_review_date(review.get('date') or review.get('review_date'))
+        if review_date and (today - review_date).days <= window_days:
+            recent += 1
+    return recent
+
+
+class CrawlState:
+    """When each installer was last crawled and what it looked like then"""
+
+    def __init__(self, db_path=DEFAULT_CRAWL_STATE):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.executescript(SCHEMA)
+
+    def get(self, company_id):
+        return self.conn.execute(
+            "SELECT * FROM installer_state WHERE company_id = ?", (company_id,)
+        ).fetchone()
+
+    def record(self, company_id, reviews_data, crawl_seconds=None):
+        """
+        Store the outcome of a crawl.
+
+        The stored review count is the total the profile states, the number
+        the listing page shows too, so priority_score compares like with
+        like. A crawl whose review stage did not finish (no stated total in
+        reviews_data) is not recorded, so the installer keeps its priority.
+
+        Args:
+            company_id: Stable record id of the installer
+            reviews_data: Reviews result of the crawl (scrape_company_reviews format)
+            crawl_seconds: How long the crawl took
+
+        Returns:
+            True if the crawl was recorded
+        """
+        if 'expected_reviews' not in reviews_data:
+            return False
+        reviews = reviews_data['reviews']
+        review_count = reviews_data['expected_reviews'] or len(reviews)
+        with self.conn:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO installer_state
+                   (company_id, last_crawled, review_count, recent_reviews, crawl_seconds)
+                   VALUES (?, ?, ?, ?, ?)""",
+                (company_id, time.time(), review_count, count_recent_reviews(reviews), crawl_seconds)
+            )
+        return True
+
+    def average_crawl_seconds(self):
+        row = self.conn.execute(
+            "SELECT AVG(crawl_seconds) FROM installer_state WHERE crawl_seconds IS NOT NULL"
+        ).fetchone()
+        return row[0] or DEFAULT_CRAWL_SECONDS
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def priority_score(state_row, listing_review_count=None, now=None):
+    """
+    How valuable re-crawling an installer is right now; higher goes first.
+
+    The score is the expected number of new reviews since the last crawl
+    (review velocity times age), plus the staleness as a fraction of
+    REFRESH_INTERVAL_DAYS, plus a large bonus when the listing page shows
+    a different review count than we stored. Installers never crawled
+    score infinity.
+
+    Args:
+        state_row: CrawlState row, or None if the installer was never crawled
+        listing_review_count: Review count shown on the listing page, if known
+        now: Reference timestamp (defaults to the current time)
+
+    Returns:
+        Float score
+    """
+    if state_row is None:
+        return float('inf')
+
+    age_days = max(0.0, ((now or time.time()) - state_row['last_crawled']) / 86400)
+    velocity = state_row['recent_reviews'] / VELOCITY_WINDOW_DAYS
+    score = velocity * age_days + min(age_days / REFRESH_INTERVAL_DAYS, 1.0)
+    if listing_review_count is not None and listing_review_count != state_row['review_count']:
+        score += REVIEW_COUNT_CHANGED_BONUS
+    return score
+
+
+class CrawlFrontier:
+    """
+    Installers ordered by priority_score, with optional time budgeting.
+
+    Usage:
+        frontier = CrawlFrontier(state)
+        frontier.add_all(listing_rows)
+        for installer in frontier.drain(budget_seconds=20 * 60):
+            ...crawl it and call state.record(...)...
+    """
+
+    def __init__(self, state, id_map=None):
+        self.state = state
+        self.id_map = id_map or SupplierIdMap()
+        self._heap = []
+        self._counter = 0
+
+    def add(self, installer):
+        """Queue a listing row (company_name, profile_url and optionally listing_review_count)"""
+        company_id = self.id_map.id_for(installer['profile_url'])
+        score = priority_score(self.state.get(company_id), _to_int(installer.get('listing_review_count')))
+        # The counter keeps listing order among equal scores and avoids comparing dicts
+        heapq.heappush(self._heap, (-score, self._counter, company_id, installer))
+        self._counter += 1
+
+    def add_all(self, installers):
+        for installer in installers:
+            self.add(installer)
+
+    def __len__(self):
+        return len(self._heap)
+
+    def drain(self, budget_seconds=None):
+        """
+        Yield installers best first until the frontier is empty or the budget runs out.
+
+        An installer is only started if the average crawl time still fits in the
+        remaining budget, so a run ends close to its deadline instead of past it.
+        The average is refreshed from CrawlState as crawls are recorded.
+
+        Yields:
+            (company_id, installer, score) tuples
+        """
+        deadline = time.monotonic() + budget_seconds if budget_seconds else None
+        while self._heap:
+            if deadline is not None:
+                remaining = deadline - time.monotonic()
+                expected = self.state.average_crawl_seconds()
+                if remaining < expected:
+                    print(f"Time budget reached: {remaining:.0f}s left, about {expected:.0f}s needed per installer; "
+                          f"{len(self._heap)} installers deferred to the next run")
+                    return
+            negative_score, _, company_id, installer = heapq.heappop(self._heap)
+            yield company_id, installer, -negative_score
+
+
+def _iter_listing(path):
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file):
+            yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the crawl order the frontier would use")
+    parser.add_argument('listing_csv', help="e.g. massachusetts_solar_installers.csv")
+    parser.add_argument('--state', default=DEFAULT_CRAWL_STATE, help="Crawl state database")
+    parser.add_argument('--limit', type=int, default=20)
+    args = parser.parse_args()
+
+    with CrawlState(args.state) as state:
+        frontier = CrawlFrontier(state)
+        frontier.add_all(_iter_listing(args.listing_csv))
+        print(f"{len(frontier)} installers in the frontier; average crawl {state.average_crawl_seconds():.0f}s")
+        for position, (company_id, installer, score) in enumerate(frontier.drain(), 1):
+            if position > args.limit:
+                break
+            print(f"  {position}. {installer['company_name']} ({company_id}): score {score:.2f}")
+
+
+if __name__ == "__main__":
+    main()
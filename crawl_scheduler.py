@@ -0,0 +1,171 @@
+import argparse
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from scrape_installers import (
+    LISTING_URL_TEMPLATE, collect_installer_links, create_driver, save_installers, scrape_installer_profile
+)
+from supplier_ids import SupplierIdMap
+from selector_registry import DEFAULT_SELECTORS
+from page_archive import DEFAULT_ARCHIVE_DIR, close_archive, enable_archive
+from worker_resources import WorkerResources
+
+# Every state listing page on EnergySage (50 states plus DC)
+ALL_STATE_CODES = [
+    'AL', 'AK', 'AZ', 'AR', 'CA', 'CO', 'CT', 'DE', 'DC', 'FL', 'GA', 'HI', 'ID', 'IL', 'IN', 'IA',
+    'KS', 'KY', 'LA', 'ME', 'MD', 'MA', 'MI', 'MN', 'MS', 'MO', 'MT', 'NE', 'NV', 'NH', 'NJ', 'NM',
+    'NY', 'NC', 'ND', 'OH', 'OK', 'OR', 'PA', 'RI', 'SC', 'SD', 'TN', 'TX', 'UT', 'VT', 'VA', 'WA',
+    'WV', 'WI', 'WY'
+]
+
+# Browsers run in parallel; the shared per-host rate limiter still paces the requests
+DEFAULT_WORKERS = 3
+
+
+def driver_pool():
+    """Browsers shared by both crawl stages; each task checks one out, so at most `workers` ever run"""
+    return WorkerResources(create_driver, lambda driver: driver.quit())
+
+
+def discover_listings(state_codes, pool, workers=DEFAULT_WORKERS):
+    """
+    Collect the installer links of several state listing pages concurrently
+
+    Args:
+        state_codes: Two-letter state codes
+        pool: WorkerResources of browsers (see driver_pool)
+        workers: Number of concurrent browsers
+
+    Returns:
+        Dictionary mapping each state code to its list of {'name', 'profile_url'} links
+        (states whose listing failed map to an empty list)
+    """
+    def collect(state):
+        url = LISTING_URL_TEMPLATE.format(state=state.lower())
+        print(f"\n=== Collecting {state} listing: {url} ===")
+        with pool.checkout() as driver:
+            return collect_installer_links(driver, url)
+
+    listings = {}
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(collect, state): state for state in state_codes}
+        for future in as_completed(futures):
+            state = futures[future]
+            try:
+                listings[state] = future.result()
+                print(f"=== {state}: {len(listings[state])} installers listed ===")
+            except Exception as e:
+                print(f"=== {state}: listing failed: {e} ===")
+                listings[state] = []
+    return listings
+
+
+def merge_listings(listings, state_codes, id_map=None):
+    """
+    Deduplicate installers that appear in several state listings
+
+    Installers are keyed by their stable record id (the supplier id in the
+    profile URL), so each one is scraped once and attributed to every state
+    whose listing includes it.
+
+    Args:
+        listings: Output of discover_listings
+        state_codes: State order to use for a stable installer order
+        id_map: SupplierIdMap for profiles without a supplier id in the URL
+
+    Returns:
+        List of dictionaries with supplier_id, name, profile_url and listing_states
+    """
+    id_map = id_map or SupplierIdMap(path=None)
+    merged = {}
+    for state in state_codes:
+        for link in listings.get(state, []):
+            key = id_map.id_for(link['profile_url'])
+            entry = merged.get(key)
+            if entry is None:
+                entry = {
+                    'supplier_id': key,
+                    'name': link['name'],
+                    'profile_url': link['profile_url'],
+                    'listing_states': []
+                }
+                merged[key] = entry
+            if state not in entry['listing_states']:
+                entry['listing_states'].append(state)
+    return list(merged.values())
+
+
+def scrape_profiles(installers, pool, workers=DEFAULT_WORKERS):
+    """
+    Scrape each unique installer profile once, in parallel
+
+    Args:
+        installers: Output of merge_listings
+        pool: WorkerResources of browsers (see driver_pool)
+        workers: Number of concurrent browsers
+
+    Returns:
+        List of installer rows in the same order as `installers`
+    """
+    def scrape(index, installer):
+        print(f"\nScraping ({index + 1}/{len(installers)}): {installer['name']}")
+        with pool.checkout() as driver:
+            row = scrape_installer_profile(driver, installer['supplier_id'], installer)
+        row['supplier_id'] = installer['supplier_id']
+        row['listing_states'] = ','.join(sorted(installer['listing_states']))
+        return row
+
+    rows = [None] * len(installers)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = {executor.submit(scrape, index, installer): index for index, installer in enumerate(installers)}
+        for future in as_completed(futures):
+            rows[futures[future]] = future.result()
+    return rows
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Crawl installer listings for many states at once")
+    parser.add_argument('states', nargs='*', help="State codes to crawl (default: all states)")
+    parser.add_argument('--workers', type=int, default=DEFAULT_WORKERS, help="Concurrent browsers")
+    parser.add_argument('--output', default='national_solar_installers',
+                        help="Output file name without extension")
+    parser.add_argument('--archive', metavar='DIR', default=DEFAULT_ARCHIVE_DIR,
+                        help="Keep a compressed copy of every fetched page here (see page_archive.py)")
+    parser.add_argument('--no-archive', action='store_true', help="Do not archive fetched pages")
+    args = parser.parse_args()
+
+    state_codes = [state.upper() for state in args.states] or ALL_STATE_CODES
+    start_time = time.time()
+    pool = driver_pool()
+    id_map = SupplierIdMap()
+    if not args.no_archive:
+        enable_archive(args.archive)
+    DEFAULT_SELECTORS.load()
+
+    try:
+        listings = discover_listings(state_codes, pool, args.workers)
+        installers = merge_listings(listings, state_codes, id_map)
+        id_map.save()
+        listed = sum(len(links) for links in listings.values())
+        print(f"\n--- {listed} listing entries across {len(state_codes)} states "
+              f"-> {len(installers)} unique installers ---")
+
+        print("\n--- Scraping Individual Company Pages ---")
+        rows = scrape_profiles(installers, pool, args.workers)
+
+        print("\n--- Scraping Complete --- ")
+        print(f"Successfully scraped details for {len(rows)} companies in {time.time() - start_time:.0f} seconds.")
+        if rows:
+            save_installers(rows, args.output, extra_fieldnames=['supplier_id', 'listing_states'])
+        else:
+            print("No installer data was successfully scraped or processed.")
+    finally:
+        print("Closing browsers...")
+        pool.close_all()
+        close_archive()
+        DEFAULT_SELECTORS.report()
+        DEFAULT_SELECTORS.save()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,274 @@
+import random
+import threading
+import time
+import weakref
+from urllib.parse import urlparse
+
+import requests
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from rate_limiter import DEFAULT_LIMITER, is_throttled_page
+
+# Seconds a browser navigation may take before Selenium gives up on it
+PAGE_LOAD_TIMEOUT = 30
+
+# HTTP statuses worth retrying; any other 4xx is final
+RETRYABLE_STATUSES = {408, 425, 429, 500, 502, 503, 504}
+
+
+class FetchError(Exception):
+    """A page or media fetch that did not succeed"""
+
+    def __init__(self, message, url=None, status_code=None):
+        super().__init__(message)
+        self.url = url
+        self.status_code = status_code
+
+
+class TransientFetchError(FetchError):
+    """Timeouts, connection failures, throttling and 5xx; still failing after every retry"""
+
+
+class PermanentFetchError(FetchError):
+    """Failures that a retry cannot fix (bad URL, 404, ...)"""
+
+
+class CircuitOpenError(FetchError):
+    """The host is failing, so the request was refused without being sent"""
+
+
+def classify_exception(exc):
+    """
+    Decide whether an exception raised by a fetch is worth retrying.
+
+    Args:
+        exc: Exception raised by requests or Selenium
+
+    Returns:
+        TransientFetchError or PermanentFetchError class
+    """
+    if isinstance(exc, (requests.Timeout, requests.ConnectionError, TimeoutException,
+                        requests.exceptions.ChunkedEncodingError, requests.exceptions.ContentDecodingError)):
+        # Truncated or garbled bodies are dropped connections, not bad requests
+        return TransientFetchError
+    if isinstance(exc, (requests.exceptions.InvalidURL, requests.exceptions.MissingSchema,
+                        requests.exceptions.InvalidSchema)):
+        return PermanentFetchError
+    if isinstance(exc, WebDriverException):
+        # net::ERR_* navigation errors and renderer timeouts are usually transient
+        return TransientFetchError
+    return PermanentFetchError
+
+
+class RetryPolicy:
+    """Exponential backoff with full jitter"""
+
+    def __init__(self, max_attempts=4, base_delay=1.0, max_delay=30.0):
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+
+    def delay(self, attempt, retry_after=None):
+        """
+        Args:
+            attempt: Number of the attempt that just failed (1-based)
+            retry_after: Seconds the server asked us to wait, if any
+
+        Returns:
+            Seconds to sleep before the next attempt
+        """
+        backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+        return max(backoff, retry_after or 0)
+
+
+class CircuitBreaker:
+    """
+    Per-host circuit breaker.
+
+    After `failure_threshold` consecutive transient failures the circuit opens
+    and requests fail immediately for `reset_timeout` seconds. Then a single
+    trial request is let through (half-open): success closes the circuit,
+    failure opens it again.
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self, host, failure_threshold=5, reset_timeout=60.0):
+        self.host = host
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.consecutive_failures = 0
+        self.opened_at = 0.0
+        self.rejected = 0
+        self._trial_in_flight = False
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                self._trial_in_flight = False
+            if self.state == self.HALF_OPEN and not self._trial_in_flight:
+                self._trial_in_flight = True
+                return True
+            self.rejected += 1
+            return False
+
+    def record_success(self):
+        with self._lock:
+            if self.state != self.CLOSED:
+                print(f"Circuit for {self.host} closed again")
+            self.state = self.CLOSED
+            self.consecutive_failures = 0
+            self._trial_in_flight = False
+
+    def record_failure(self):
+        with self._lock:
+            self.consecutive_failures += 1
+            self._trial_in_flight = False
+            if self.state == self.HALF_OPEN or self.consecutive_failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    print(f"Circuit for {self.host} opened after {self.consecutive_failures} failures; "
+                          f"failing fast for {self.reset_timeout:.0f}s")
+                self.state = self.OPEN
+                self.opened_at = time.monotonic()
+
+    def release_trial(self):
+        """End a request that says nothing about the host's health, so a half-open circuit can try again"""
+        with self._lock:
+            self._trial_in_flight = False
+
+
+class FetchPolicy:
+    """
+    Retries, backoff and circuit breaking around rate-limited fetches.
+
+    Every attempt goes through the shared per-host rate limiter, so retries
+    are paced like any other request.
+    """
+
+    def __init__(self, limiter=None, retry_policy=None, failure_threshold=5, reset_timeout=60.0):
+        self.limiter = limiter or DEFAULT_LIMITER
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._breakers = {}
+        self._lock = threading.Lock()
+        self._configured_drivers = weakref.WeakSet()
+
+    def breaker_for(self, url):
+        host = (urlparse(url).hostname or '').lower()
+        with self._lock:
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = CircuitBreaker(host, self.failure_threshold, self.reset_timeout)
+                self._breakers[host] = breaker
+            return breaker
+
+    def _run(self, url, attempt_fn):
+        """
+        Run attempt_fn(slot) until it succeeds, fails permanently or runs out of attempts.
+
+        attempt_fn returns (result, status_code, retry_after); a status in
+        RETRYABLE_STATUSES counts as a transient failure.
+        """
+        breaker = self.breaker_for(url)
+        last_error = None
+
+        for attempt in range(1, self.retry_policy.max_attempts + 1):
+            if not breaker.allow_request():
+                raise CircuitOpenError(f"Circuit open for {breaker.host}; skipped {url}", url)
+
+            retry_after_seconds = None
+            try:
+                with self.limiter.slot(url) as slot:
+                    result, status_code, retry_after = attempt_fn(slot)
+                    slot.record(status_code, retry_after)
+                retry_after_seconds = slot.retry_after
+            except Exception as e:
+                error_class = classify_exception(e)
+                if error_class is PermanentFetchError:
+                    breaker.release_trial()
+                    raise PermanentFetchError(f"{type(e).__name__}: {e}", url) from e
+                last_error = TransientFetchError(f"{type(e).__name__}: {e}", url)
+                breaker.record_failure()
+            except BaseException:
+                # Interrupted mid-request: leave no trial flag behind
+                breaker.release_trial()
+                raise
+            else:
+                if status_code not in RETRYABLE_STATUSES:
+                    breaker.record_success()
+                    return result
+                last_error = TransientFetchError(f"HTTP status {status_code}", url, status_code)
+                breaker.record_failure()
+                if hasattr(result, 'close'):
+                    # A streamed response holds its pooled connection until closed
+                    result.close()
+
+            if attempt < self.retry_policy.max_attempts:
+                delay = self.retry_policy.delay(attempt, retry_after_seconds)
+                print(f"Attempt {attempt} for {url} failed ({last_error}); retrying in {delay:.1f}s")
+                time.sleep(delay)
+
+        raise last_error
+
+    def get(self, url, **kwargs):
+        """
+        requests.get with retries and circuit breaking.
+
+        Non-retryable HTTP statuses (e.g. 404) are returned as responses, so
+        callers can keep checking response.status_code.
+
+        Raises:
+            TransientFetchError, PermanentFetchError or CircuitOpenError
+        """
+        kwargs.setdefault('timeout', 10)
+
+        def attempt(slot):
+            response = requests.get(url, **kwargs)
+            return response, response.status_code, response.headers.get('Retry-After')
+
+        return self._run(url, attempt)
+
+    def navigate(self, driver, url):
+        """
+        driver.get with retries and circuit breaking; a block page counts as a 429.
+
+        Raises:
+            TransientFetchError, PermanentFetchError or CircuitOpenError
+        """
+        if driver not in self._configured_drivers:
+            # Without this a hung navigation waits for Selenium's 300s default
+            driver.set_page_load_timeout(PAGE_LOAD_TIMEOUT)
+            self._configured_drivers.add(driver)
+
+        def attempt(slot):
+            driver.get(url)
+            return None, 429 if is_throttled_page(driver) else 200, None
+
+        return self._run(url, attempt)
+
+    def summaries(self):
+        with self._lock:
+            breakers = list(self._breakers.values())
+        return [f"{b.host}: circuit {b.state}, {b.rejected} requests refused while open" for b in breakers]
+
+
+# Process-wide policy used by the scrapers
+DEFAULT_POLICY = FetchPolicy()
+
+
+def fetch(url, policy=None, **kwargs):
+    """Fetch a URL over HTTP using the shared retry/circuit-breaker policy"""
+    return (policy or DEFAULT_POLICY).get(url, **kwargs)
+
+
+def navigate(driver, url, policy=None):
+    """Navigate the browser using the shared retry/circuit-breaker policy"""
+    return (policy or DEFAULT_POLICY).navigate(driver, url)
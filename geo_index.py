@@ -0,0 +1,371 @@
+import argparse
+import csv
+import gzip
+import json
+import math
+import os
+import re
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # numpy is only needed for the spatial index
+    np = None
+
+# Offline ZIP gazetteer: zip,state,lat,lon for every US ZIP code with a known centroid.
+# Extracted from the MIT-licensed "zipcodes" package dataset (U.S. government ZIP data).
+DEFAULT_GAZETTEER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data', 'zip_centroids.csv.gz')
+
+# Persistent address -> ZIP results, so repeated builds skip address parsing
+DEFAULT_GEOCODE_CACHE = 'geocode_cache.json'
+
+EARTH_RADIUS_MILES = 3958.8
+MILES_PER_DEGREE_LAT = 69.0
+
+# Grid cell size in degrees; ~35 miles north-south
+DEFAULT_CELL_DEGREES = 0.5
+
+# "Westfield, MA 01085" or "Saint Paul, MN 55108-1234"
+STATE_ZIP_PATTERN = re.compile(r'\b([A-Z]{2})\s+(\d{5})(?:-\d{4})?\b')
+ZIP_PATTERN = re.compile(r'\b(\d{5})(?:-\d{4})?\b')
+
+
+def _require_numpy():
+    if np is None:
+        raise ImportError("The geospatial index requires numpy. Install it with: pip install numpy")
+
+
+@lru_cache(maxsize=4)
+def load_gazetteer(path=DEFAULT_GAZETTEER):
+    """
+    Load the ZIP -> centroid gazetteer.
+
+    Args:
+        path: Gazetteer CSV (optionally gzipped) with zip, state, lat, lon columns
+
+    Returns:
+        Dictionary mapping 5-digit ZIP strings to (lat, lon) tuples
+    """
+    opener = gzip.open if path.endswith('.gz') else open
+    centroids = {}
+    with opener(path, 'rt', newline='', encoding='utf-8') as file:
+        for row in csv.DictReader(file):
+            centroids[row['zip']] = (float(row['lat']), float(row['lon']))
+    return centroids
+
+
+def extract_zip(address):
+    """
+    Pull the ZIP code out of a free-text address.
+
+    Prefers a ZIP that follows a state code, since street numbers can also
+    be five digits long; otherwise falls back to the last 5-digit number.
+
+    Args:
+        address: e.g. "66-D Main Line Drive Westfield, MA 01085"
+
+    Returns:
+        5-digit ZIP string, or None
+    """
+    if not address:
+        return None
+    matches = STATE_ZIP_PATTERN.findall(address)
+    if matches:
+        return matches[-1][1]
+    matches = ZIP_PATTERN.findall(address)
+    return matches[-1] if matches else None
+
+
+class AddressGeocoder:
+    """
+    Address -> ZIP -> centroid lookup backed by the offline gazetteer.
+
+    Results are cached in memory and, when cache_path is given, persisted as
+    JSON between runs.
+    """
+
+    def __init__(self, gazetteer_path=DEFAULT_GAZETTEER, cache_path=None):
+        self.centroids = load_gazetteer(gazetteer_path)
+        self.cache_path = cache_path
+        self.cache = {}
+        self._dirty = False
+        if cache_path and os.path.exists(cache_path):
+            with open(cache_path, 'r', encoding='utf-8') as file:
+                self.cache = json.load(file)
+
+    def geocode(self, address):
+        """
+        Args:
+            address: Free-text address
+
+        Returns:
+            (zip, lat, lon) tuple, or None if no known ZIP is found
+        """
+        key = ' '.join((address or '').split())
+        if key in self.cache:
+            cached = self.cache[key]
+            return tuple(cached) if cached else None
+
+        zip_code = extract_zip(key)
+        centroid = self.centroids.get(zip_code) if zip_code else None
+        result = (zip_code, centroid[0], centroid[1]) if centroid else None
+
+        self.cache[key] = list(result) if result else None
+        self._dirty = True
+        return result
+
+    def save(self):
+        if not self.cache_path or not self._dirty:
+            return
+        temp_path = f"{self.cache_path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(self.cache, file, ensure_ascii=False)
+        os.replace(temp_path, self.cache_path)
+        self._dirty = False
+
+
+def haversine_miles(lat, lon, lats, lons):
+    """
+    Vectorized great-circle distance from one point to many.
+
+    Args:
+        lat, lon: Query point in degrees
+        lats, lons: numpy arrays of points in degrees
+
+    Returns:
+        numpy array of distances in miles
+    """
+    lat1 = math.radians(lat)
+    lat2 = np.radians(lats)
+    dlat = lat2 - lat1
+    dlon = np.radians(lons) - math.radians(lon)
+    a = np.sin(dlat / 2) ** 2 + math.cos(lat1) * np.cos(lat2) * np.sin(dlon / 2) ** 2
+    return 2 * EARTH_RADIUS_MILES * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _iter_locations(row):
+    """Yield (address, is_headquarters) for every address of an installer row"""
+    headquarters = row.get('headquarters') or ''
+    if headquarters and headquarters not in ('N/A', 'Error retrieving'):
+        yield headquarters, True
+    for address in (row.get('other_locations') or '').split('|'):
+        if address.strip():
+            yield address.strip(), False
+
+
+class GeoIndex:
+    """
+    Grid spatial index over installer office locations.
+
+    Locations are bucketed into fixed-size lat/lon cells. A radius query only
+    touches the cells overlapping the search box and measures exact distances
+    for those candidates with one vectorized haversine call.
+    """
+
+    def __init__(self, installer_ids, company_names, addresses, zips, lats, lons,
+                 cell_degrees=DEFAULT_CELL_DEGREES):
+        _require_numpy()
+        self.installer_ids = np.asarray(installer_ids, dtype=np.int64)
+        self.company_names = list(company_names)
+        self.addresses = list(addresses)
+        self.zips = list(zips)
+        self.lats = np.asarray(lats, dtype=np.float64)
+        self.lons = np.asarray(lons, dtype=np.float64)
+        self.cell_degrees = cell_degrees
+
+        cells = {}
+        lat_cells = np.floor(self.lats / cell_degrees).astype(np.int64)
+        lon_cells = np.floor(self.lons / cell_degrees).astype(np.int64)
+        for position, key in enumerate(zip(lat_cells.tolist(), lon_cells.tolist())):
+            cells.setdefault(key, []).append(position)
+        self.cells = {key: np.asarray(positions, dtype=np.int64) for key, positions in cells.items()}
+
+    def __len__(self):
+        return len(self.addresses)
+
+    @classmethod
+    def build(cls, rows, geocoder=None, cell_degrees=DEFAULT_CELL_DEGREES):
+        """
+        Build the index from installer rows (headquarters and other_locations).
+
+        Args:
+            rows: Iterable of installer detail rows
+            geocoder: AddressGeocoder to use (a cache-less one is created if omitted)
+            cell_degrees: Grid cell size in degrees
+
+        Returns:
+            (GeoIndex, list of addresses that could not be geocoded)
+        """
+        geocoder = geocoder or AddressGeocoder()
+        columns = {'ids': [], 'names': [], 'addresses': [], 'zips': [], 'lats': [], 'lons': []}
+        unresolved = []
+
+        for row in rows:
+            seen_zips = set()
+            for address, _ in _iter_locations(row):
+                located = geocoder.geocode(address)
+                if not located:
+                    unresolved.append(address)
+                    continue
+                zip_code, lat, lon = located
+                # The headquarters usually reappears in other_locations; one point per ZIP is enough
+                if zip_code in seen_zips:
+                    continue
+                seen_zips.add(zip_code)
+                columns['ids'].append(int(row['id']))
+                columns['names'].append(row.get('company_name', ''))
+                columns['addresses'].append(address)
+                columns['zips'].append(zip_code)
+                columns['lats'].append(lat)
+                columns['lons'].append(lon)
+
+        geocoder.save()
+        index = cls(columns['ids'], columns['names'], columns['addresses'], columns['zips'],
+                    columns['lats'], columns['lons'], cell_degrees)
+        return index, unresolved
+
+    @classmethod
+    def from_catalog(cls, catalog_path, geocoder=None):
+        delimiter = '\t' if catalog_path.endswith('.tsv') else ','
+        with open(catalog_path, 'r', newline='', encoding='utf-8-sig') as file:
+            return cls.build(csv.DictReader(file, delimiter=delimiter), geocoder)
+
+    def _candidates(self, lat, lon, miles):
+        lat_span = miles / MILES_PER_DEGREE_LAT
+        # Longitude degrees shrink with latitude; size the box for the widest edge
+        widest_lat = min(89.0, abs(lat) + lat_span)
+        lon_span = miles / (MILES_PER_DEGREE_LAT * math.cos(math.radians(widest_lat)))
+
+        lat_range = range(math.floor((lat - lat_span) / self.cell_degrees),
+                          math.floor((lat + lat_span) / self.cell_degrees) + 1)
+        lon_range = range(math.floor((lon - lon_span) / self.cell_degrees),
+                          math.floor((lon + lon_span) / self.cell_degrees) + 1)
+
+        if len(lat_range) * len(lon_range) >= len(self.cells):
+            return np.arange(len(self.addresses))
+        found = [self.cells[key] for key in ((a, b) for a in lat_range for b in lon_range) if key in self.cells]
+        return np.concatenate(found) if found else np.empty(0, dtype=np.int64)
+
+    def within(self, lat, lon, miles):
+        """
+        Find installers with an office within a radius.
+
+        Args:
+            lat, lon: Query point in degrees
+            miles: Search radius
+
+        Returns:
+            List of dicts (installer id, name, nearest address, zip, distance), nearest first,
+            with one entry per installer
+        """
+        candidates = self._candidates(lat, lon, miles)
+        if not len(candidates):
+            return []
+        distances = haversine_miles(lat, lon, self.lats[candidates], self.lons[candidates])
+        inside = distances <= miles
+        return self._nearest_per_installer(candidates[inside], distances[inside])
+
+    def nearest(self, lat, lon, k=5):
+        """
+        Find the k installers with the closest office.
+
+        Grows the search radius until k installers are inside it, so only
+        nearby cells are examined for dense areas.
+        """
+        installer_count = len(set(self.installer_ids.tolist()))
+        miles = 25.0
+        while True:
+            results = self.within(lat, lon, miles)
+            if len(results) >= min(k, installer_count) or miles > math.pi * EARTH_RADIUS_MILES:
+                return results[:k]
+            miles *= 2
+
+    def within_zip(self, zip_code, miles, gazetteer_path=DEFAULT_GAZETTEER):
+        centroid = load_gazetteer(gazetteer_path).get(zip_code)
+        if not centroid:
+            raise KeyError(f"Unknown ZIP code: {zip_code}")
+        return self.within(centroid[0], centroid[1], miles)
+
+    def _nearest_per_installer(self, positions, distances):
+        order = np.argsort(distances, kind='stable')
+        results = []
+        seen = set()
+        for ordered in order.tolist():
+            position = int(positions[ordered])
+            installer_id = int(self.installer_ids[position])
+            if installer_id in seen:
+                continue
+            seen.add(installer_id)
+            results.append({
+                'id': installer_id,
+                'company_name': self.company_names[position],
+                'address': self.addresses[position],
+                'zip': self.zips[position],
+                'distance_miles': round(float(distances[ordered]), 2)
+            })
+        return results
+
+    def save(self, path):
+        """Save the index as a single .npz file"""
+        np.savez_compressed(
+            path,
+            installer_ids=self.installer_ids, lats=self.lats, lons=self.lons,
+            cell_degrees=np.float64(self.cell_degrees),
+            meta=np.frombuffer(json.dumps({
+                'company_names': self.company_names, 'addresses': self.addresses, 'zips': self.zips
+            }, ensure_ascii=False).encode('utf-8'), dtype=np.uint8)
+        )
+
+    @classmethod
+    def load(cls, path):
+        _require_numpy()
+        with np.load(path) as data:
+            meta = json.loads(data['meta'].tobytes().decode('utf-8'))
+            return cls(data['installer_ids'], meta['company_names'], meta['addresses'], meta['zips'],
+                       data['lats'], data['lons'], float(data['cell_degrees']))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the nearest-installer geospatial index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Geocode installer locations and build the index")
+    build_parser.add_argument('catalog', nargs='?', default='all_massachusetts_installer_details.tsv')
+    build_parser.add_argument('-o', '--output', default='geo_index.npz')
+    build_parser.add_argument('--cache', default=DEFAULT_GEOCODE_CACHE, help="Geocoding cache file")
+
+    query_parser = subparsers.add_parser('query', help="Query a saved index by ZIP code")
+    query_parser.add_argument('zip', help="ZIP code to search from")
+    query_parser.add_argument('--index', default='geo_index.npz')
+    query_parser.add_argument('--miles', type=float, help="Radius search instead of k-nearest")
+    query_parser.add_argument('-k', type=int, default=5, help="Number of nearest installers")
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index, unresolved = GeoIndex.from_catalog(args.catalog, AddressGeocoder(cache_path=args.cache))
+        index.save(args.output)
+        print(f"Indexed {len(index)} office locations")
+        if unresolved:
+            print(f"Could not geocode {len(unresolved)} addresses:")
+            for address in unresolved:
+                print(f"  - {address}")
+        print(f"Index saved to {os.path.abspath(args.output)}")
+    else:
+        index = GeoIndex.load(args.index)
+        if args.miles is not None:
+            results = index.within_zip(args.zip, args.miles)
+            print(f"Found {len(results)} installers with an office within {args.miles:g} miles of {args.zip}")
+        else:
+            centroid = load_gazetteer().get(args.zip)
+            if not centroid:
+                print(f"Unknown ZIP code: {args.zip}")
+                return
+            results = index.nearest(centroid[0], centroid[1], args.k)
+            print(f"Nearest {len(results)} installers to {args.zip}")
+        for result in results:
+            print(f"  {result['distance_miles']:>7.1f} mi  {result['company_name']} - {result['address']}")
+
+
+if __name__ == "__main__":
+    main()
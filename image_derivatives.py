@@ -0,0 +1,269 @@
+import argparse
+import atexit
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    from PIL import Image, ImageOps, features
+except ImportError:  # Pillow is only needed for the derivative stage
+    Image = None
+    ImageOps = None
+    features = None
+
+# Derivatives are content-addressed under this folder, so identical images share them
+DEFAULT_DERIVATIVES_DIR = 'images/derivatives'
+
+# Thumbnail widths for the website; images narrower than a width are not upscaled
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+
+# Encoder settings per output format (AVIF is only written when Pillow was built with it)
+DERIVATIVE_FORMATS = {
+    'webp': {'format': 'WEBP', 'quality': 80, 'method': 4},
+    'avif': {'format': 'AVIF', 'quality': 60},
+}
+
+# Leading bytes of the image formats seen in galleries, mapped to a file extension
+IMAGE_SIGNATURES = [
+    (b'\xff\xd8\xff', 'jpg'),
+    (b'\x89PNG\r\n\x1a\n', 'png'),
+    (b'GIF87a', 'gif'),
+    (b'GIF89a', 'gif'),
+    (b'BM', 'bmp'),
+    (b'II*\x00', 'tif'),
+    (b'MM\x00*', 'tif'),
+]
+
+
+def _require_pillow():
+    if Image is None:
+        raise ImportError("Image derivatives require Pillow. Install it with: pip install Pillow")
+
+
+def sniff_image_type(data):
+    """
+    Detect an image's real format from its first bytes.
+
+    Args:
+        data: Image bytes (the first 16 are enough)
+
+    Returns:
+        File extension such as 'jpg', 'png' or 'webp', or None if unrecognized
+    """
+    if data[:4] == b'RIFF' and data[8:12] == b'WEBP':
+        return 'webp'
+    if data[4:8] == b'ftyp' and data[8:12] in (b'avif', b'avis'):
+        return 'avif'
+    if data[4:8] == b'ftyp' and data[8:12] in (b'heic', b'heix', b'mif1'):
+        return 'heic'
+    if data[:5] == b'<?xml' or data[:4] == b'<svg':
+        return 'svg'
+    for signature, extension in IMAGE_SIGNATURES:
+        if data.startswith(signature):
+            return extension
+    return None
+
+
+def with_real_extension(path, data):
+    """
+    Replace a path's extension with the one matching the image bytes.
+
+    Args:
+        path: Intended file path, e.g. images/.../123_photo.jpg
+        data: The image bytes about to be written there
+
+    Returns:
+        The path with the detected extension (unchanged if the type is unknown)
+    """
+    extension = sniff_image_type(data[:16])
+    if not extension:
+        return path
+    base, current = os.path.splitext(path)
+    if current.lower().lstrip('.') in (extension, 'jpeg' if extension == 'jpg' else extension):
+        return path
+    return f"{base}.{extension}"
+
+
+def available_formats():
+    """Derivative formats this Pillow build can encode"""
+    _require_pillow()
+    return [name for name in DERIVATIVE_FORMATS if features.check(name)]
+
+
+def content_digest(path):
+    """SHA-256 hex digest of a file, read in chunks"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def derivative_path(derivatives_dir, digest, width, extension):
+    return os.path.join(derivatives_dir, digest[:2], f"{digest}_{width}w.{extension}")
+
+
+def make_derivatives(image_path, derivatives_dir=DEFAULT_DERIVATIVES_DIR, widths=DERIVATIVE_WIDTHS, formats=None):
+    """
+    Inspect one downloaded image and write its thumbnails.
+
+    Runs in a worker process. Thumbnails are named after the content digest,
+    so an image whose digest already has derivatives is not decoded again.
+
+    Args:
+        image_path: Path of the original download
+        derivatives_dir: Root folder for the content-addressed thumbnails
+        widths: Target widths in pixels
+        formats: Output formats (defaults to every format Pillow can encode)
+
+    Returns:
+        Dictionary with content_digest, real_format, width, height, byte_size and
+        thumbnails (a list of {width, height, format, path, byte_size}), or with
+        an 'error' key if the file could not be processed
+    """
+    _require_pillow()
+    formats = formats or available_formats()
+    try:
+        digest = content_digest(image_path)
+        with open(image_path, 'rb') as f:
+            real_format = sniff_image_type(f.read(16))
+
+        metadata_path = os.path.join(derivatives_dir, digest[:2], f"{digest}.json")
+        if os.path.exists(metadata_path):
+            with open(metadata_path, 'r', encoding='utf-8') as f:
+                metadata = json.load(f)
+            if all(os.path.exists(thumb['path']) for thumb in metadata['thumbnails']):
+                metadata['skipped'] = True
+                return metadata
+
+        with Image.open(image_path) as image:
+            # Respect camera rotation before measuring or resizing
+            image = ImageOps.exif_transpose(image)
+            width, height = image.size
+            if image.mode not in ('RGB', 'RGBA'):
+                image = image.convert('RGBA' if 'transparency' in image.info or image.mode in ('LA', 'PA') else 'RGB')
+
+            thumbnails = []
+            os.makedirs(os.path.dirname(metadata_path), exist_ok=True)
+            # Always make at least one thumbnail, at the original width when it is smaller than all targets
+            target_widths = sorted({min(target, width) for target in widths})
+            for target in target_widths:
+                target_height = max(1, round(height * target / width))
+                resized = image if target == width else image.resize((target, target_height), Image.LANCZOS)
+                for name in formats:
+                    settings = dict(DERIVATIVE_FORMATS[name])
+                    path = derivative_path(derivatives_dir, digest, target, name)
+                    # Two processes may render the same digest at once; each writes its own temp file
+                    temp_path = f"{path}.{os.getpid()}.tmp"
+                    resized.save(temp_path, **settings)
+                    os.replace(temp_path, path)
+                    thumbnails.append({'width': target, 'height': target_height, 'format': name,
+                                       'path': path, 'byte_size': os.path.getsize(path)})
+
+        metadata = {
+            'content_digest': digest,
+            'real_format': real_format or '',
+            'width': width,
+            'height': height,
+            'byte_size': os.path.getsize(image_path),
+            'thumbnails': thumbnails,
+        }
+        temp_path = f"{metadata_path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(metadata, f, indent=2)
+        os.replace(temp_path, metadata_path)
+        return metadata
+    except Exception as e:
+        return {'error': f"{type(e).__name__}: {e}"}
+
+
+_executor = None
+
+
+def _get_executor(workers=None):
+    """Process pool shared by every gallery in this run, started on first use"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=workers)
+        atexit.register(_executor.shutdown)
+    return _executor
+
+
+def _media_path(media_info):
+    return media_info.get('path') or media_info.get('thumbnail_path')
+
+
+def attach_derivatives(media_items, derivatives_dir=DEFAULT_DERIVATIVES_DIR, workers=None):
+    """
+    Create thumbnails for a gallery's downloads in the process pool and record them.
+
+    Each media dictionary (scrape_installer_gallery output) with a local file
+    gains content_digest, real_format, width, height, byte_size and thumbnails.
+    Near-duplicates (flagged with duplicate_of) are skipped, and so are items
+    whose processing failed.
+
+    Args:
+        media_items: List of media dictionaries with 'path' or 'thumbnail_path'
+        derivatives_dir: Root folder for the thumbnails
+        workers: Pool size (defaults to the CPU count)
+
+    Returns:
+        Number of media items that got derivative metadata
+    """
+    if Image is None:
+        print("Pillow is not installed; skipping image derivatives")
+        return 0
+
+    pending = [item for item in media_items
+               if not item.get('duplicate_of') and _media_path(item) and os.path.exists(_media_path(item))]
+    if not pending:
+        return 0
+
+    executor = _get_executor(workers)
+    futures = [executor.submit(make_derivatives, _media_path(item), derivatives_dir) for item in pending]
+    attached = 0
+    reused = 0
+    for item, future in zip(pending, futures):
+        metadata = future.result()
+        if 'error' in metadata:
+            print(f"Could not make derivatives for {_media_path(item)}: {metadata['error']}")
+            continue
+        reused += 1 if metadata.pop('skipped', False) else 0
+        item.update(metadata)
+        attached += 1
+    print(f"Derivatives ready for {attached}/{len(pending)} media items ({reused} reused by content digest)")
+    return attached
+
+
+def thumbnails_column(media_info):
+    """Catalog representation of a media item's thumbnails: paths joined with ' | '"""
+    return ' | '.join(thumb['path'] for thumb in media_info.get('thumbnails') or [])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Create thumbnails for already downloaded galleries")
+    parser.add_argument('folders', nargs='*', default=['images'],
+                        help="Folders to scan for media_metadata.json files (default: images)")
+    parser.add_argument('--derivatives-dir', default=DEFAULT_DERIVATIVES_DIR)
+    parser.add_argument('--workers', type=int, help="Worker processes (default: CPU count)")
+    args = parser.parse_args()
+    _require_pillow()
+
+    for folder in args.folders:
+        for root, dirs, files in os.walk(folder):
+            # Never descend into the derivatives themselves
+            dirs[:] = [d for d in dirs if os.path.join(root, d) != os.path.normpath(args.derivatives_dir)]
+            if 'media_metadata.json' not in files:
+                continue
+            metadata_file = os.path.join(root, 'media_metadata.json')
+            with open(metadata_file, 'r', encoding='utf-8') as f:
+                media_items = json.load(f)
+            print(f"\n{metadata_file}")
+            attach_derivatives(media_items, args.derivatives_dir, args.workers)
+            with open(metadata_file, 'w', encoding='utf-8') as f:
+                json.dump(media_items, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,262 @@
+import argparse
+import base64
+import bisect
+import csv
+import json
+import os
+import re
+
+INDEX_FORMAT_VERSION = 1
+
+
+def parse_states(value):
+    """
+    Split a states_served cell into state codes.
+
+    The details catalogs join states with commas ("IA,IL,MA") while
+    scrape_all_installer_states.py joins them with pipes ("IA|IL|MA").
+
+    Args:
+        value: The raw states_served value (string or list)
+
+    Returns:
+        Sorted list of unique, upper-cased state codes
+    """
+    if not value:
+        return []
+    if isinstance(value, (list, tuple)):
+        parts = value
+    else:
+        parts = re.split(r'[,|]', value)
+    return sorted({part.strip().upper() for part in parts if part.strip()})
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return 0.0
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def _iter_bits(bitmap):
+    """Yield the positions of the set bits of an int bitmap in ascending order"""
+    while bitmap:
+        low_bit = bitmap & -bitmap
+        yield low_bit.bit_length() - 1
+        bitmap ^= low_bit
+
+
+class InstallerIndex:
+    """
+    Inverted state -> installer bitmap index over the installer details catalog.
+
+    Installers are stored at dense positions ordered by aggregate rating
+    (highest first), so "rating >= x" is a prefix of positions and becomes a
+    single mask. Each state maps to an int bitmap over those positions, which
+    makes intersections and unions of states plain & and | operations.
+    """
+
+    def __init__(self, installers, state_bitmaps):
+        # installers: list of dicts with id, company_name, profile_url, aggregate_rating, review_count
+        self.installers = installers
+        self.state_bitmaps = state_bitmaps
+        self._ratings_desc = [-installer['aggregate_rating'] for installer in installers]
+        self._position_by_id = {installer['id']: position for position, installer in enumerate(installers)}
+
+    @classmethod
+    def build(cls, rows):
+        """
+        Build an index from installer rows.
+
+        The installer catalog is append-only, so an installer crawled more
+        than once has several rows; the last one per id is indexed.
+
+        Args:
+            rows: Iterable of dicts with id, company_name, profile_url,
+                  states_served, aggregate_rating and review_count
+
+        Returns:
+            InstallerIndex
+        """
+        latest_rows = {}
+        for row in rows:
+            latest_rows[_to_int(row.get('id'))] = row
+
+        installers = []
+        states_by_installer = []
+        for row in latest_rows.values():
+            installers.append({
+                'id': _to_int(row.get('id')),
+                'company_name': row.get('company_name', ''),
+                'profile_url': row.get('profile_url', ''),
+                'aggregate_rating': _to_float(row.get('aggregate_rating')),
+                'review_count': _to_int(row.get('review_count'))
+            })
+            states_by_installer.append(parse_states(row.get('states_served')))
+
+        order = sorted(range(len(installers)),
+                       key=lambda i: (-installers[i]['aggregate_rating'], -installers[i]['review_count'],
+                                      installers[i]['id']))
+
+        state_bitmaps = {}
+        for position, original in enumerate(order):
+            for state in states_by_installer[original]:
+                state_bitmaps[state] = state_bitmaps.get(state, 0) | (1 << position)
+
+        return cls([installers[i] for i in order], state_bitmaps)
+
+    @classmethod
+    def from_catalog(cls, catalog_path):
+        """
+        Build an index from an installer details CSV or TSV file.
+
+        Args:
+            catalog_path: Path such as all_massachusetts_installer_details.tsv
+
+        Returns:
+            InstallerIndex
+        """
+        delimiter = '\t' if catalog_path.endswith('.tsv') else ','
+        with open(catalog_path, 'r', newline='', encoding='utf-8-sig') as file:
+            return cls.build(csv.DictReader(file, delimiter=delimiter))
+
+    @property
+    def states(self):
+        return sorted(self.state_bitmaps)
+
+    def _rating_mask(self, min_rating):
+        if min_rating is None:
+            return (1 << len(self.installers)) - 1
+        count = bisect.bisect_right(self._ratings_desc, -min_rating)
+        return (1 << count) - 1
+
+    def query(self, all_states=None, any_states=None, min_rating=None, min_reviews=None, limit=None):
+        """
+        Find installers by state coverage, rating and review count.
+
+        Args:
+            all_states: Installers must serve every one of these states
+            any_states: Installers must serve at least one of these states
+            min_rating: Minimum aggregate rating
+            min_reviews: Minimum number of reviews
+            limit: Maximum number of results
+
+        Returns:
+            List of installer dicts, highest rated first
+        """
+        candidates = self._rating_mask(min_rating)
+
+        for state in all_states or []:
+            candidates &= self.state_bitmaps.get(state.upper(), 0)
+            if not candidates:
+                return []
+
+        if any_states:
+            union = 0
+            for state in any_states:
+                union |= self.state_bitmaps.get(state.upper(), 0)
+            candidates &= union
+
+        results = []
+        for position in _iter_bits(candidates):
+            installer = self.installers[position]
+            if min_reviews is not None and installer['review_count'] < min_reviews:
+                continue
+            results.append(installer)
+            if limit is not None and len(results) >= limit:
+                break
+        return results
+
+    def serves(self, state):
+        """Return every installer that serves the given state, highest rated first"""
+        return self.query(all_states=[state])
+
+    def states_for(self, installer_id):
+        """Return the states served by one installer"""
+        position = self._position_by_id.get(installer_id)
+        if position is None:
+            return []
+        return [state for state, bitmap in sorted(self.state_bitmaps.items()) if bitmap >> position & 1]
+
+    def save(self, path):
+        """
+        Serialize the index to a compact JSON file.
+
+        Bitmaps are stored as base64 little-endian bytes, so loading needs
+        only one json.load and an int.from_bytes per state.
+        """
+        byte_length = max(1, (len(self.installers) + 7) // 8)
+        payload = {
+            'version': INDEX_FORMAT_VERSION,
+            'columns': ['id', 'company_name', 'profile_url', 'aggregate_rating', 'review_count'],
+            'installers': [
+                [i['id'], i['company_name'], i['profile_url'], i['aggregate_rating'], i['review_count']]
+                for i in self.installers
+            ],
+            'states': {
+                state: base64.b64encode(bitmap.to_bytes(byte_length, 'little')).decode('ascii')
+                for state, bitmap in sorted(self.state_bitmaps.items())
+            }
+        }
+        temp_path = f"{path}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as file:
+            json.dump(payload, file, ensure_ascii=False, separators=(',', ':'))
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path):
+        with open(path, 'r', encoding='utf-8') as file:
+            payload = json.load(file)
+        if payload.get('version') != INDEX_FORMAT_VERSION:
+            raise ValueError(f"Unsupported installer index version: {payload.get('version')}")
+        columns = payload['columns']
+        installers = [dict(zip(columns, values)) for values in payload['installers']]
+        state_bitmaps = {
+            state: int.from_bytes(base64.b64decode(encoded), 'little')
+            for state, encoded in payload['states'].items()
+        }
+        return cls(installers, state_bitmaps)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the state-coverage installer index")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    build_parser = subparsers.add_parser('build', help="Build the index from an installer details catalog")
+    build_parser.add_argument('catalog', nargs='?', default='all_massachusetts_installer_details.tsv')
+    build_parser.add_argument('-o', '--output', default='installer_index.json')
+
+    query_parser = subparsers.add_parser('query', help="Query a saved index")
+    query_parser.add_argument('--index', default='installer_index.json')
+    query_parser.add_argument('--all', nargs='*', default=[], metavar='STATE', help="Must serve all of these")
+    query_parser.add_argument('--any', nargs='*', default=[], metavar='STATE', help="Must serve one of these")
+    query_parser.add_argument('--min-rating', type=float)
+    query_parser.add_argument('--min-reviews', type=int)
+    query_parser.add_argument('--limit', type=int)
+
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        index = InstallerIndex.from_catalog(args.catalog)
+        index.save(args.output)
+        print(f"Indexed {len(index.installers)} installers across {len(index.states)} states")
+        print(f"Index saved to {os.path.abspath(args.output)}")
+    else:
+        index = InstallerIndex.load(args.index)
+        results = index.query(all_states=args.all, any_states=args.any, min_rating=args.min_rating,
+                              min_reviews=args.min_reviews, limit=args.limit)
+        print(f"Found {len(results)} installers")
+        for installer in results:
+            print(f"  {installer['id']}: {installer['company_name']} "
+                  f"({installer['aggregate_rating']}★, {installer['review_count']} reviews)")
+
+
+if __name__ == "__main__":
+    main()
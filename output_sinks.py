@@ -0,0 +1,292 @@
+import csv
+import json
+import os
+
+# Column layouts shared by every writer of the crawl catalogs
+INSTALLER_FIELDNAMES = [
+    'id', 'company_name', 'description', 'profile_url',
+    'states_served', 'headquarters', 'other_locations', 'gallery_media',
+    'image_count', 'video_count', 'aggregate_rating', 'review_count'
+]
+
+MEDIA_FIELDNAMES = [
+    'company_id', 'company_name', 'media_id', 'media_type',
+    'url', 'local_path', 'filename',
+    'video_platform', 'video_id', 'video_url',
+    'content_digest', 'real_format', 'width', 'height', 'byte_size', 'thumbnails',
+    'phash', 'duplicate_of'
+]
+
+REVIEW_FIELDNAMES = [
+    'company_id', 'company_name', 'review_id', 'reviewer_name',
+    'review_date', 'rating', 'review_text'
+]
+
+# Default write buffer for each catalog file (bytes)
+DEFAULT_BUFFER_SIZE = 256 * 1024
+
+
+class CatalogRecord:
+    """
+    Base of the slotted row types of the catalogs.
+
+    A record has exactly its catalog's columns as attributes, so it takes a
+    fraction of the memory of a row dictionary. Unknown or missing required
+    fields raise TypeError when the record is built, not when it is exported.
+    Records also answer row[field], row.get() and keys(), so code written for
+    row dictionaries (SQLiteStore, SearchIndex) accepts them unchanged.
+    """
+
+    __slots__ = ()
+    FIELDNAMES = []
+    REQUIRED = ()
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls._fields = frozenset(cls.FIELDNAMES)
+
+    def __init__(self, **fields):
+        for field in self.REQUIRED:
+            if fields.get(field) in (None, ''):
+                raise TypeError(f"{type(self).__name__} requires {field}")
+        for field in self.FIELDNAMES:
+            setattr(self, field, fields.pop(field, ''))
+        if fields:
+            raise TypeError(f"{type(self).__name__} has no field(s): {', '.join(sorted(fields))}")
+
+    @classmethod
+    def from_row(cls, row):
+        """Build a record from a row dictionary, ignoring columns this catalog does not have"""
+        return cls(**{field: row[field] for field in cls.FIELDNAMES if field in row})
+
+    def csv_values(self):
+        """Cell values in column order, as serialize_row produces them"""
+        values = []
+        for field in self.FIELDNAMES:
+            value = getattr(self, field)
+            values.append('' if value is None else str(value))
+        return values
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDNAMES}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), ensure_ascii=False)
+
+    def keys(self):
+        return self.FIELDNAMES
+
+    def __getitem__(self, field):
+        if field not in self._fields:
+            raise KeyError(field)
+        return getattr(self, field)
+
+    def __contains__(self, field):
+        return field in self._fields
+
+    def get(self, field, default=None):
+        return getattr(self, field) if field in self._fields else default
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.csv_values() == other.csv_values()
+
+    def __repr__(self):
+        return f"{type(self).__name__}({', '.join(f'{field}={getattr(self, field)!r}' for field in self.FIELDNAMES)})"
+
+
+class InstallerRecord(CatalogRecord):
+    __slots__ = tuple(INSTALLER_FIELDNAMES)
+    FIELDNAMES = INSTALLER_FIELDNAMES
+    REQUIRED = ('id', 'company_name')
+
+
+class MediaRecord(CatalogRecord):
+    __slots__ = tuple(MEDIA_FIELDNAMES)
+    FIELDNAMES = MEDIA_FIELDNAMES
+    REQUIRED = ('company_id', 'media_id')
+
+
+class ReviewRecord(CatalogRecord):
+    __slots__ = tuple(REVIEW_FIELDNAMES)
+    FIELDNAMES = REVIEW_FIELDNAMES
+    REQUIRED = ('company_id', 'review_id')
+
+
+def serialize_row(row, fieldnames):
+    """
+    Turn a row dictionary into the ordered list of cell values for a catalog.
+
+    The result is computed once per row and handed to every output format,
+    so the CSV and TSV copies of a row can never disagree.
+
+    Args:
+        row: Dictionary with the row data, or a CatalogRecord
+        fieldnames: Ordered column names of the target catalog
+
+    Returns:
+        List of string values in column order (missing fields become '')
+    """
+    if isinstance(row, CatalogRecord) and row.FIELDNAMES is fieldnames:
+        return row.csv_values()
+    values = []
+    for field in fieldnames:
+        value = row.get(field, '')
+        values.append('' if value is None else str(value))
+    return values
+
+
+def upgrade_catalog_header(path, fieldnames, delimiter=',', quoting=csv.QUOTE_ALL):
+    """
+    Rewrite a catalog written with an older column layout to the current one.
+
+    Columns missing from the file are added empty. The copy is streamed to a
+    temporary file and swapped in atomically, so appending new rows never
+    mixes layouts.
+
+    Args:
+        path: Existing catalog file
+        fieldnames: Current column layout
+        delimiter: Catalog delimiter
+        quoting: csv quoting mode of the catalog
+
+    Returns:
+        True if the file was rewritten
+    """
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        header = next(csv.reader(f, delimiter=delimiter), [])
+    if header == list(fieldnames):
+        return False
+    if set(header) - set(fieldnames):
+        raise ValueError(f"{path} has columns {sorted(set(header) - set(fieldnames))} "
+                         f"that are not in the current layout; not appending to it")
+
+    print(f"Upgrading {path} to the current column layout")
+    temp_path = f"{path}.tmp"
+    with open(path, 'r', newline='', encoding='utf-8-sig') as source, \
+            open(temp_path, 'w', newline='', encoding='utf-8-sig') as target:
+        reader = csv.DictReader(source, delimiter=delimiter)
+        writer = csv.writer(target, delimiter=delimiter, quoting=quoting)
+        writer.writerow(fieldnames)
+        for row in reader:
+            writer.writerow(serialize_row(row, fieldnames))
+    os.replace(temp_path, path)
+    return True
+
+
+class CatalogFile:
+    """
+    A single append-only CSV/TSV catalog that stays open for the whole crawl.
+
+    The header is written only when the file is new or empty. An existing
+    file whose header lacks some of the columns is first upgraded (see
+    upgrade_catalog_header). Rows are buffered in memory by the file object
+    and reach the disk on flush().
+    """
+
+    def __init__(self, path, fieldnames, delimiter=',', quoting=csv.QUOTE_ALL,
+                 buffer_size=DEFAULT_BUFFER_SIZE):
+        self.path = path
+        self.fieldnames = list(fieldnames)
+        self.rows_written = 0
+
+        needs_header = not os.path.exists(path) or os.path.getsize(path) == 0
+        if not needs_header:
+            upgrade_catalog_header(path, self.fieldnames, delimiter, quoting)
+        # utf-8-sig only emits the BOM at position 0, so appending is safe
+        self._handle = open(path, 'a', newline='', encoding='utf-8-sig', buffering=buffer_size)
+        self._writer = csv.writer(self._handle, delimiter=delimiter, quoting=quoting)
+
+        if needs_header:
+            self._writer.writerow(self.fieldnames)
+
+    def write_values(self, values):
+        """Append one already-serialized row"""
+        self._writer.writerow(values)
+        self.rows_written += 1
+
+    def flush(self, sync=True):
+        """
+        Push buffered rows to the operating system, optionally forcing them to disk.
+
+        Args:
+            sync: When True, also fsync so the rows survive a crash or power loss
+        """
+        if self._handle.closed:
+            return
+        self._handle.flush()
+        if sync:
+            os.fsync(self._handle.fileno())
+
+    def close(self):
+        if not self._handle.closed:
+            self.flush()
+            self._handle.close()
+
+
+class CrawlSinks:
+    """
+    Output layer for a crawl: installer details (CSV and TSV), media catalog and reviews catalog.
+
+    All four files are opened once and kept open. Each row is serialized a
+    single time and then written to every format that carries it. Nothing is
+    retained after a write, so memory does not grow with the size of the crawl;
+    only running counters are kept.
+
+    Call checkpoint() at natural boundaries (e.g. after each installer) to
+    flush and fsync everything written so far.
+    """
+
+    def __init__(self, installer_csv, installer_tsv, media_catalog, reviews_catalog,
+                 buffer_size=DEFAULT_BUFFER_SIZE):
+        self.installer_csv = CatalogFile(installer_csv, INSTALLER_FIELDNAMES,
+                                         quoting=csv.QUOTE_ALL, buffer_size=buffer_size)
+        self.installer_tsv = CatalogFile(installer_tsv, INSTALLER_FIELDNAMES, delimiter='\t',
+                                         quoting=csv.QUOTE_MINIMAL, buffer_size=buffer_size)
+        self.media_catalog = CatalogFile(media_catalog, MEDIA_FIELDNAMES,
+                                         quoting=csv.QUOTE_ALL, buffer_size=buffer_size)
+        self.reviews_catalog = CatalogFile(reviews_catalog, REVIEW_FIELDNAMES,
+                                           quoting=csv.QUOTE_ALL, buffer_size=buffer_size)
+        self.checkpoints = 0
+
+    @property
+    def installer_count(self):
+        return self.installer_csv.rows_written
+
+    @property
+    def media_count(self):
+        return self.media_catalog.rows_written
+
+    @property
+    def review_count(self):
+        return self.reviews_catalog.rows_written
+
+    def write_installer(self, installer_row):
+        values = serialize_row(installer_row, INSTALLER_FIELDNAMES)
+        self.installer_csv.write_values(values)
+        self.installer_tsv.write_values(values)
+
+    def write_media(self, media_row):
+        self.media_catalog.write_values(serialize_row(media_row, MEDIA_FIELDNAMES))
+
+    def write_review(self, review_row):
+        self.reviews_catalog.write_values(serialize_row(review_row, REVIEW_FIELDNAMES))
+
+    def checkpoint(self):
+        """Flush and fsync every catalog so completed installers are durable"""
+        for catalog in self._catalogs():
+            catalog.flush(sync=True)
+        self.checkpoints += 1
+
+    def close(self):
+        for catalog in self._catalogs():
+            catalog.close()
+
+    def _catalogs(self):
+        return (self.installer_csv, self.installer_tsv, self.media_catalog, self.reviews_catalog)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
@@ -0,0 +1,419 @@
+import argparse
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+import zlib
+
+try:
+    import zstandard
+except ImportError:  # without zstandard the archive falls back to zlib with a preset dictionary
+    zstandard = None
+
+DEFAULT_ARCHIVE_DIR = 'page_archive'
+
+# Pages stored before a compression dictionary is trained automatically
+AUTO_TRAIN_PAGES = 200
+
+# Size of trained zstd dictionaries; zlib preset dictionaries are capped at 32 KB by the format
+ZSTD_DICTIONARY_SIZE = 112 * 1024
+ZLIB_DICTIONARY_SIZE = 32 * 1024
+
+ZSTD_LEVEL = 12
+ZLIB_LEVEL = 9
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS pages (
+    id          INTEGER PRIMARY KEY,
+    url         TEXT NOT NULL,
+    kind        TEXT NOT NULL,
+    page        INTEGER NOT NULL DEFAULT 1,
+    fetched_at  REAL NOT NULL,
+    segment     TEXT NOT NULL,
+    offset      INTEGER NOT NULL,
+    length      INTEGER NOT NULL,
+    raw_size    INTEGER NOT NULL,
+    sha256      TEXT NOT NULL,
+    codec       TEXT NOT NULL,
+    dict_id     INTEGER
+);
+CREATE INDEX IF NOT EXISTS idx_pages_url ON pages(url, kind, page, fetched_at);
+CREATE INDEX IF NOT EXISTS idx_pages_fetched ON pages(fetched_at);
+
+CREATE TABLE IF NOT EXISTS dictionaries (
+    dict_id      INTEGER PRIMARY KEY,
+    codec        TEXT NOT NULL,
+    created_at   REAL NOT NULL,
+    sample_count INTEGER NOT NULL,
+    data         BLOB NOT NULL
+);
+"""
+
+
+def default_codec():
+    return 'zstd' if zstandard is not None else 'zlib'
+
+
+def _segment_name(timestamp):
+    # One append-only segment per month, so old months can be pruned or moved as whole files
+    return time.strftime('pages-%Y-%m.bin', time.gmtime(timestamp))
+
+
+class PageArchive:
+    """
+    Append-only archive of raw fetched pages with a URL/time index.
+
+    Every page is compressed on its own (zstd, or zlib when zstandard is not
+    installed; get it with `pip install zstandard`, it is not vendored in
+    this repo) against a dictionary trained on earlier pages, so a single
+    page can be read back without touching its neighbours. Bodies are
+    appended to monthly segment files; index.db maps (url, kind, page,
+    fetched_at) to a segment offset. A page whose body is unchanged since
+    its previous capture gets an index row pointing at the stored copy, so
+    nightly re-crawls of unchanged pages cost no space.
+
+    Appends are serialized through the index database's write lock, so
+    threads and processes on one host can share an archive.
+    """
+
+    def __init__(self, path=DEFAULT_ARCHIVE_DIR, codec=None, auto_train_pages=AUTO_TRAIN_PAGES):
+        self.path = path
+        self.codec = codec or default_codec()
+        if self.codec == 'zstd' and zstandard is None:
+            raise ImportError("The zstd codec requires zstandard. Install it with: pip install zstandard")
+        self.auto_train_pages = auto_train_pages
+        os.makedirs(path, exist_ok=True)
+
+        self.conn = sqlite3.connect(os.path.join(path, 'index.db'), timeout=30, check_same_thread=False,
+                                    isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+        self._dictionaries = {}
+        self._compressor = None
+        self._dict_id = None
+        self._load_current_dictionary()
+
+    def _load_current_dictionary(self):
+        row = self.conn.execute(
+            "SELECT dict_id FROM dictionaries WHERE codec = ? ORDER BY dict_id DESC LIMIT 1", (self.codec,)
+        ).fetchone()
+        self._dict_id = row['dict_id'] if row else None
+        self._compressor = None
+
+    def _dictionary(self, dict_id):
+        if dict_id not in self._dictionaries:
+            row = self.conn.execute("SELECT data FROM dictionaries WHERE dict_id = ?", (dict_id,)).fetchone()
+            self._dictionaries[dict_id] = bytes(row['data'])
+        return self._dictionaries[dict_id]
+
+    def _compress(self, data):
+        if self.codec == 'zstd':
+            if self._compressor is None:
+                dictionary = None
+                if self._dict_id is not None:
+                    dictionary = zstandard.ZstdCompressionDict(self._dictionary(self._dict_id))
+                self._compressor = zstandard.ZstdCompressor(level=ZSTD_LEVEL, dict_data=dictionary)
+            return self._compressor.compress(data)
+        if self._dict_id is not None:
+            compressor = zlib.compressobj(ZLIB_LEVEL, zdict=self._dictionary(self._dict_id))
+        else:
+            compressor = zlib.compressobj(ZLIB_LEVEL)
+        return compressor.compress(data) + compressor.flush()
+
+    def _decompress(self, data, codec, dict_id):
+        if codec == 'zstd':
+            if zstandard is None:
+                raise ImportError("This page was archived with zstd. Install zstandard to read it")
+            dictionary = zstandard.ZstdCompressionDict(self._dictionary(dict_id)) if dict_id is not None else None
+            return zstandard.ZstdDecompressor(dict_data=dictionary).decompress(data)
+        if dict_id is not None:
+            decompressor = zlib.decompressobj(zdict=self._dictionary(dict_id))
+        else:
+            decompressor = zlib.decompressobj()
+        return decompressor.decompress(data) + decompressor.flush()
+
+    def add(self, url, html, kind='page', page=1, fetched_at=None):
+        """
+        Store one fetched page.
+
+        Args:
+            url: URL the page was fetched from
+            html: Page source
+            kind: What the page is: 'listing', 'profile', 'gallery', 'reviews', ...
+            page: Page number within a paginated view of the same URL
+            fetched_at: Fetch time (defaults to now)
+
+        Returns:
+            Index row id
+        """
+        fetched_at = fetched_at or time.time()
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+
+        with self._lock:
+            self.conn.execute("BEGIN IMMEDIATE")
+            try:
+                previous = self.conn.execute(
+                    """SELECT * FROM pages WHERE url = ? AND kind = ? AND page = ?
+                       ORDER BY fetched_at DESC LIMIT 1""", (url, kind, page)
+                ).fetchone()
+                if previous is not None and previous['sha256'] == digest:
+                    # Unchanged since the last capture: index it again, store nothing
+                    location = (previous['segment'], previous['offset'], previous['length'],
+                                previous['codec'], previous['dict_id'])
+                else:
+                    compressed = self._compress(data)
+                    segment = _segment_name(fetched_at)
+                    with open(os.path.join(self.path, segment), 'ab') as f:
+                        offset = f.seek(0, os.SEEK_END)
+                        f.write(compressed)
+                    location = (segment, offset, len(compressed), self.codec, self._dict_id)
+
+                cursor = self.conn.execute(
+                    """INSERT INTO pages (url, kind, page, fetched_at, segment, offset, length, raw_size,
+                                          sha256, codec, dict_id)
+                       VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                    (url, kind, page, fetched_at, location[0], location[1], location[2], len(data),
+                     digest, location[3], location[4])
+                )
+                self.conn.execute("COMMIT")
+            except BaseException:
+                self.conn.execute("ROLLBACK")
+                raise
+
+            if self._dict_id is None and self.auto_train_pages:
+                stored = self.conn.execute("SELECT COUNT(DISTINCT sha256) FROM pages").fetchone()[0]
+                if stored >= self.auto_train_pages:
+                    self._train_locked()
+        return cursor.lastrowid
+
+    def _read(self, row):
+        with open(os.path.join(self.path, row['segment']), 'rb') as f:
+            f.seek(row['offset'])
+            data = f.read(row['length'])
+        return self._decompress(data, row['codec'], row['dict_id']).decode('utf-8')
+
+    def latest(self, url, kind=None, page=1, at=None):
+        """
+        Latest capture of a URL, optionally as it was at a given time.
+
+        Args:
+            url: Page URL
+            kind: Page kind (any kind when None)
+            page: Page number within the URL
+            at: Only consider captures at or before this timestamp
+
+        Returns:
+            (index row, page source) tuple, or None if the URL was never archived
+        """
+        query = "SELECT * FROM pages WHERE url = ? AND page = ? AND fetched_at <= ?"
+        params = [url, page, at or float('inf')]
+        if kind is not None:
+            query += " AND kind = ?"
+            params.append(kind)
+        with self._lock:
+            row = self.conn.execute(query + " ORDER BY fetched_at DESC LIMIT 1", params).fetchone()
+            return (row, self._read(row)) if row else None
+
+    def get(self, url, kind=None, page=1, at=None):
+        """Page source of the latest capture of a URL (see latest), or None"""
+        captured = self.latest(url, kind, page, at)
+        return captured[1] if captured else None
+
+    def history(self, url):
+        """Index rows of every capture of a URL, oldest first"""
+        with self._lock:
+            return self.conn.execute(
+                "SELECT * FROM pages WHERE url = ? ORDER BY fetched_at, page", (url,)
+            ).fetchall()
+
+    def iter_pages(self, kind=None, since=None, latest_only=True, url=None):
+        """
+        Read archived pages back, e.g. to re-parse them without a new crawl.
+
+        Args:
+            kind: Only pages of this kind
+            since: Only captures at or after this timestamp
+            latest_only: Only the newest capture of each (url, kind, page)
+            url: Only captures of this URL
+
+        Yields:
+            (index row, page source) tuples, ordered by URL and page
+        """
+        conditions = []
+        params = []
+        if url is not None:
+            conditions.append("url = ?")
+            params.append(url)
+        if kind is not None:
+            conditions.append("kind = ?")
+            params.append(kind)
+        if since is not None:
+            conditions.append("fetched_at >= ?")
+            params.append(since)
+        where = f"WHERE {' AND '.join(conditions)}" if conditions else ""
+        if latest_only:
+            query = f"""SELECT * FROM pages WHERE id IN (
+                            SELECT id FROM (
+                                SELECT id, ROW_NUMBER() OVER (PARTITION BY url, kind, page
+                                                              ORDER BY fetched_at DESC) AS position
+                                FROM pages {where}
+                            ) WHERE position = 1
+                        ) ORDER BY url, kind, page"""
+        else:
+            query = f"SELECT * FROM pages {where} ORDER BY url, kind, page, fetched_at"
+        with self._lock:
+            rows = self.conn.execute(query, params).fetchall()
+        for row in rows:
+            with self._lock:
+                html = self._read(row)
+            yield row, html
+
+    def train(self, sample_count=500):
+        """
+        Train a new compression dictionary from the most recently stored pages.
+
+        Pages stored afterwards use it; earlier pages keep the dictionary they
+        were written with, which stays in the index.
+
+        Returns:
+            New dictionary id, or None if there are too few pages
+        """
+        with self._lock:
+            return self._train_locked(sample_count)
+
+    def _train_locked(self, sample_count=500):
+        rows = self.conn.execute(
+            """SELECT * FROM pages WHERE id IN (SELECT MAX(id) FROM pages GROUP BY sha256)
+               ORDER BY id DESC LIMIT ?""", (sample_count,)
+        ).fetchall()
+        if len(rows) < 10:
+            return None
+        samples = [self._read(row).encode('utf-8') for row in rows]
+
+        if self.codec == 'zstd':
+            data = zstandard.train_dictionary(ZSTD_DICTIONARY_SIZE, samples).as_bytes()
+        else:
+            # zlib matches best against the end of a preset dictionary, so use the tail of a typical page
+            samples.sort(key=len)
+            data = samples[len(samples) // 2][-ZLIB_DICTIONARY_SIZE:]
+
+        with self.conn:
+            cursor = self.conn.execute(
+                "INSERT INTO dictionaries (codec, created_at, sample_count, data) VALUES (?, ?, ?, ?)",
+                (self.codec, time.time(), len(samples), data)
+            )
+        self._load_current_dictionary()
+        print(f"Trained {self.codec} page archive dictionary {cursor.lastrowid} from {len(samples)} pages")
+        return cursor.lastrowid
+
+    def stats(self):
+        with self._lock:
+            row = self.conn.execute(
+                """SELECT COUNT(*) AS captures, COUNT(DISTINCT url) AS urls, SUM(raw_size) AS raw_bytes,
+                          MIN(fetched_at) AS first_fetch, MAX(fetched_at) AS last_fetch
+                   FROM pages"""
+            ).fetchone()
+            stored = self.conn.execute(
+                "SELECT COUNT(*) AS bodies, SUM(length) AS stored_bytes FROM (SELECT DISTINCT segment, offset, length FROM pages)"
+            ).fetchone()
+        return {
+            'captures': row['captures'], 'urls': row['urls'], 'bodies': stored['bodies'],
+            'raw_bytes': row['raw_bytes'] or 0, 'stored_bytes': stored['stored_bytes'] or 0,
+            'first_fetch': row['first_fetch'], 'last_fetch': row['last_fetch'],
+        }
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+_default_archive = None
+
+
+def enable_archive(path=DEFAULT_ARCHIVE_DIR):
+    """Archive every page passed to archive_page in this process"""
+    global _default_archive
+    if _default_archive is None:
+        _default_archive = PageArchive(path)
+        print(f"Archiving fetched pages to {os.path.abspath(path)} ({_default_archive.codec})")
+    return _default_archive
+
+
+def close_archive():
+    global _default_archive
+    if _default_archive is not None:
+        _default_archive.close()
+        _default_archive = None
+
+
+def archive_page(url, html, kind='page', page=1):
+    """
+    Store a fetched page in the archive enabled for this process; does nothing when none is.
+
+    Archiving never interrupts a crawl: errors are reported and ignored.
+    """
+    if _default_archive is None or not html:
+        return
+    try:
+        _default_archive.add(url, html, kind, page)
+    except Exception as e:
+        print(f"Could not archive {url}: {e}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Inspect the raw page archive")
+    parser.add_argument('--archive', default=DEFAULT_ARCHIVE_DIR, help="Archive directory")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    subparsers.add_parser('stats', help="Captures, distinct pages and compression ratio")
+    train_parser = subparsers.add_parser('train', help="Train a new compression dictionary from recent pages")
+    train_parser.add_argument('--samples', type=int, default=500)
+    history_parser = subparsers.add_parser('history', help="List the captures of a URL")
+    history_parser.add_argument('url')
+    get_parser = subparsers.add_parser('get', help="Print the latest capture of a URL")
+    get_parser.add_argument('url')
+    get_parser.add_argument('--kind')
+    get_parser.add_argument('--page', type=int, default=1)
+    get_parser.add_argument('--at', help="Capture as of this time, YYYY-MM-DD or YYYY-MM-DD HH:MM")
+    args = parser.parse_args()
+
+    with PageArchive(args.archive) as archive:
+        if args.command == 'stats':
+            stats = archive.stats()
+            ratio = stats['raw_bytes'] / stats['stored_bytes'] if stats['stored_bytes'] else 0
+            print(f"{stats['captures']} captures of {stats['urls']} URLs, {stats['bodies']} distinct bodies")
+            print(f"{stats['raw_bytes'] / 1e6:.1f} MB of pages stored in {stats['stored_bytes'] / 1e6:.2f} MB "
+                  f"({ratio:.1f}x)")
+        elif args.command == 'train':
+            archive.train(args.samples)
+        elif args.command == 'history':
+            for row in archive.history(args.url):
+                fetched = time.strftime('%Y-%m-%d %H:%M', time.localtime(row['fetched_at']))
+                print(f"  {fetched} {row['kind']} page {row['page']}: {row['raw_size']} bytes -> "
+                      f"{row['length']} ({row['codec']}, dictionary {row['dict_id']})")
+        else:
+            at = None
+            if args.at:
+                layout = '%Y-%m-%d %H:%M' if ' ' in args.at else '%Y-%m-%d'
+                at = time.mktime(time.strptime(args.at, layout))
+            html = archive.get(args.url, args.kind, args.page, at)
+            if html is None:
+                print(f"{args.url} is not in the archive")
+            else:
+                print(html)
+
+
+if __name__ == "__main__":
+    main()
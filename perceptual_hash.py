@@ -0,0 +1,307 @@
+import argparse
+import json
+import os
+import threading
+
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is only needed to decode images for hashing
+    Image = None
+
+DEFAULT_HASH_LOG = 'perceptual_hashes.jsonl'
+
+# Images whose 64-bit pHashes differ in at most this many bits are treated as the same photo
+DEFAULT_MAX_DISTANCE = 8
+
+# pHash works on a 32x32 grayscale thumbnail and keeps the 8x8 lowest DCT frequencies
+HASH_IMAGE_SIZE = 32
+HASH_BLOCK_SIZE = 8
+
+
+def _dct_matrix(n):
+    """Orthonormal DCT-II basis, so a 2-D DCT of a batch is two matrix products"""
+    k = np.arange(n)[:, None]
+    i = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * i + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+_DCT = _dct_matrix(HASH_IMAGE_SIZE)
+_BIT_WEIGHTS = (1 << np.arange(HASH_BLOCK_SIZE * HASH_BLOCK_SIZE - 1, -1, -1, dtype=np.uint64)).astype(np.uint64)
+
+
+def load_hash_pixels(path):
+    """
+    Decode an image into the 32x32 grayscale array pHash works on.
+
+    Returns:
+        float32 array of shape (32, 32), or None if the file cannot be decoded
+    """
+    if Image is None:
+        raise ImportError("Perceptual hashing requires Pillow. Install it with: pip install Pillow")
+    try:
+        with Image.open(path) as image:
+            # draft() lets JPEG decode at a reduced scale, which is most of the cost for large photos
+            image.draft('L', (HASH_IMAGE_SIZE * 4, HASH_IMAGE_SIZE * 4))
+            small = image.convert('L').resize((HASH_IMAGE_SIZE, HASH_IMAGE_SIZE), Image.LANCZOS)
+            return np.asarray(small, dtype=np.float32)
+    except Exception as e:
+        print(f"Could not hash {path}: {e}")
+        return None
+
+
+def phash_batch(pixels):
+    """
+    Compute 64-bit pHashes for a batch of images at once.
+
+    Args:
+        pixels: Array of shape (N, 32, 32) from load_hash_pixels
+
+    Returns:
+        List of N Python ints
+    """
+    if len(pixels) == 0:
+        return []
+    batch = np.asarray(pixels, dtype=np.float64)
+    # 2-D DCT of every image: D @ X @ D.T, batched
+    coefficients = np.einsum('ij,njk,lk->nil', _DCT, batch, _DCT)
+    block = coefficients[:, :HASH_BLOCK_SIZE, :HASH_BLOCK_SIZE].reshape(len(batch), -1)
+    # The DC term only reflects overall brightness, so it is left out of the median
+    medians = np.median(block[:, 1:], axis=1, keepdims=True)
+    bits = (block > medians).astype(np.uint64)
+    return [int(value) for value in (bits * _BIT_WEIGHTS).sum(axis=1, dtype=np.uint64)]
+
+
+def hamming_distance(a, b):
+    return bin(a ^ b).count('1')
+
+
+class BKTree:
+    """
+    Burkhard-Keller tree over Hamming distance.
+
+    A search for everything within distance d only descends into children
+    whose edge distance lies within d of the query's distance to the node,
+    so most of the tree is never visited.
+    """
+
+    def __init__(self):
+        self.root = None
+        self.size = 0
+
+    def add(self, hash_value, item):
+        node = [hash_value, item, {}]
+        self.size += 1
+        if self.root is None:
+            self.root = node
+            return
+        current = self.root
+        while True:
+            distance = hamming_distance(hash_value, current[0])
+            child = current[2].get(distance)
+            if child is None:
+                current[2][distance] = node
+                return
+            current = child
+
+    def search(self, hash_value, max_distance):
+        """
+        Returns:
+            List of (distance, item) within max_distance, closest first
+        """
+        if self.root is None:
+            return []
+        matches = []
+        stack = [self.root]
+        while stack:
+            node_hash, item, children = stack.pop()
+            distance = hamming_distance(hash_value, node_hash)
+            if distance <= max_distance:
+                matches.append((distance, item))
+            for edge, child in children.items():
+                if distance - max_distance <= edge <= distance + max_distance:
+                    stack.append(child)
+        matches.sort(key=lambda match: match[0])
+        return matches
+
+
+class PerceptualIndex:
+    """
+    pHashes of every gallery image seen so far, across all installers.
+
+    Hashes are appended to a JSON-lines log as they are added, so the index
+    survives restarts without ever rewriting the file, and rebuilt into a
+    BK-tree on load. A re-crawled image reuses its installer's entry from an
+    earlier run (see reuse), so the tree holds each image once however often
+    its gallery is crawled.
+    """
+
+    def __init__(self, log_path=DEFAULT_HASH_LOG, max_distance=DEFAULT_MAX_DISTANCE):
+        self.log_path = log_path
+        self.max_distance = max_distance
+        self.tree = BKTree()
+        self._entries = {}  # (company_id, phash) -> entry in the tree
+        self._session_media = set()
+        self._lock = threading.Lock()
+
+        if log_path and os.path.exists(log_path):
+            with open(log_path, 'r', encoding='utf-8') as f:
+                for line in f:
+                    line = line.strip()
+                    if line:
+                        entry = json.loads(line)
+                        key = (entry['company_id'], entry['phash'])
+                        if key in self._entries:
+                            # A later line for the same image: the entry was reused by a re-crawl
+                            self._entries[key].update(entry)
+                        else:
+                            self._entries[key] = entry
+                            self.tree.add(int(entry['phash'], 16), entry)
+
+    def lookup(self, hash_value, company_id=None):
+        """
+        Earlier images within max_distance of a hash.
+
+        Images the same installer had in an earlier run are not duplicates: a
+        re-crawl of a gallery finds the same photos again.
+
+        Returns:
+            (original, own_earlier): the closest earlier image (log entry) this
+            one duplicates, or None; and, when there is none, the closest image
+            the same installer had in an earlier run, or None
+        """
+        own_earlier = None
+        with self._lock:
+            for _, entry in self.tree.search(hash_value, self.max_distance):
+                if entry['company_id'] == company_id and entry['media_id'] not in self._session_media:
+                    if own_earlier is None:
+                        own_earlier = entry
+                    continue
+                return entry, None
+        return None, own_earlier
+
+    def find(self, hash_value, company_id=None):
+        """Closest earlier image within max_distance, as its log entry, or None (see lookup)"""
+        return self.lookup(hash_value, company_id)[0]
+
+    def add(self, hash_value, media_id, company_id, path):
+        entry = {'phash': format(hash_value, '016x'), 'media_id': media_id,
+                 'company_id': company_id, 'path': path}
+        with self._lock:
+            self.tree.add(hash_value, entry)
+            self._entries[(company_id, entry['phash'])] = entry
+            self._session_media.add(media_id)
+            self._append_log(entry)
+        return entry
+
+    def reuse(self, entry, media_id, path):
+        """
+        Point an installer's entry from an earlier run at its re-crawled image, instead of adding another.
+
+        The entry keeps its hash, so the log line written here replaces the
+        earlier one when the index is loaded again.
+        """
+        with self._lock:
+            entry['media_id'] = media_id
+            entry['path'] = path
+            self._session_media.add(media_id)
+            self._append_log(entry)
+        return entry
+
+    def _append_log(self, entry):
+        if self.log_path:
+            with open(self.log_path, 'a', encoding='utf-8') as f:
+                f.write(json.dumps(entry) + '\n')
+
+
+_default_index = None
+_default_index_lock = threading.Lock()
+
+
+def default_index():
+    """Index shared by every gallery in this process, loaded on first use"""
+    global _default_index
+    with _default_index_lock:
+        if _default_index is None:
+            _default_index = PerceptualIndex()
+        return _default_index
+
+
+def _image_path(media_info):
+    if media_info.get('type') == 'video':
+        return None
+    return media_info.get('path')
+
+
+def flag_near_duplicates(media_items, company_id, index=None):
+    """
+    Hash a gallery's images in one batch and flag the ones already seen.
+
+    Each image gets a 'phash' (16 hex digits). Images within the index's
+    distance of an earlier image, from this installer or any other, also
+    get 'duplicate_of' set to that image's media id. Within a gallery the
+    largest file is hashed in first, so a full-size photo wins over its
+    thumbnail.
+
+    Args:
+        media_items: scrape_installer_gallery media dictionaries
+        company_id: Installer the gallery belongs to
+        index: PerceptualIndex (defaults to the shared one)
+
+    Returns:
+        Number of images flagged as near-duplicates
+    """
+    if Image is None:
+        print("Pillow is not installed; skipping near-duplicate detection")
+        return 0
+    index = index or default_index()
+
+    images = [item for item in media_items if _image_path(item) and os.path.exists(_image_path(item))]
+    images.sort(key=lambda item: os.path.getsize(_image_path(item)), reverse=True)
+    decoded = [(item, load_hash_pixels(_image_path(item))) for item in images]
+    decoded = [(item, pixels) for item, pixels in decoded if pixels is not None]
+    if not decoded:
+        return 0
+
+    hashes = phash_batch(np.stack([pixels for _, pixels in decoded]))
+    flagged = 0
+    for (item, _), hash_value in zip(decoded, hashes):
+        item['phash'] = format(hash_value, '016x')
+        original, own_earlier = index.lookup(hash_value, company_id)
+        if original is not None:
+            item['duplicate_of'] = original['media_id']
+            flagged += 1
+            print(f"Image {item['id']} is a near-duplicate of {original['media_id']} "
+                  f"(installer {original['company_id']})")
+        elif own_earlier is not None:
+            index.reuse(own_earlier, item['id'], _image_path(item))
+        else:
+            index.add(hash_value, item['id'], company_id, _image_path(item))
+    return flagged
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Look up near-duplicates of an image in the hash log")
+    parser.add_argument('images', nargs='+', help="Image files to look up")
+    parser.add_argument('--log', default=DEFAULT_HASH_LOG, help="Perceptual hash log")
+    parser.add_argument('--max-distance', type=int, default=DEFAULT_MAX_DISTANCE)
+    args = parser.parse_args()
+
+    index = PerceptualIndex(args.log, args.max_distance)
+    print(f"{index.tree.size} hashes loaded from {args.log}")
+    for path in args.images:
+        pixels = load_hash_pixels(path)
+        if pixels is None:
+            continue
+        hash_value = phash_batch(pixels[None])[0]
+        matches = index.tree.search(hash_value, args.max_distance)
+        print(f"{path}: pHash {hash_value:016x}, {len(matches)} near-duplicates")
+        for distance, entry in matches:
+            print(f"  distance {distance}: {entry['media_id']} (installer {entry['company_id']}) {entry['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,466 @@
+import re
+import urllib.parse
+
+from review_parser import clean_text
+from selector_registry import DEFAULT_SELECTORS
+
+
+def absolute_url(url, page_url):
+    """Make a site-relative URL ('/path') absolute, against the page it was found on"""
+    if url.startswith('/'):
+        parsed_url = urllib.parse.urlparse(page_url)
+        return f"{parsed_url.scheme}://{parsed_url.netloc}{url}"
+    return url
+
+
+def profile_company_name(soup):
+    """Company name from the title of an installer profile page"""
+    return soup.title.string.split('|')[0].strip() if soup.title else "Unknown Company"
+
+
+def find_states_served(soup):
+    """
+    States an installer serves, from the states section of its profile page.
+
+    Args:
+        soup: BeautifulSoup of the profile page
+
+    Returns:
+        Sorted list of states (empty if no states section was found)
+    """
+    # Try multiple potential selectors for states served
+    states_selectors = [
+        {'type': 'class', 'value': 'states-served'},
+        {'type': 'class', 'value': 'service-states'},
+        {'type': 'class', 'value': 'states'},
+        {'type': 'class', 'value': 'coverage-area'}
+    ]
+    
+    def find_states(selector):
+        states_div = soup.find('div', class_=selector['value'])
+        if not states_div:
+            return None
+        print(f"Found states using class='{selector['value']}'")
+        
+        # Try to find state links inside the container
+        state_links = states_div.find_all('a')
+        if state_links:
+            states = [link.get_text(strip=True) for link in state_links if link.get_text(strip=True)]
+            return sorted(list(set(states)))  # Remove duplicates and sort
+        
+        # If no links found, try to get text directly
+        states_text = states_div.text.strip()
+        if states_text:
+            print(f"Found states text: {states_text}")
+            # Try to parse states from text (comma-separated list)
+            if ',' in states_text:
+                states = [state.strip() for state in states_text.split(',')]
+                return sorted(list(set(states)))
+        return None
+    
+    _, states = DEFAULT_SELECTORS.first_match('states_served', states_selectors, find_states)
+    return states or []
+
+
+def parse_installer_profile(soup, company_name):
+    """
+    Extract the installer details shown on a profile page.
+
+    Args:
+        soup: BeautifulSoup of the profile page
+        company_name: Company name, used to recognize its logo
+
+    Returns:
+        Dictionary with logo_url, logo_alt, states_served, headquarters and other_locations
+    """
+    result = {
+        "logo_url": "",
+        "logo_alt": "",
+        "states_served": [],
+        "headquarters": "N/A",
+        "other_locations": []
+    }
+    
+    # Track unique locations to avoid duplicates
+    unique_locations = set()
+    
+    # PART 0: Extract company logo
+    # Look for logo image in various locations on the page
+    print("Looking for company logo...")
+    # {company_name} is filled in per page, so the selector registry tracks one pattern, not one per company
+    logo_selectors = [
+        # EnergySage specific selectors based on observed HTML
+        'img[alt$="logo"]',  # Images with alt text ending with "logo"
+        'img[alt*="{company_name}"]',  # Images with company name in alt
+        'img[src*="cloudinary.com/energysage/image/fetch"]',  # Cloudinary hosted images like the example
+        'img[src*="es-media-prod"]',  # EnergySage media URLs
+        # Generic selectors
+        'img[alt*="logo" i]',  # Images with "logo" in alt text (case insensitive)
+        'img[src*="logo" i]',  # Images with "logo" in src URL
+        'img[alt*="{company_name}" i]',  # Images with company name in alt text
+        '.supplier-logo img', '.company-logo img',  # Common class names for logo containers
+        '.logo img', '#logo img',  # More common logo container selectors
+        '.header img', '.navbar-brand img'  # Header areas that might contain logos
+    ]
+    
+    def find_logo(selector):
+        logo_img = soup.select_one(selector.replace('{company_name}', company_name))
+        return logo_img if logo_img and logo_img.get('src') else None
+    
+    _, logo_img = DEFAULT_SELECTORS.first_match('logo', logo_selectors, find_logo)
+    if logo_img:
+        # Found a logo
+        result["logo_url"] = logo_img.get('src', '')
+        result["logo_alt"] = logo_img.get('alt', company_name + ' logo')
+        print(f"Found company logo: {result['logo_url']}")
+    
+    # If still not found, try more direct approach for EnergySage structure
+    if not result["logo_url"]:
+        # Try direct attribute search for width/height 200 images which are likely logos
+        logo_img = soup.find('img', attrs={'width': '200', 'height': '200'})
+        if logo_img and logo_img.get('src'):
+            result["logo_url"] = logo_img.get('src', '')
+            result["logo_alt"] = logo_img.get('alt', company_name + ' logo')
+            print(f"Found company logo with exact dimensions: {result['logo_url']}")
+    
+    if not result["logo_url"]:
+        print("No logo found with standard selectors, trying more generic approach...")
+        # If no logo found, try to find a prominent image at the top of the page
+        header_sections = soup.select('header, .header, .navbar, .company-header, .supplier-header')
+        for section in header_sections:
+            logo_img = section.find('img')
+            if logo_img and logo_img.get('src'):
+                result["logo_url"] = logo_img.get('src', '')
+                result["logo_alt"] = logo_img.get('alt', company_name + ' logo')
+                print(f"Found potential logo in header: {result['logo_url']}")
+                break
+    
+    # PART 1: Extract states served
+    result["states_served"] = find_states_served(soup)
+    
+    if result["states_served"]:
+        print(f"Found {len(result['states_served'])} states served: {', '.join(result['states_served'])}")
+    else:
+        print("No states served information found.")
+        
+        # Attempt to look for any text containing state abbreviations
+        page_text = soup.get_text()
+        common_states = ['MA', 'NH', 'VT', 'CT', 'RI', 'ME', 'NY', 'NJ', 'PA']
+        
+        print("Looking for state abbreviations in page content...")
+        found_states = []
+        for state in common_states:
+            # Look for state abbreviation as a word or with comma
+            if f" {state} " in page_text or f"{state}," in page_text:
+                found_states.append(state)
+        
+        if found_states:
+            print(f"Potential states found in text: {', '.join(found_states)}")
+            result["states_served"] = found_states
+    
+    # PART 2: Extract headquarters information
+    # Try multiple potential selectors for headquarters
+    hq_selectors = [
+        {'type': 'class', 'value': 'headquarters'},
+        {'type': 'class', 'value': 'company-address'},
+        {'type': 'class', 'value': 'address'},
+        {'type': 'class', 'value': 'location'}
+    ]
+        
+    def find_headquarters(selector):
+        hq_div = soup.find('div', class_=selector['value'])
+        if not hq_div:
+            return None
+        print(f"Found headquarters using class='{selector['value']}'")
+        
+        # Try different patterns within the HQ div
+        address_li = hq_div.find('li', class_='supplier-address')
+        if address_li:
+            address_p = address_li.find('p', class_='d-none d-md-block') or address_li.find('p')
+            # Apply clean_text function to normalize formatting
+            return clean_text(' '.join(address_p.stripped_strings)) if address_p else None
+        # If no li.supplier-address, just get all text from div and clean it
+        return clean_text(' '.join(hq_div.stripped_strings))
+    
+    _, headquarters = DEFAULT_SELECTORS.first_match('headquarters', hq_selectors, find_headquarters)
+    if headquarters:
+        result["headquarters"] = headquarters
+    
+    if result["headquarters"] != "N/A":
+        print(f"Found headquarters: {result['headquarters']}")
+    else:
+        print("No headquarters information found.")
+    
+    # PART 3: Extract other locations information
+    # Look for "Other Locations" section - typically this follows the headquarters section
+    other_locations_selectors = [
+        {'type': 'h3', 'text': 'Other Locations'},
+        {'type': 'class', 'value': 'other-locations'},
+        {'type': 'class', 'value': 'locations'},
+        {'type': 'class', 'value': 'branches'}  # Added based on HTML snippet provided
+    ]
+    
+    # First try to find the "Other Locations" heading
+    def find_other_locations_heading(selector):
+        if selector['type'] == 'h3':
+            return soup.find('h3', string=lambda text: text and selector['text'] in text)
+        return soup.find(lambda tag: tag.has_attr('class') and selector['value'] in tag['class'])
+    
+    selector, other_locations_heading = DEFAULT_SELECTORS.first_match(
+        'other_locations', other_locations_selectors, find_other_locations_heading
+    )
+    if other_locations_heading:
+        print(f"Found other locations section using {selector['type']}='{selector.get('text', selector.get('value'))}'")
+    
+    if other_locations_heading:
+        # Look for location list items following the heading
+        # First try to find the ul.list-unstyled directly following the heading
+        locations_list = other_locations_heading.find_next('ul', class_='list-unstyled')
+        
+        if not locations_list:
+            # If not found with class, try any ul element
+            locations_list = other_locations_heading.find_next('ul')
+        
+        if not locations_list:
+            # Try parent's next sibling 
+            parent = other_locations_heading.parent
+            if parent:
+                locations_list = parent.find('ul', class_='list-unstyled') or parent.find_next('ul')
+        
+        if locations_list:
+            location_items = locations_list.find_all('li')
+            for item in location_items:
+                # For each li, look for the desktop version first (more clean text)
+                desktop_p = item.find('p', class_='d-none d-md-block')
+                if desktop_p:
+                    # Convert newlines to commas and extract text, then clean it
+                    location_text = clean_text(desktop_p.get_text(separator=' ', strip=True).replace('\n', ', '))
+                    if location_text and location_text not in unique_locations:
+                        unique_locations.add(location_text)
+                        result["other_locations"].append(location_text)
+                        continue
+                
+                # If desktop version not found or empty, try mobile version
+                mobile_p = item.find('p', class_='my-0')
+                if mobile_p:
+                    # Process similar to desktop version
+                    location_text = clean_text(mobile_p.get_text(separator=' ', strip=True).replace('\n', ', '))
+                    # Remove the SVG icon text if present
+                    if 'M8.604' in location_text:
+                        location_text = location_text.split('M8.604')[0].strip()
+                    if location_text and location_text not in unique_locations:
+                        unique_locations.add(location_text)
+                        result["other_locations"].append(location_text)
+                        continue
+                
+                # If no p tags found, just get all text
+                if not desktop_p and not mobile_p:
+                    location_text = clean_text(' '.join(item.stripped_strings))
+                    if location_text and location_text not in unique_locations:
+                        unique_locations.add(location_text)
+                        result["other_locations"].append(location_text)
+        
+        # If no list items found, try looking for paragraphs or div containers
+        if not result["other_locations"]:
+            location_containers = other_locations_heading.find_next_siblings(['p', 'div'])
+            for container in location_containers[:5]:  # Limit to first 5 to avoid going too far
+                location_text = ' '.join(container.stripped_strings)
+                if location_text.strip() and location_text.strip() not in unique_locations:
+                    unique_locations.add(location_text.strip())
+                    result["other_locations"].append(location_text.strip())
+    
+    # Alternative approach: look for location divs directly
+    if not result["other_locations"]:
+        print("Looking for other locations using alternative approach...")
+        
+        # Look for multiple address elements or location divs
+        address_elements = soup.find_all('li', class_='supplier-address')
+        if len(address_elements) > 1:  # If more than one address, the others are likely additional locations
+            for address in address_elements[1:]:  # Skip the first one (headquarters)
+                address_p = address.find('p', class_='d-none d-md-block') or address.find('p')
+                if address_p:
+                    location_text = ' '.join(address_p.stripped_strings)
+                    if location_text.strip() and location_text.strip() not in unique_locations:
+                        unique_locations.add(location_text.strip())
+                        result["other_locations"].append(location_text.strip())
+    
+    if result["other_locations"]:
+        print(f"Found {len(result['other_locations'])} other locations:")
+        for idx, loc in enumerate(result["other_locations"]):
+            print(f"  {idx+1}. {loc}")
+    else:
+        print("No other locations found.")
+    
+    return result
+
+
+def gallery_page_url(soup, page_url):
+    """
+    URL of the full photo gallery linked from a profile page.
+
+    Args:
+        soup: BeautifulSoup of the profile page
+        page_url: URL of the profile page
+
+    Returns:
+        Absolute gallery URL, or None if the profile has no gallery link
+    """
+    gallery_link = soup.select_one('a.gallery-link[href], a.btn.btn-primary.btn-sm.gallery-link[href]')
+    if gallery_link is None:
+        return None
+    return absolute_url(gallery_link['href'], page_url)
+
+
+def find_gallery_elements(gallery_soup):
+    """
+    Find the image and video elements of a gallery page.
+
+    Args:
+        gallery_soup: BeautifulSoup of the gallery page
+
+    Returns:
+        List of dictionaries with the element and its type ('image' or 'video')
+    """
+    media_elements = []
+    
+    # Find images: the gallery containers first, then image URLs that look like gallery photos,
+    # and as a last resort every image on the page
+    image_selectors = [
+        'div.gallery img, div.photo-gallery img, img.gallery-image',
+        'img[src*="gallery"], img[src*="photo"]',
+        'img[src]'
+    ]
+    _, img_elements = DEFAULT_SELECTORS.first_match('gallery_images', image_selectors, gallery_soup.select)
+    img_elements = img_elements or []
+    
+    # Find video elements or links to videos
+    video_elements = gallery_soup.select('video, iframe[src*="youtube"], iframe[src*="vimeo"], a[href*="youtube"], a[href*="vimeo"]')
+    
+    # Add media elements to the list with their type
+    for img in img_elements:
+        media_elements.append({"element": img, "type": "image"})
+    
+    for video in video_elements:
+        media_elements.append({"element": video, "type": "video"})
+    
+    return media_elements
+
+
+def parse_gallery_element(element, media_type, page_url):
+    """
+    Work out what one gallery element shows, without downloading anything.
+
+    Args:
+        element: Element from find_gallery_elements
+        media_type: Its type from find_gallery_elements
+        page_url: URL of the gallery page, for relative links
+
+    Returns:
+        For an image, a dictionary with type 'image' and url. For a video, a
+        dictionary with type 'video', platform, video_id, video_url,
+        thumbnail_url and from_thumbnail (True when the video was recognized
+        from a YouTube thumbnail image). None if the element holds neither.
+    """
+    if media_type == "image":
+        img_url = element.get('src') or element.get('data-src')
+        if not img_url:
+            return None
+        
+        # Make relative URLs absolute
+        img_url = absolute_url(img_url, page_url)
+        
+        # Check if this is actually a video thumbnail (e.g., YouTube)
+        youtube_patterns = [
+            r'img\.youtube\.com/vi/([^/]+)/',  # Standard YouTube thumbnail URL
+            r'i\.ytimg\.com/vi/([^/]+)/'       # Alternative YouTube thumbnail URL
+        ]
+        
+        for pattern in youtube_patterns:
+            match = re.search(pattern, img_url)
+            if match:
+                video_id = match.group(1)
+                print(f"Detected YouTube video (ID: {video_id}) from thumbnail: {img_url}")
+                return {
+                    'type': 'video',
+                    'platform': 'youtube',
+                    'video_id': video_id,
+                    'video_url': f"https://www.youtube.com/watch?v={video_id}",
+                    'thumbnail_url': img_url,
+                    'from_thumbnail': True
+                }
+        
+        # It's a regular image
+        # Skip tiny thumbnails or icons
+        if 'icon' in img_url.lower() or 'thumb' in img_url.lower():
+            # Try to find a larger version
+            data_full = element.get('data-full') or element.parent.get('href')
+            if data_full:
+                img_url = absolute_url(data_full, page_url)
+        
+        return {'type': 'image', 'url': img_url}
+    
+    # Process video element
+    video_url = None
+    video_id = None
+    video_platform = None
+    
+    # Check if it's an iframe
+    if element.name == 'iframe':
+        src = element.get('src', '')
+        if 'youtube' in src:
+            # Extract YouTube video ID
+            youtube_id_match = re.search(r'(?:embed|v)/([^/?]+)', src)
+            if youtube_id_match:
+                video_id = youtube_id_match.group(1)
+                video_platform = "youtube"
+                video_url = f"https://www.youtube.com/watch?v={video_id}"
+        elif 'vimeo' in src:
+            # Extract Vimeo video ID
+            vimeo_id_match = re.search(r'video/(\d+)', src)
+            if vimeo_id_match:
+                video_id = vimeo_id_match.group(1)
+                video_platform = "vimeo"
+                video_url = f"https://vimeo.com/{video_id}"
+    
+    # Check if it's a link
+    elif element.name == 'a':
+        href = element.get('href', '')
+        if 'youtube' in href or 'youtu.be' in href:
+            # Extract YouTube video ID
+            if 'youtu.be' in href:
+                youtube_id_match = re.search(r'youtu\.be/([^/?]+)', href)
+            else:
+                youtube_id_match = re.search(r'(?:v=|v/|embed/|youtu\.be/)([^/?&]+)', href)
+            
+            if youtube_id_match:
+                video_id = youtube_id_match.group(1)
+                video_platform = "youtube"
+                video_url = f"https://www.youtube.com/watch?v={video_id}"
+        elif 'vimeo' in href:
+            # Extract Vimeo video ID
+            vimeo_id_match = re.search(r'vimeo\.com/(\d+)', href)
+            if vimeo_id_match:
+                video_id = vimeo_id_match.group(1)
+                video_platform = "vimeo"
+                video_url = f"https://vimeo.com/{video_id}"
+    
+    if not (video_id and video_platform):
+        return None
+    
+    # Construct thumbnail URL
+    thumbnail_url = None
+    if video_platform == "youtube":
+        thumbnail_url = f"https://img.youtube.com/vi/{video_id}/hqdefault.jpg"
+    elif video_platform == "vimeo":
+        # For Vimeo, getting thumbnails directly requires an API call
+        # For simplicity, we'll just store the video URL for now
+        thumbnail_url = f"https://vimeo.com/api/v2/video/{video_id}/pictures"
+    
+    return {
+        'type': 'video',
+        'platform': video_platform,
+        'video_id': video_id,
+        'video_url': video_url,
+        'thumbnail_url': thumbnail_url,
+        'from_thumbnail': False
+    }
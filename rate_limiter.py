@@ -0,0 +1,247 @@
+import threading
+import time
+from contextlib import contextmanager
+from urllib.parse import urlparse
+
+import requests
+
+# Pacing profiles per host. "match" is compared against the end of the hostname
+# (or any part of it for the S3 bucket), "rate" is requests per second.
+HOST_PROFILES = [
+    {'name': 'energysage', 'match': 'energysage.com',
+     'rate': 0.5, 'min_rate': 0.1, 'max_rate': 2.0, 'burst': 2, 'max_concurrency': 2, 'target_latency': 4.0},
+    {'name': 'es-media-prod', 'match': 'es-media-prod',
+     'rate': 4.0, 'min_rate': 0.5, 'max_rate': 20.0, 'burst': 8, 'max_concurrency': 8, 'target_latency': 1.5},
+    {'name': 'cloudinary', 'match': 'cloudinary.com',
+     'rate': 4.0, 'min_rate': 0.5, 'max_rate': 20.0, 'burst': 8, 'max_concurrency': 8, 'target_latency': 1.5},
+    {'name': 'youtube-thumbnails', 'match': ('img.youtube.com', 'ytimg.com'),
+     'rate': 4.0, 'min_rate': 0.5, 'max_rate': 10.0, 'burst': 4, 'max_concurrency': 4, 'target_latency': 1.5},
+]
+
+DEFAULT_PROFILE = {'name': 'default', 'rate': 1.0, 'min_rate': 0.1, 'max_rate': 5.0, 'burst': 2,
+                   'max_concurrency': 2, 'target_latency': 3.0}
+
+# AIMD tuning: add this many requests/second after each healthy response,
+# multiply by the factor after a throttling signal
+ADDITIVE_INCREASE = 0.05
+MULTIPLICATIVE_DECREASE = 0.5
+
+# Page titles that mean we were throttled or blocked rather than served the page
+THROTTLED_TITLE_MARKERS = ['429', 'too many requests', 'access denied', 'rate limit', 'just a moment']
+
+
+class HostLimiter:
+    """
+    Token bucket plus AIMD concurrency window for one host.
+
+    Each request takes a token (refilled at `rate` per second) and a slot in
+    the concurrency window. Healthy, fast responses raise the rate and the
+    window a little; 429/5xx responses, errors or slow responses halve them,
+    and a Retry-After header pauses the host entirely.
+    """
+
+    def __init__(self, name, rate, min_rate, max_rate, burst, max_concurrency, target_latency):
+        self.name = name
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.target_latency = target_latency
+
+        self.tokens = float(burst)
+        self.concurrency_limit = 1.0
+        self.in_flight = 0
+        self.blocked_until = 0.0
+        self._last_refill = time.monotonic()
+        self._cond = threading.Condition()
+
+        self.requests = 0
+        self.throttled = 0
+        self.total_latency = 0.0
+        self.total_wait = 0.0
+
+    def _refill(self, now):
+        self.tokens = min(self.burst, self.tokens + (now - self._last_refill) * self.rate)
+        self._last_refill = now
+
+    def acquire(self):
+        """Block until this host may receive another request"""
+        start = time.monotonic()
+        with self._cond:
+            while True:
+                now = time.monotonic()
+                self._refill(now)
+                if now < self.blocked_until:
+                    self._cond.wait(self.blocked_until - now)
+                    continue
+                if self.in_flight >= int(self.concurrency_limit):
+                    self._cond.wait()
+                    continue
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    self.in_flight += 1
+                    self.total_wait += now - start
+                    return
+                self._cond.wait((1 - self.tokens) / self.rate)
+
+    def release(self, latency, status_code=None, error=False, retry_after=None):
+        """
+        Report the outcome of a request and adapt the pace.
+
+        Args:
+            latency: Seconds the request took
+            status_code: HTTP status, if known
+            error: True if the request raised (timeout, connection error, ...)
+            retry_after: Seconds the server asked us to wait, if any
+        """
+        with self._cond:
+            self.in_flight -= 1
+            self.requests += 1
+            self.total_latency += latency
+
+            throttled = error or status_code == 429 or (status_code is not None and status_code >= 500)
+            if throttled or latency > 2 * self.target_latency:
+                self.throttled += 1 if throttled else 0
+                self.rate = max(self.min_rate, self.rate * MULTIPLICATIVE_DECREASE)
+                self.concurrency_limit = max(1.0, self.concurrency_limit * MULTIPLICATIVE_DECREASE)
+                if retry_after:
+                    self.blocked_until = max(self.blocked_until, time.monotonic() + retry_after)
+            elif latency <= self.target_latency:
+                self.rate = min(self.max_rate, self.rate + ADDITIVE_INCREASE)
+                self.concurrency_limit = min(self.max_concurrency,
+                                             self.concurrency_limit + 1.0 / self.concurrency_limit)
+            self._cond.notify_all()
+
+    def summary(self):
+        with self._cond:
+            average = self.total_latency / self.requests if self.requests else 0.0
+            return (f"{self.name}: {self.requests} requests, {self.throttled} throttled, "
+                    f"avg latency {average:.2f}s, waited {self.total_wait:.1f}s, "
+                    f"now {self.rate:.2f} req/s x {int(self.concurrency_limit)} concurrent")
+
+
+class RequestSlot:
+    """Handle for one in-flight request; call record() with the response status"""
+
+    def __init__(self):
+        self.status_code = None
+        self.retry_after = None
+
+    def record(self, status_code, retry_after=None):
+        self.status_code = status_code
+        self.retry_after = parse_retry_after(retry_after)
+
+
+def parse_retry_after(value):
+    """Convert a Retry-After header value to seconds (None if absent)"""
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except (TypeError, ValueError):
+        # HTTP-date form; back off for a conservative fixed period
+        return 30.0
+
+
+class RateLimiter:
+    """Registry of per-host limiters, shared by every scraper in the process"""
+
+    def __init__(self, profiles=None, default_profile=None):
+        self.profiles = profiles if profiles is not None else HOST_PROFILES
+        self.default_profile = default_profile or DEFAULT_PROFILE
+        self._limiters = {}
+        self._lock = threading.Lock()
+
+    def _profile_for(self, hostname):
+        for profile in self.profiles:
+            matches = profile['match'] if isinstance(profile['match'], tuple) else (profile['match'],)
+            for match in matches:
+                if hostname.endswith(match) or (match == 'es-media-prod' and match in hostname):
+                    return profile
+        return self.default_profile
+
+    def limiter_for(self, url):
+        hostname = (urlparse(url).hostname or '').lower()
+        profile = self._profile_for(hostname)
+        # Hosts sharing a profile share one budget (e.g. www. and media. subdomains)
+        key = profile['name'] if profile is not self.default_profile else hostname
+        with self._lock:
+            limiter = self._limiters.get(key)
+            if limiter is None:
+                settings = {k: v for k, v in profile.items() if k not in ('name', 'match')}
+                limiter = HostLimiter(key, **settings)
+                self._limiters[key] = limiter
+            return limiter
+
+    @contextmanager
+    def slot(self, url):
+        """
+        Wait for permission to request `url`, then report the outcome on exit.
+
+        Usage:
+            with limiter.slot(url) as slot:
+                response = requests.get(url)
+                slot.record(response.status_code, response.headers.get('Retry-After'))
+        """
+        limiter = self.limiter_for(url)
+        limiter.acquire()
+        slot = RequestSlot()
+        start = time.monotonic()
+        try:
+            yield slot
+        except Exception:
+            limiter.release(time.monotonic() - start, error=True)
+            raise
+        limiter.release(time.monotonic() - start, slot.status_code, retry_after=slot.retry_after)
+
+    def summaries(self):
+        with self._lock:
+            limiters = list(self._limiters.values())
+        return [limiter.summary() for limiter in limiters]
+
+
+# Process-wide limiter used by the scrapers
+DEFAULT_LIMITER = RateLimiter()
+
+
+def limited_get(url, limiter=None, **kwargs):
+    """
+    requests.get paced by the per-host limiter.
+
+    Args:
+        url: URL to fetch
+        limiter: RateLimiter to use (defaults to the shared one)
+        **kwargs: Passed through to requests.get
+
+    Returns:
+        requests.Response
+    """
+    limiter = limiter or DEFAULT_LIMITER
+    with limiter.slot(url) as slot:
+        response = requests.get(url, **kwargs)
+        slot.record(response.status_code, response.headers.get('Retry-After'))
+    return response
+
+
+def is_throttled_page(driver):
+    """Check whether the browser landed on a rate-limit or block page instead of content"""
+    title = (driver.title or '').lower()
+    return any(marker in title for marker in THROTTLED_TITLE_MARKERS)
+
+
+def limited_navigate(driver, url, limiter=None):
+    """
+    driver.get paced by the per-host limiter.
+
+    Selenium does not expose status codes, so a block page title counts as a 429.
+
+    Args:
+        driver: Selenium WebDriver instance
+        url: URL to navigate to
+        limiter: RateLimiter to use (defaults to the shared one)
+    """
+    limiter = limiter or DEFAULT_LIMITER
+    with limiter.slot(url) as slot:
+        driver.get(url)
+        slot.record(429 if is_throttled_page(driver) else 200)
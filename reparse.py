@@ -0,0 +1,249 @@
+import collections
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from bs4 import BeautifulSoup
+
+from page_archive import DEFAULT_ARCHIVE_DIR, PageArchive
+from profile_parser import (
+    find_gallery_elements, gallery_page_url, parse_gallery_element, parse_installer_profile, profile_company_name
+)
+from review_parser import (
+    find_review_container, find_review_items, pagination_api_urls, parse_aggregate_rating, parse_review_item,
+    parse_review_total
+)
+from review_gaps import parse_review_page
+from review_sync import review_fingerprint
+from selector_registry import DEFAULT_SELECTORS
+
+# Installers submitted ahead of the writer per worker process; bounds memory however long the listing is
+DEFAULT_WINDOW_PER_WORKER = 4
+
+# One archive connection per worker process, opened on first use
+_archives = {}
+
+
+def _archive(archive_path):
+    if archive_path not in _archives:
+        _archives[archive_path] = PageArchive(archive_path)
+    return _archives[archive_path]
+
+
+def load_media_metadata(company_folder):
+    """
+    Media an earlier crawl downloaded for an installer, by source URL.
+
+    Args:
+        company_folder: The installer's images/<id>_<name> folder
+
+    Returns:
+        Dictionary of image URL or video URL to its media_metadata.json entry
+    """
+    metadata_file = os.path.join(company_folder, "media_metadata.json")
+    if not os.path.exists(metadata_file):
+        return {}
+    with open(metadata_file, 'r', encoding='utf-8') as f:
+        entries = json.load(f)
+    return {entry.get('video_url') if entry.get('type') == 'video' else entry.get('url'): entry
+            for entry in entries}
+
+
+def reparse_gallery(archive, company_id, company_name, profile_soup, profile_url):
+    """
+    Gallery media of an installer from its archived gallery page.
+
+    Nothing is downloaded: items an earlier crawl saved keep their
+    media_metadata.json entry (id, local files, derivatives); new items are
+    listed with their URLs and no local file.
+
+    Returns:
+        List of media dictionaries in the format of scrape_installer_gallery
+    """
+    gallery_url = gallery_page_url(profile_soup, profile_url)
+    captured = archive.latest(gallery_url, 'gallery') if gallery_url else None
+    if captured is None:
+        return []
+    row, gallery_source = captured
+
+    # Same folder scrape_installer_gallery saves to
+    known_media = load_media_metadata(f"images/{company_id}_{company_name.replace(' ', '_')}")
+    media = []
+    seen_urls = set()
+    for index, media_item in enumerate(find_gallery_elements(BeautifulSoup(gallery_source, 'html.parser'))):
+        parsed = parse_gallery_element(media_item["element"], media_item["type"], gallery_url)
+        if parsed is None:
+            continue
+        source_url = parsed['url'] if parsed['type'] == 'image' else parsed['video_url']
+        if source_url in seen_urls:
+            continue
+        seen_urls.add(source_url)
+
+        media_info = known_media.get(source_url)
+        if media_info is None:
+            media_id = f"{company_id}_{int(row['fetched_at'])}_{index+1}"
+            if parsed['type'] == 'image':
+                media_info = {'id': media_id, 'type': 'image', 'url': source_url, 'path': None, 'filename': None}
+            else:
+                media_info = {
+                    'id': media_id,
+                    'type': 'video',
+                    'platform': parsed['platform'],
+                    'video_id': parsed['video_id'],
+                    'video_url': parsed['video_url'],
+                    'thumbnail_url': parsed['thumbnail_url'],
+                    'thumbnail_path': None,
+                    'filename': None
+                }
+        media.append(media_info)
+    return media
+
+
+def reparse_reviews(archive, company_id, profile_url, profile_soup):
+    """
+    Reviews of an installer from its archived review pages.
+
+    The newest capture of each review page is read in page order, followed
+    by the pagination API pages the gap-fill stage (review_gaps.py) fetched;
+    reviews are deduplicated the way scrape_company_reviews does it. Review
+    ids use the capture time, so rebuilding twice gives the same ids.
+
+    Returns:
+        Dictionary in the format of scrape_company_reviews
+    """
+    aggregate_rating = parse_aggregate_rating(profile_soup)
+    total_reviews = parse_review_total(profile_soup)
+    fallback_rating = aggregate_rating if aggregate_rating > 0 else 5.0
+
+    reviews = []
+    seen_reviews = set()
+    page_review_counts = {}
+    page_api_urls = {}
+    for row, page_source in archive.iter_pages(kind='reviews', url=profile_url):
+        soup = BeautifulSoup(page_source, 'html.parser')
+        page_api_urls.update(pagination_api_urls(soup))
+        reviews_on_page = 0
+        for idx, item in enumerate(find_review_items(find_review_container(soup))):
+            review_id = f"{company_id}_review_{int(row['fetched_at'])}_p{row['page']}_{idx+1}"
+            review = parse_review_item(item, review_id, fallback_rating)
+            if review is None:
+                continue
+            reviews_on_page += 1
+            fingerprint = review_fingerprint(review['reviewer_name'], review['date'], review['text'])
+            if fingerprint not in seen_reviews:
+                seen_reviews.add(fingerprint)
+                reviews.append(review)
+        page_review_counts[row['page']] = reviews_on_page
+
+    for row, body in archive.iter_pages(kind='reviews_api', url=profile_url):
+        page_reviews = parse_review_page(body, company_id, row['page'], fallback_rating, row['fetched_at'])
+        for review in page_reviews:
+            fingerprint = review_fingerprint(review['reviewer_name'], review['date'], review['text'])
+            if fingerprint not in seen_reviews:
+                seen_reviews.add(fingerprint)
+                reviews.append(review)
+        page_review_counts[row['page']] = max(page_review_counts.get(row['page'], 0), len(page_reviews))
+
+    if aggregate_rating == 0 and reviews:
+        ratings = [review['rating'] for review in reviews if review['rating'] > 0]
+        if ratings:
+            aggregate_rating = sum(ratings) / len(ratings)
+
+    return {
+        "aggregate_rating": aggregate_rating,
+        "reviews": reviews,
+        "expected_reviews": total_reviews,
+        "page_review_counts": page_review_counts,
+        "page_api_urls": page_api_urls
+    }
+
+
+def reparse_installer(archive_path, company_id, profile_url):
+    """
+    Run the current extraction code over an installer's archived pages.
+
+    Args:
+        archive_path: Page archive directory
+        company_id: Stable record id of the installer
+        profile_url: Profile URL the pages were archived under
+
+    Returns:
+        Dictionary in the format of scrape_installer_details, or None if the
+        profile page is not in the archive
+    """
+    archive = _archive(archive_path)
+    captured = archive.latest(profile_url, 'profile')
+    if captured is None:
+        return None
+    _, page_source = captured
+    soup = BeautifulSoup(page_source, 'html.parser')
+    company_name = profile_company_name(soup)
+
+    details = parse_installer_profile(soup, company_name)
+    details["gallery_images"] = reparse_gallery(archive, company_id, company_name, soup, profile_url)
+    details["reviews_data"] = reparse_reviews(archive, company_id, profile_url, soup)
+    return details
+
+
+def _init_worker(selector_stats_path):
+    # Forked workers inherit the parent's selector counts: keep the all-run totals, report only their own counts
+    DEFAULT_SELECTORS.take_run_counts()
+    if not DEFAULT_SELECTORS.totals:
+        DEFAULT_SELECTORS.load(selector_stats_path)
+
+
+def _timed_reparse(archive_path, company_id, profile_url):
+    start_time = time.time()
+    details = reparse_installer(archive_path, company_id, profile_url)
+    return details, time.time() - start_time, DEFAULT_SELECTORS.take_run_counts()
+
+
+def iter_reparsed_details(listing, archive_path=DEFAULT_ARCHIVE_DIR, workers=None):
+    """
+    Offline replacement for iter_installer_details: parse archived pages instead of crawling.
+
+    Installers are parsed in a process pool and yielded in listing order.
+    Only a bounded window is in flight, so memory stays flat however many
+    installers the listing has. Installers without an archived profile, or
+    whose pages fail to parse, are reported and skipped. Selector counts from
+    the workers are added to DEFAULT_SELECTORS.
+
+    Args:
+        listing: Output of iter_listing
+        archive_path: Page archive directory
+        workers: Worker processes (defaults to the number of CPUs)
+
+    Yields:
+        (idx, company_id, installer, details, elapsed_seconds) tuples
+    """
+    workers = workers or os.cpu_count() or 1
+    window = workers * DEFAULT_WINDOW_PER_WORKER
+    pending = collections.deque()
+
+    def drain_one():
+        idx, company_id, installer, future = pending.popleft()
+        try:
+            details, elapsed, selector_counts = future.result()
+        except Exception as e:
+            print(f"Error reparsing installer {installer['company_name']}: {e}")
+            return None
+        DEFAULT_SELECTORS.merge_run_counts(selector_counts)
+        if details is None:
+            print(f"No archived profile for {installer['company_name']} ({installer['profile_url']}), skipping")
+            return None
+        return idx, company_id, installer, details, elapsed
+
+    with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                             initargs=(DEFAULT_SELECTORS.path,)) as executor:
+        for idx, (company_id, installer) in enumerate(listing, 1):
+            future = executor.submit(_timed_reparse, archive_path, company_id, installer['profile_url'])
+            pending.append((idx, company_id, installer, future))
+            while len(pending) >= window:
+                result = drain_one()
+                if result:
+                    yield result
+        while pending:
+            result = drain_one()
+            if result:
+                yield result
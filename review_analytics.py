@@ -0,0 +1,330 @@
+import argparse
+import csv
+import os
+import time
+from datetime import date
+
+import numpy as np
+
+from columnar_export import parse_review_date
+from search_index import review_key
+
+try:
+    import pyarrow.dataset as ds
+except ImportError:  # pyarrow is only needed to read the Parquet/Arrow exports
+    ds = None
+
+DEFAULT_REPORT = 'review_analytics.csv'
+
+# Reviews within this many days of the reference date count as recent
+DEFAULT_RECENT_DAYS = 365
+
+# Months of review history kept in the per-installer monthly series
+DEFAULT_HISTORY_MONTHS = 24
+
+# Percentiles reported across all installers
+SUMMARY_PERCENTILES = (10, 25, 50, 75, 90)
+
+REPORT_FIELDNAMES = [
+    'company_id', 'company_name', 'review_count',
+    'stars_1', 'stars_2', 'stars_3', 'stars_4', 'stars_5',
+    'lifetime_rating', 'recent_rating', 'recent_reviews', 'monthly_velocity',
+    'first_review', 'last_review', 'rating_percentile', 'velocity_percentile'
+]
+
+
+def normalize_review_dates(raw_dates):
+    """
+    Turn scraped review dates into a datetime64[D] array.
+
+    Each distinct date text is parsed once, so this stays fast when millions
+    of reviews share a few thousand dates.
+
+    Args:
+        raw_dates: Sequence of date strings as scraped ("Mar 5, 2024", "Unknown", ...)
+
+    Returns:
+        datetime64[D] array with NaT where the text is not a date
+    """
+    if len(raw_dates) == 0:
+        return np.array([], dtype='datetime64[D]')
+    # Factorize with a dict; sorting millions of strings (np.unique) is far slower
+    codes = {}
+    inverse = np.fromiter((codes.setdefault(text, len(codes)) for text in raw_dates),
+                          dtype=np.int64, count=len(raw_dates))
+    parsed = [parse_review_date(text) for text in codes]
+    iso = np.array([value.isoformat() if value else 'NaT' for value in parsed], dtype='datetime64[D]')
+    return iso[inverse]
+
+
+def load_review_rows(rows):
+    """
+    Load review catalog rows into columnar arrays, once per review.
+
+    The catalog gains a copy of every review on each crawl, so rows are
+    deduplicated with search_index.review_key first.
+
+    Args:
+        rows: Iterable of review catalog rows (CSV catalog or sqlite_store.iter_review_rows)
+
+    Returns:
+        Dictionary with company_id (int64), rating (float64, NaN if missing),
+        review_date (datetime64[D]) and names (company id to name)
+    """
+    seen = set()
+    company_ids = []
+    ratings = []
+    raw_dates = []
+    names = {}
+    for row in rows:
+        key = review_key(row)
+        if key in seen:
+            continue
+        seen.add(key)
+        try:
+            company_id = int(row['company_id'])
+        except (TypeError, ValueError):
+            continue
+        try:
+            rating = float(row.get('rating') or 'nan')
+        except ValueError:
+            rating = float('nan')
+        company_ids.append(company_id)
+        ratings.append(rating)
+        raw_dates.append(row.get('review_date') or '')
+        names.setdefault(company_id, row.get('company_name') or '')
+
+    return {
+        'company_id': np.array(company_ids, dtype=np.int64),
+        'rating': np.array(ratings, dtype=np.float64),
+        'review_date': normalize_review_dates(raw_dates),
+        'names': names,
+    }
+
+
+def load_review_export(path):
+    """
+    Load a reviews.parquet / reviews.arrow file written by columnar_export.py.
+
+    The export already holds parsed dates, so only the columns the analytics
+    need are read, straight into NumPy. Duplicate reviews are dropped by
+    review_key, as in load_review_rows.
+    """
+    if ds is None:
+        raise ImportError("Reading columnar exports requires pyarrow. Install it with: pip install pyarrow")
+    file_format = 'arrow' if path.endswith('.arrow') else 'parquet'
+    table = ds.dataset(path, format=file_format).to_table(
+        columns=['company_id', 'company_name', 'reviewer_name', 'review_date', 'review_date_raw', 'rating',
+                 'review_text']
+    )
+
+    # Dedupe on the same key as the CSV loader
+    reviewer_names = table.column('reviewer_name').to_pylist()
+    raw_dates = table.column('review_date_raw').to_pylist()
+    texts = table.column('review_text').to_pylist()
+    company_ids = table.column('company_id').to_numpy(zero_copy_only=False)
+    keep = np.zeros(len(table), dtype=bool)
+    seen = set()
+    for position in range(len(table)):
+        key = review_key({'company_id': company_ids[position], 'reviewer_name': reviewer_names[position],
+                          'review_date': raw_dates[position], 'review_text': texts[position]})
+        if key not in seen:
+            seen.add(key)
+            keep[position] = True
+
+    names = {}
+    for company_id, name in zip(company_ids, table.column('company_name').to_pylist()):
+        names.setdefault(int(company_id), name or '')
+
+    return {
+        'company_id': company_ids[keep].astype(np.int64),
+        'rating': table.column('rating').to_numpy(zero_copy_only=False).astype(np.float64)[keep],
+        'review_date': table.column('review_date').to_numpy(zero_copy_only=False).astype('datetime64[D]')[keep],
+        'names': names,
+    }
+
+
+def _percentile_rank(values):
+    """Percent of installers with a lower value, NaN stays NaN"""
+    ranks = np.full(len(values), np.nan)
+    valid = ~np.isnan(values)
+    if valid.any():
+        ordered = np.sort(values[valid])
+        ranks[valid] = 100.0 * np.searchsorted(ordered, values[valid], side='left') / len(ordered)
+    return ranks
+
+
+def _grouped_mean(group, values, mask, groups):
+    sums = np.bincount(group[mask], weights=values[mask], minlength=groups)
+    counts = np.bincount(group[mask], minlength=groups)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        return np.where(counts > 0, sums / np.maximum(counts, 1), np.nan), counts
+
+
+def compute_review_analytics(columns, as_of=None, recent_days=DEFAULT_RECENT_DAYS,
+                             history_months=DEFAULT_HISTORY_MONTHS):
+    """
+    Per-installer review statistics, computed for all installers at once.
+
+    Args:
+        columns: Output of load_review_rows or load_review_export
+        as_of: Reference date (defaults to today)
+        recent_days: Window for the recent rating and review velocity
+        history_months: Length of the monthly review count series
+
+    Returns:
+        Dictionary of arrays, one entry per installer (sorted by company_id):
+        company_id, review_count, histogram (N x 5, 1 to 5 stars), lifetime_rating,
+        recent_rating, recent_reviews, monthly_velocity (reviews per month in the
+        recent window), first_review, last_review, monthly_counts (N x history_months,
+        oldest first), rating_percentile and velocity_percentile; plus months (labels
+        of the monthly series) and summary (percentiles across installers)
+    """
+    as_of = np.datetime64(as_of or date.today(), 'D')
+    company_ids, group = np.unique(columns['company_id'], return_inverse=True)
+    groups = len(company_ids)
+    ratings = columns['rating']
+    dates = columns['review_date']
+    rated = ~np.isnan(ratings)
+    dated = ~np.isnat(dates)
+
+    review_count = np.bincount(group, minlength=groups)
+
+    # Rating histogram: one bincount over (installer, star) cells
+    stars = np.clip(np.rint(np.where(rated, ratings, 1)), 1, 5).astype(np.int64) - 1
+    histogram = np.bincount(group[rated] * 5 + stars[rated], minlength=groups * 5).reshape(groups, 5)
+
+    lifetime_rating, _ = _grouped_mean(group, ratings, rated, groups)
+    recent = dated & (dates > as_of - np.timedelta64(recent_days, 'D')) & (dates <= as_of)
+    recent_rating, _ = _grouped_mean(group, ratings, recent & rated, groups)
+    recent_reviews = np.bincount(group[recent], minlength=groups)
+    monthly_velocity = recent_reviews / (recent_days / 30.4375)
+
+    # First and last review date: reduce over the installer-sorted order
+    first_review = np.full(groups, np.datetime64('NaT'), dtype='datetime64[D]')
+    last_review = np.full(groups, np.datetime64('NaT'), dtype='datetime64[D]')
+    if dated.any():
+        day_numbers = dates[dated].astype(np.int64)
+        dated_groups = group[dated]
+        earliest = np.full(groups, np.iinfo(np.int64).max)
+        latest = np.full(groups, np.iinfo(np.int64).min)
+        np.minimum.at(earliest, dated_groups, day_numbers)
+        np.maximum.at(latest, dated_groups, day_numbers)
+        has_dates = np.bincount(dated_groups, minlength=groups) > 0
+        first_review[has_dates] = earliest[has_dates].astype('datetime64[D]')
+        last_review[has_dates] = latest[has_dates].astype('datetime64[D]')
+
+    # Monthly review counts for the last history_months months
+    last_month = as_of.astype('datetime64[M]')
+    first_month = last_month - np.timedelta64(history_months - 1, 'M')
+    month_index = (dates.astype('datetime64[M]') - first_month).astype(np.int64)
+    in_history = dated & (month_index >= 0) & (month_index < history_months)
+    monthly_counts = np.bincount(
+        group[in_history] * history_months + month_index[in_history], minlength=groups * history_months
+    ).reshape(groups, history_months)
+    months = np.arange(first_month, last_month + np.timedelta64(1, 'M'))
+
+    summary = {}
+    for name, values in (('review_count', review_count.astype(np.float64)),
+                         ('lifetime_rating', lifetime_rating),
+                         ('recent_rating', recent_rating),
+                         ('monthly_velocity', monthly_velocity)):
+        valid = values[~np.isnan(values)]
+        summary[name] = dict(zip(SUMMARY_PERCENTILES, np.percentile(valid, SUMMARY_PERCENTILES))) if len(valid) else {}
+
+    return {
+        'company_id': company_ids,
+        'review_count': review_count,
+        'histogram': histogram,
+        'lifetime_rating': lifetime_rating,
+        'recent_rating': recent_rating,
+        'recent_reviews': recent_reviews,
+        'monthly_velocity': monthly_velocity,
+        'first_review': first_review,
+        'last_review': last_review,
+        'monthly_counts': monthly_counts,
+        'months': months,
+        'rating_percentile': _percentile_rank(lifetime_rating),
+        'velocity_percentile': _percentile_rank(monthly_velocity),
+        'summary': summary,
+    }
+
+
+def _format_number(value, digits=2):
+    return '' if np.isnan(value) else f"{value:.{digits}f}"
+
+
+def _format_date(value):
+    return '' if np.isnat(value) else str(value)
+
+
+def write_report(analytics, names, output_path=DEFAULT_REPORT):
+    """
+    Write one row per installer with the REPORT_FIELDNAMES columns.
+
+    Returns:
+        Number of installers written
+    """
+    with open(output_path, 'w', newline='', encoding='utf-8') as f:
+        writer = csv.writer(f, quoting=csv.QUOTE_ALL)
+        writer.writerow(REPORT_FIELDNAMES)
+        for i, company_id in enumerate(analytics['company_id']):
+            writer.writerow([
+                int(company_id), names.get(int(company_id), ''), int(analytics['review_count'][i]),
+                *(int(count) for count in analytics['histogram'][i]),
+                _format_number(analytics['lifetime_rating'][i]), _format_number(analytics['recent_rating'][i]),
+                int(analytics['recent_reviews'][i]), _format_number(analytics['monthly_velocity'][i]),
+                _format_date(analytics['first_review'][i]), _format_date(analytics['last_review'][i]),
+                _format_number(analytics['rating_percentile'][i], 1),
+                _format_number(analytics['velocity_percentile'][i], 1)
+            ])
+    return len(analytics['company_id'])
+
+
+def _iter_csv_rows(csv_path):
+    with open(csv_path, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file):
+            yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Per-installer review statistics from the review catalog")
+    parser.add_argument('--reviews', default='all_reviews_catalog.csv',
+                        help="Reviews catalog CSV, or a reviews.parquet/.arrow export from columnar_export.py")
+    parser.add_argument('--sqlite', metavar='DB_PATH', help="Read reviews from a crawl database instead")
+    parser.add_argument('--output', default=DEFAULT_REPORT, help="Per-installer report CSV")
+    parser.add_argument('--as-of', type=date.fromisoformat, help="Reference date, YYYY-MM-DD (default: today)")
+    parser.add_argument('--recent-days', type=int, default=DEFAULT_RECENT_DAYS)
+    args = parser.parse_args()
+
+    start = time.perf_counter()
+    if args.sqlite:
+        import sqlite_store
+        conn = sqlite_store.connect_readonly(args.sqlite)
+        try:
+            columns = load_review_rows(sqlite_store.iter_review_rows(conn))
+        finally:
+            conn.close()
+    elif args.reviews.endswith(('.parquet', '.arrow')):
+        columns = load_review_export(args.reviews)
+    else:
+        columns = load_review_rows(_iter_csv_rows(args.reviews))
+    loaded = time.perf_counter()
+
+    analytics = compute_review_analytics(columns, args.as_of, args.recent_days)
+    computed = time.perf_counter()
+    count = write_report(analytics, columns['names'], args.output)
+
+    print(f"{len(columns['company_id'])} unique reviews, {count} installers "
+          f"(load {loaded - start:.2f}s, compute {computed - loaded:.2f}s)")
+    undated = int(np.isnat(columns['review_date']).sum())
+    if undated:
+        print(f"{undated} reviews have no recognizable date and are left out of the time-based statistics")
+    for name, percentiles in analytics['summary'].items():
+        if percentiles:
+            print(f"  {name}: " + ', '.join(f"p{p} {value:.2f}" for p, value in percentiles.items()))
+    print(f"Report written to {os.path.abspath(args.output)}")
+
+
+if __name__ == "__main__":
+    main()
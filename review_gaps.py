@@ -0,0 +1,372 @@
+import argparse
+import json
+import math
+import re
+import sqlite3
+import time
+import urllib.parse
+
+from bs4 import BeautifulSoup
+
+from fetch_policy import FetchError, fetch
+from page_archive import DEFAULT_ARCHIVE_DIR, archive_page, close_archive, enable_archive
+from output_sinks import REVIEW_FIELDNAMES, CatalogFile, ReviewRecord, serialize_row
+from review_parser import clean_text, find_review_container, find_review_items, parse_review_item
+from review_sync import DEFAULT_REVIEW_SYNC, ReviewSyncState, review_fingerprint
+from sqlite_store import SQLiteStore
+
+DEFAULT_GAP_LOG = 'review_gaps.db'
+
+# JSON keys a pagination API response may carry the rendered reviews under
+HTML_KEYS = ('html', 'content', 'reviews_html', 'data')
+
+# JSON keys a pagination API response may carry review records under
+RECORD_KEYS = ('reviews', 'results', 'data', 'items')
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_gaps (
+    company_id    INTEGER PRIMARY KEY,
+    company_name  TEXT,
+    profile_url   TEXT NOT NULL,
+    expected      INTEGER NOT NULL,
+    captured      INTEGER NOT NULL,
+    page_size     INTEGER NOT NULL,
+    page_counts   TEXT NOT NULL,
+    page_api_urls TEXT NOT NULL,
+    fingerprints  TEXT NOT NULL,
+    fill_runs     INTEGER NOT NULL DEFAULT 0,
+    recorded_at   REAL NOT NULL
+);
+"""
+
+
+def missing_pages(expected, page_size, page_counts):
+    """
+    Review pages that were never read or came back short.
+
+    Args:
+        expected: Review count the installer page states
+        page_size: Reviews per full page
+        page_counts: Dictionary of page number to reviews parsed on that page
+
+    Returns:
+        Sorted list of page numbers to request again
+    """
+    if page_size <= 0:
+        return []
+    pages = []
+    for page in range(1, math.ceil(expected / page_size) + 1):
+        # The last page only holds the remainder
+        wanted = min(page_size, expected - (page - 1) * page_size)
+        if page_counts.get(page, 0) < wanted:
+            pages.append(page)
+    return pages
+
+
+def page_api_url(page_api_urls, page, profile_url):
+    """
+    Pagination API URL for a review page.
+
+    The pagination control only links a window of pages around the current
+    one, so pages without a recorded link get the page parameter of a
+    recorded link substituted.
+
+    Returns:
+        Absolute URL, or None if no link was recorded for this installer
+    """
+    url = page_api_urls.get(page)
+    if not url:
+        for known_url in page_api_urls.values():
+            if re.search(r'([?&]page=)\d+', known_url):
+                url = re.sub(r'([?&]page=)\d+', rf'\g<1>{page}', known_url)
+                break
+    if not url:
+        return None
+    return urllib.parse.urljoin(profile_url, url)
+
+
+def _review_from_record(record, review_id, fallback_rating):
+    text = clean_text(str(record.get('text') or record.get('body') or record.get('content') or ''))
+    if not text:
+        return None
+    title = clean_text(str(record.get('title') or record.get('heading') or ''))
+    if title and title not in text:
+        text = f"{title}: {text}"
+    try:
+        rating = float(record.get('rating') or record.get('stars') or fallback_rating)
+    except (TypeError, ValueError):
+        rating = fallback_rating
+    return {
+        'id': review_id,
+        'text': text,
+        'date': clean_text(str(record.get('date') or record.get('created_at') or '')) or "Unknown",
+        'reviewer_name': clean_text(str(record.get('reviewer_name') or record.get('author') or record.get('name') or ''))
+                         or "Anonymous",
+        'rating': rating
+    }
+
+
+def parse_review_page(body, company_id, page, fallback_rating=5.0, captured_at=None):
+    """
+    Parse one pagination API response into reviews.
+
+    The API either returns the rendered review markup (as the page itself,
+    or inside a JSON object) or a JSON list of review records; both are read.
+
+    Args:
+        body: Response text
+        company_id: Stable record id of the installer, used in the review ids
+        page: Page number, used in the review ids
+        fallback_rating: Rating for reviews that show none
+        captured_at: Fetch time used in the review ids (defaults to now)
+
+    Returns:
+        List of reviews in the scraper's format (id, text, date, reviewer_name, rating)
+    """
+    try:
+        payload = json.loads(body)
+    except ValueError:
+        payload = None
+
+    html = body if payload is None else None
+    records = payload if isinstance(payload, list) else None
+    if isinstance(payload, dict):
+        html = next((payload[key] for key in HTML_KEYS if isinstance(payload.get(key), str)), None)
+        records = next((payload[key] for key in RECORD_KEYS if isinstance(payload.get(key), list)), None)
+
+    id_prefix = f"{company_id}_review_{int(captured_at or time.time())}_p{page}"
+    reviews = []
+    if records is not None:
+        for idx, record in enumerate(records):
+            if isinstance(record, dict):
+                review = _review_from_record(record, f"{id_prefix}_{idx+1}", fallback_rating)
+                if review:
+                    reviews.append(review)
+    elif html:
+        soup = BeautifulSoup(html, 'html.parser')
+        for idx, item in enumerate(find_review_items(find_review_container(soup))):
+            review = parse_review_item(item, f"{id_prefix}_{idx+1}", fallback_rating)
+            if review:
+                reviews.append(review)
+    return reviews
+
+
+class ReviewGapLog:
+    """
+    Installers whose review capture came up short of the stated review count.
+
+    Each gap keeps how many reviews every page read returned, the pagination
+    API URLs seen and the fingerprints already captured, so the gap-fill
+    stage can request just the missing pages instead of re-crawling the
+    installer.
+    """
+
+    def __init__(self, db_path=DEFAULT_GAP_LOG):
+        self.db_path = db_path
+        # Queue workers on the same host share the log
+        self.conn = sqlite3.connect(db_path, timeout=30)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+
+    def record(self, company_id, company_name, profile_url, reviews_data):
+        """
+        Store the gap of a review capture, or clear the installer's gap if it is complete.
+
+        Args:
+            company_id: Stable record id of the installer
+            company_name: Name of the installer
+            profile_url: Profile URL the pagination API URLs are relative to
+            reviews_data: Output of scrape_company_reviews / sync_company_reviews
+
+        Returns:
+            Number of reviews missing
+        """
+        expected = reviews_data.get('expected_reviews') or 0
+        reviews = reviews_data['reviews']
+        if len(reviews) >= expected:
+            self.clear(company_id)
+            return 0
+
+        page_counts = reviews_data.get('page_review_counts') or {}
+        fingerprints = [review_fingerprint(r['reviewer_name'], r['date'], r['text']) for r in reviews]
+        with self.conn:
+            self.conn.execute(
+                """INSERT OR REPLACE INTO review_gaps
+                   (company_id, company_name, profile_url, expected, captured, page_size,
+                    page_counts, page_api_urls, fingerprints, fill_runs, recorded_at)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, 0, ?)""",
+                (company_id, company_name, profile_url, expected, len(reviews), max(page_counts.values(), default=0),
+                 json.dumps(page_counts), json.dumps(reviews_data.get('page_api_urls') or {}),
+                 json.dumps(fingerprints), time.time())
+            )
+        missing = expected - len(reviews)
+        print(f"Review gap recorded: {missing} of {expected} reviews missing (fill with: python review_gaps.py fill)")
+        return missing
+
+    def gaps(self, company_id=None):
+        query = "SELECT * FROM review_gaps"
+        params = ()
+        if company_id is not None:
+            query += " WHERE company_id = ?"
+            params = (company_id,)
+        return self.conn.execute(query + " ORDER BY expected - captured DESC", params).fetchall()
+
+    def update(self, company_id, captured, page_counts, fingerprints):
+        """Store the outcome of a gap-fill run"""
+        with self.conn:
+            self.conn.execute(
+                """UPDATE review_gaps
+                   SET captured = ?, page_counts = ?, fingerprints = ?, fill_runs = fill_runs + 1
+                   WHERE company_id = ?""",
+                (captured, json.dumps(page_counts), json.dumps(sorted(fingerprints)), company_id)
+            )
+
+    def clear(self, company_id):
+        with self.conn:
+            self.conn.execute("DELETE FROM review_gaps WHERE company_id = ?", (company_id,))
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def fill_gap(gap_log, gap, write_review, review_sync=None):
+    """
+    Request an installer's missing review pages through the pagination API.
+
+    Args:
+        gap_log: ReviewGapLog the gap came from; updated or cleared afterwards
+        gap: Row from ReviewGapLog.gaps()
+        write_review: Callable receiving a ReviewRecord for each new review
+        review_sync: Optional ReviewSyncState to add the recovered reviews to
+
+    Returns:
+        Number of new reviews recovered
+    """
+    company_id = gap['company_id']
+    page_counts = {int(page): count for page, count in json.loads(gap['page_counts']).items()}
+    page_api_urls = {int(page): url for page, url in json.loads(gap['page_api_urls']).items()}
+    fingerprints = set(json.loads(gap['fingerprints']))
+    pages = missing_pages(gap['expected'], gap['page_size'], page_counts)
+    print(f"\n{gap['company_name']} ({company_id}): {gap['captured']}/{gap['expected']} reviews, "
+          f"requesting pages {pages}")
+
+    recovered = 0
+    for page in pages:
+        url = page_api_url(page_api_urls, page, gap['profile_url'])
+        if not url:
+            print(f"No pagination API URL recorded for page {page}; re-crawl the installer instead")
+            continue
+        try:
+            response = fetch(url, headers={'X-Requested-With': 'XMLHttpRequest'})
+        except FetchError as e:
+            print(f"Could not fetch review page {page}: {e}")
+            continue
+        if response.status_code != 200:
+            print(f"Review page {page} returned HTTP {response.status_code}")
+            continue
+        # Keyed by the profile and page like the crawled review pages, so --reparse finds it
+        archive_page(gap['profile_url'], response.text, 'reviews_api', page)
+
+        reviews = parse_review_page(response.text, company_id, page)
+        page_counts[page] = max(page_counts.get(page, 0), len(reviews))
+        new_reviews = []
+        for review in reviews:
+            fingerprint = review_fingerprint(review['reviewer_name'], review['date'], review['text'])
+            if fingerprint in fingerprints:
+                continue
+            fingerprints.add(fingerprint)
+            new_reviews.append(review)
+            write_review(ReviewRecord(
+                company_id=company_id,
+                company_name=gap['company_name'],
+                review_id=review['id'],
+                reviewer_name=review['reviewer_name'],
+                review_date=review['date'],
+                rating=review['rating'],
+                review_text=review['text']
+            ))
+        if review_sync and new_reviews:
+            review_sync.backfill(company_id, new_reviews, first_position=page * 1000)
+        recovered += len(new_reviews)
+        print(f"Page {page}: {len(reviews)} reviews, {len(new_reviews)} new")
+
+    captured = gap['captured'] + recovered
+    if captured >= gap['expected']:
+        gap_log.clear(company_id)
+        print(f"Gap closed: all {gap['expected']} reviews captured")
+    else:
+        gap_log.update(company_id, captured, page_counts, fingerprints)
+        print(f"Still missing {gap['expected'] - captured} reviews")
+    return recovered
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show and fill gaps in review captures")
+    parser.add_argument('--db', default=DEFAULT_GAP_LOG, help="Review gap log")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    status_parser = subparsers.add_parser('status', help="List installers with missing reviews")
+    status_parser.add_argument('--company-id', type=int, help="Only this installer")
+
+    fill_parser = subparsers.add_parser('fill', help="Request only the missing review pages")
+    fill_parser.add_argument('--company-id', type=int, help="Only this installer")
+    fill_parser.add_argument('--reviews-catalog', default='all_reviews_catalog.csv',
+                             help="Reviews catalog to append recovered reviews to")
+    fill_parser.add_argument('--sqlite', metavar='DB_PATH',
+                             help="Store recovered reviews in this SQLite database instead of the catalog")
+    fill_parser.add_argument('--review-sync', metavar='DB_PATH',
+                             help=f"Also add recovered reviews to this delta sync state (e.g. {DEFAULT_REVIEW_SYNC})")
+    fill_parser.add_argument('--archive', metavar='DIR', default=DEFAULT_ARCHIVE_DIR,
+                             help="Keep a compressed copy of every fetched review page here (see page_archive.py)")
+    fill_parser.add_argument('--no-archive', action='store_true', help="Do not archive fetched review pages")
+    args = parser.parse_args()
+
+    with ReviewGapLog(args.db) as gap_log:
+        gaps = gap_log.gaps(args.company_id)
+
+        if args.command == 'status':
+            print(f"{len(gaps)} installers with missing reviews")
+            for gap in gaps:
+                pages = missing_pages(gap['expected'], gap['page_size'],
+                                      {int(page): count for page, count in json.loads(gap['page_counts']).items()})
+                print(f"  {gap['company_name']} ({gap['company_id']}): {gap['captured']}/{gap['expected']}, "
+                      f"missing pages {pages}, {gap['fill_runs']} fill runs")
+            return
+
+        if args.sqlite:
+            # Recovered reviews join the installer's stored ones instead of replacing them
+            sink = SQLiteStore(args.sqlite, replace_installers=False)
+            write_review = sink.write_review
+        else:
+            sink = CatalogFile(args.reviews_catalog, REVIEW_FIELDNAMES)
+
+            def write_review(row):
+                sink.write_values(serialize_row(row, REVIEW_FIELDNAMES))
+        review_sync = ReviewSyncState(args.review_sync) if args.review_sync else None
+        if not args.no_archive:
+            enable_archive(args.archive)
+
+        recovered = 0
+        try:
+            for gap in gaps:
+                recovered += fill_gap(gap_log, gap, write_review, review_sync)
+        finally:
+            sink.close()
+            if review_sync:
+                review_sync.close()
+            close_archive()
+        print(f"\nRecovered {recovered} reviews across {len(gaps)} installers")
+
+
+if __name__ == "__main__":
+    main()
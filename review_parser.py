@@ -0,0 +1,304 @@
+import re
+
+from selector_registry import DEFAULT_SELECTORS
+
+
+def clean_text(text):
+    """
+    Clean and normalize text by removing excessive whitespace, newlines, and tabs.
+    
+    Args:
+        text: The text to clean
+        
+    Returns:
+        Cleaned text with normalized whitespace
+    """
+    if not text:
+        return ""
+        
+    # Replace newlines and tabs with spaces
+    text = text.replace('\n', ' ').replace('\t', ' ')
+    
+    # Replace multiple spaces with a single space using regex
+    text = re.sub(r'\s+', ' ', text)
+    
+    # Strip leading/trailing whitespace
+    return text.strip()
+
+
+def parse_aggregate_rating(soup):
+    """
+    Aggregate star rating shown on a profile page.
+
+    Args:
+        soup: BeautifulSoup of the profile page
+
+    Returns:
+        The rating, or 0 if none is shown
+    """
+    try:
+        # Look for clear rating indicators on the main page
+        rating_elements = soup.select('.rating, .supplier-rating, .energysage-rating, [class*="rating"]')
+        for rating_elem in rating_elements:
+            rating_text = rating_elem.get_text(strip=True)
+            # Check for patterns like "5.0", "5.0 out of 5", etc.
+            rating_match = re.search(r'(\d+\.\d+|\d+)\s*(?:/|out of)?', rating_text)
+            if rating_match:
+                try:
+                    rating = float(rating_match.group(1))
+                    print(f"Found aggregate rating on main page: {rating} stars")
+                    return rating
+                except:
+                    pass
+
+    except Exception as e:
+        print(f"Error extracting aggregate rating from main page: {e}")
+    return 0
+
+
+def parse_review_total(soup):
+    """
+    Total number of reviews a profile page says the installer has.
+
+    Args:
+        soup: BeautifulSoup of the profile page
+
+    Returns:
+        The review count, or 0 if none is shown
+    """
+    try:
+        # Find all text elements that might contain review counts
+        for element in soup.find_all(['span', 'div', 'button']):
+            text = element.get_text(strip=True)
+            if 'review' in text.lower():
+                # Look for patterns like "327 reviews", "327 review(s)", etc.
+                count_match = re.search(r'(\d+)\s*review', text, re.IGNORECASE)
+                if count_match:
+                    total_reviews = int(count_match.group(1))
+                    print(f"Found total of {total_reviews} reviews")
+                    return total_reviews
+    except Exception as e:
+        print(f"Error extracting total review count: {e}")
+    return 0
+
+
+def find_review_container(soup):
+    """
+    The part of a reviews page that holds the reviews: the open modal if there is one.
+
+    Args:
+        soup: BeautifulSoup of the page or of a pagination API response
+
+    Returns:
+        The modal element, or the soup itself
+    """
+    # Find the modal container if present
+    modal_containers = soup.select('.modal.show, .modal.fade.in, .modal-dialog, [role="dialog"], [aria-modal="true"]')
+    if modal_containers:
+        print(f"Found {len(modal_containers)} modal containers")
+        # Use the first visible modal container
+        return modal_containers[0]
+    else:
+        print("No modal container found, using full page")
+        return soup
+
+
+def find_review_items(review_container):
+    """
+    Find the elements that each hold one review.
+
+    Args:
+        review_container: Output of find_review_container
+
+    Returns:
+        List of BeautifulSoup elements (empty if none were found)
+    """
+    # Try specific review selectors first
+    review_selectors = [
+        '.review-item', '.review-card', '.review', '.testimonial', 
+        '[class*="review"]', '[id*="review"]'
+    ]
+
+    selector, review_items = DEFAULT_SELECTORS.first_match('review_items', review_selectors, review_container.select)
+    if review_items:
+        print(f"Found {len(review_items)} review items with selector: {selector}")
+    else:
+        review_items = []
+
+    # If no review items found with specific selectors, look for more generic containers
+    if not review_items:
+        # Look for paragraphs inside the modal that might contain reviews
+        paragraph_containers = review_container.select('.modal-body p, .review-container p')
+        if paragraph_containers and len(paragraph_containers) > 1:
+            print(f"Found {len(paragraph_containers)} paragraphs that might contain reviews")
+            review_items = paragraph_containers
+
+    return review_items
+
+
+def parse_review_item(item, review_id, fallback_rating=5.0):
+    """
+    Extract one review from a review element.
+
+    Args:
+        item: Element from find_review_items
+        review_id: Id to give the review
+        fallback_rating: Rating used when the element shows none (e.g. the aggregate rating)
+
+    Returns:
+        Dictionary with id, text, date, reviewer_name and rating, or None if the element holds no review
+    """
+    # Skip empty or very short items
+    item_text = item.get_text(strip=True)
+    if len(item_text) < 20:
+        return None
+
+    review_data = {'id': review_id}
+
+    # Extract review text - focusing on paragraph elements which usually contain the actual review
+    review_text = ""
+    paragraphs = item.select('p')
+    for p in paragraphs:
+        p_text = clean_text(p.get_text())
+        # Skip attribution paragraphs (usually shorter)
+        if len(p_text) > 25 and 'Posted by' not in p_text and not p_text.startswith('on '):
+            review_text = p_text
+            break
+
+    # If no paragraph with good content, try the item's full text
+    if not review_text:
+        # Try to get content from a div with the review text
+        content_divs = item.select('.review-text, .review-content, .review-body')
+        if content_divs:
+            review_text = clean_text(content_divs[0].get_text())
+        else:
+            # Last resort: use the full item text but try to filter out metadata
+            item_text = clean_text(item.get_text())
+            # Keep only first 80% of text to avoid attribution info at the end
+            review_text = item_text[:int(len(item_text) * 0.8)]
+
+    if not review_text:
+        return None
+    review_data['text'] = review_text
+
+    # Extract review title/heading if present
+    heading_elements = item.select('h3, h4, h5, .review-title, .review-heading, strong')
+    review_heading = None
+    for heading_elem in heading_elements:
+        heading_text = clean_text(heading_elem.get_text())
+        if heading_text and len(heading_text) > 5 and len(heading_text) < 100:
+            review_heading = heading_text
+            break
+
+    # Combine title and text if appropriate
+    if review_heading and review_heading not in review_text:
+        review_data['text'] = f"{review_heading}: {review_text}"
+
+    # Extract review date
+    review_date = "Unknown"
+
+    # Look specifically for the EnergySage date format in text-gray-600 div
+    date_container = item.select('div.text-gray-600 span.d-inline-block')
+    if date_container:
+        date_text = clean_text(date_container[0].get_text())
+        if date_text:
+            review_date = date_text
+            print(f"Found date in EnergySage format: {review_date}")
+
+    # If not found, try generic date elements
+    if review_date == "Unknown":
+        date_elements = item.select('.date, .review-date, .timestamp, [class*="date"]')
+        if date_elements:
+            date_text = clean_text(date_elements[0].get_text())
+            if date_text and len(date_text) < 30:  # Reasonable date length
+                review_date = date_text
+
+    # If still not found, try to extract from "on DATE" pattern
+    if review_date == "Unknown":
+        date_match = re.search(r'on\s+([A-Za-z]{3}\s+\d{1,2},?\s+\d{4}|[A-Za-z]{3}\s+\d{1,2})', item_text)
+        if date_match:
+            review_date = date_match.group(1).strip()
+
+    # If still not found, look for any date-like pattern in the text
+    if review_date == "Unknown":
+        date_pattern = re.search(r'([A-Za-z]{3,9}\s+\d{1,2},?\s+\d{4})', item_text)
+        if date_pattern:
+            review_date = date_pattern.group(1).strip()
+
+    review_data['date'] = review_date
+
+    # Extract reviewer name
+    reviewer_name = "Anonymous"
+
+    # Look specifically for EnergySage reviewer format
+    reviewer_match = re.search(r'Posted by\s+(\w+)\s+on', item_text)
+    if reviewer_match:
+        reviewer_name = reviewer_match.group(1).strip()
+        print(f"Found reviewer in EnergySage format: {reviewer_name}")
+    # If not found, try elements with reviewer name
+    elif review_date == "Unknown":
+        name_elements = item.select('.reviewer-name, .author, [class*="reviewer"], [class*="author"]')
+        if name_elements:
+            name_text = clean_text(name_elements[0].get_text())
+            if name_text and len(name_text) < 50:  # Reasonable name length
+                reviewer_name = name_text
+                # Remove "Posted by" if present
+                if 'Posted by' in reviewer_name:
+                    reviewer_name = reviewer_name.split('Posted by')[1].split('on')[0].strip()
+
+    # If no specific element found, try to extract from "Posted by" text
+    if reviewer_name == "Anonymous":
+        posted_match = re.search(r'Posted by\s+([^on]{2,40}?)(?:\s+on\s|\n|$)', item_text)
+        if posted_match:
+            reviewer_name = posted_match.group(1).strip()
+
+    review_data['reviewer_name'] = reviewer_name
+
+    # Extract rating (stars)
+    stars = 0
+
+    # Look for numeric rating in text
+    rating_elements = item.select('.rating, .stars, [class*="rating"], [class*="star"]')
+    for elem in rating_elements:
+        rating_text = elem.get_text(strip=True)
+        rating_match = re.search(r'(\d+\.?\d*)\s*/?\s*\d*', rating_text)
+        if rating_match:
+            try:
+                stars = float(rating_match.group(1))
+                break
+            except:
+                pass
+
+    # If no rating found in text, count star icons
+    if stars == 0:
+        filled_stars = len(item.select('.fa-star, .fas.fa-star, [class*="star-fill"], [class*="star-full"]'))
+        if filled_stars > 0:
+            stars = filled_stars
+
+    # Use aggregate rating as fallback
+    if stars == 0:
+        stars = fallback_rating
+
+    review_data['rating'] = stars
+    return review_data
+
+
+def pagination_api_urls(soup):
+    """
+    Pagination API URLs of the review pages linked from a page.
+
+    The page links carry the URL the site itself loads the page from in
+    their data-api-url attribute.
+
+    Args:
+        soup: BeautifulSoup of the page (or of the review modal)
+
+    Returns:
+        Dictionary of page number to API URL
+    """
+    api_urls = {}
+    for link in soup.select('a.page-link[data-api-url]'):
+        page_text = clean_text(link.get_text())
+        if page_text.isdigit():
+            api_urls[int(page_text)] = link['data-api-url']
+    return api_urls
@@ -0,0 +1,180 @@
+import argparse
+import sqlite3
+import threading
+import time
+
+DEFAULT_REVIEW_SYNC = 'review_sync.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_cursor (
+    company_id         INTEGER PRIMARY KEY,
+    newest_fingerprint TEXT,
+    newest_date        TEXT,
+    known_count        INTEGER NOT NULL DEFAULT 0,
+    sync_runs          INTEGER NOT NULL DEFAULT 0,
+    synced_at          REAL
+);
+
+CREATE TABLE IF NOT EXISTS known_reviews (
+    company_id    INTEGER NOT NULL,
+    fingerprint   TEXT NOT NULL,
+    review_id     TEXT NOT NULL,
+    reviewer_name TEXT,
+    review_date   TEXT,
+    rating        REAL,
+    review_text   TEXT,
+    sync_run      INTEGER NOT NULL,
+    position      INTEGER NOT NULL,
+    PRIMARY KEY (company_id, fingerprint)
+);
+"""
+
+
+def review_fingerprint(reviewer_name, review_date, review_text):
+    """Identity of a review within one installer; the same key the review scraper dedupes on"""
+    return f"{reviewer_name}|{review_date}|{(review_text or '')[:50]}"
+
+
+class ReviewSyncState:
+    """
+    Reviews already captured for each installer, for delta review syncs.
+
+    A delta sync reads review pages newest first and stops at the first
+    review it already knows. The reviews from earlier runs are then merged
+    back in, so a steady-state sync costs a page or two per installer. Stored
+    reviews keep the id they were first captured with.
+    """
+
+    def __init__(self, db_path=DEFAULT_REVIEW_SYNC):
+        self.db_path = db_path
+        # Shared with the review-stage thread of scrape_installer_details
+        self.conn = sqlite3.connect(db_path, check_same_thread=False)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.executescript(SCHEMA)
+        self._lock = threading.Lock()
+
+    def known_fingerprints(self, company_id):
+        with self._lock:
+            rows = self.conn.execute(
+                "SELECT fingerprint FROM known_reviews WHERE company_id = ?", (company_id,)
+            ).fetchall()
+        return {row['fingerprint'] for row in rows}
+
+    def cursor(self, company_id):
+        with self._lock:
+            return self.conn.execute(
+                "SELECT * FROM review_cursor WHERE company_id = ?", (company_id,)
+            ).fetchone()
+
+    def merge(self, company_id, fresh_reviews):
+        """
+        Store the reviews found by this sync and return the full review list.
+
+        Args:
+            company_id: Stable record id of the installer
+            fresh_reviews: Reviews from scrape_company_reviews (id, reviewer_name, date, rating, text),
+                newest first
+
+        Returns:
+            Every known review of the installer, newest first, in the scraper's review format
+        """
+        with self._lock, self.conn:
+            cursor = self.conn.execute(
+                "SELECT sync_runs FROM review_cursor WHERE company_id = ?", (company_id,)
+            ).fetchone()
+            sync_run = (cursor['sync_runs'] if cursor else 0) + 1
+
+            self.conn.executemany(
+                """INSERT OR IGNORE INTO known_reviews
+                   (company_id, fingerprint, review_id, reviewer_name, review_date, rating, review_text,
+                    sync_run, position)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(
+                    company_id, review_fingerprint(review['reviewer_name'], review['date'], review['text']),
+                    review['id'], review['reviewer_name'], review['date'], review['rating'], review['text'],
+                    sync_run, position
+                ) for position, review in enumerate(fresh_reviews)]
+            )
+
+            rows = self.conn.execute(
+                """SELECT * FROM known_reviews WHERE company_id = ?
+                   ORDER BY sync_run DESC, position""", (company_id,)
+            ).fetchall()
+            newest = rows[0] if rows else None
+            self.conn.execute(
+                """INSERT OR REPLACE INTO review_cursor
+                   (company_id, newest_fingerprint, newest_date, known_count, sync_runs, synced_at)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                (company_id, newest['fingerprint'] if newest else None, newest['review_date'] if newest else None,
+                 len(rows), sync_run, time.time())
+            )
+
+        return [{
+            'id': row['review_id'],
+            'reviewer_name': row['reviewer_name'],
+            'date': row['review_date'],
+            'rating': row['rating'],
+            'text': row['review_text']
+        } for row in rows]
+
+    def backfill(self, company_id, reviews, first_position=0):
+        """
+        Add older reviews recovered outside a sync, e.g. by the review gap-fill stage.
+
+        They are stored under sync run 0, so they sort after every synced review
+        (in first_position order) and do not move the installer's cursor.
+        """
+        with self._lock, self.conn:
+            self.conn.executemany(
+                """INSERT OR IGNORE INTO known_reviews
+                   (company_id, fingerprint, review_id, reviewer_name, review_date, rating, review_text,
+                    sync_run, position)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, 0, ?)""",
+                [(
+                    company_id, review_fingerprint(review['reviewer_name'], review['date'], review['text']),
+                    review['id'], review['reviewer_name'], review['date'], review['rating'], review['text'],
+                    first_position + position
+                ) for position, review in enumerate(reviews)]
+            )
+            self.conn.execute(
+                """UPDATE review_cursor
+                   SET known_count = (SELECT COUNT(*) FROM known_reviews WHERE company_id = ?)
+                   WHERE company_id = ?""", (company_id, company_id)
+            )
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show the delta review sync state")
+    parser.add_argument('--db', default=DEFAULT_REVIEW_SYNC, help="Review sync database")
+    parser.add_argument('--company-id', type=int, help="Only this installer")
+    args = parser.parse_args()
+
+    with ReviewSyncState(args.db) as state:
+        query = "SELECT * FROM review_cursor"
+        params = ()
+        if args.company_id is not None:
+            query += " WHERE company_id = ?"
+            params = (args.company_id,)
+        rows = state.conn.execute(query + " ORDER BY company_id", params).fetchall()
+        print(f"{len(rows)} installers synced")
+        for row in rows:
+            synced = time.strftime('%Y-%m-%d %H:%M', time.localtime(row['synced_at'])) if row['synced_at'] else '-'
+            print(f"  {row['company_id']}: {row['known_count']} reviews, newest {row['newest_date']}, "
+                  f"{row['sync_runs']} syncs, last {synced}")
+
+
+if __name__ == "__main__":
+    main()
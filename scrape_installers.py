@@ -9,27 +9,27 @@ from selenium.webdriver.common.by import By
 from selenium.webdriver.support.ui import WebDriverWait
 from selenium.webdriver.support import expected_conditions as EC
 from webdriver_manager.chrome import ChromeDriverManager
+import re
 import time
 from selenium.common.exceptions import NoSuchElementException, TimeoutException
+from search_index import SearchIndex, DEFAULT_SEARCH_INDEX
+from fetch_policy import navigate
+from supplier_ids import SupplierIdMap
+from selector_registry import DEFAULT_SELECTORS
+from page_archive import archive_page, close_archive, enable_archive
 
-# URL of the page to scrape
-url = "https://www.energysage.com/local-data/solar-companies/ma/"
+# Listing page of every installer active in a state (two-letter code, lower case)
+LISTING_URL_TEMPLATE = "https://www.energysage.com/local-data/solar-companies/{state}/"
 
-print(f"Attempting to fetch URL using Selenium: {url}")
-
-# Selenium setup
-chrome_options = Options()
-# chrome_options.add_argument("--headless") # Keeping this commented out for visible browser
-chrome_options.add_argument("--no-sandbox")
-chrome_options.add_argument("--disable-dev-shm-usage")
-chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3")
+# Safety limit on listing pagination; Massachusetts has 8 pages
+MAX_LISTING_PAGES = 50
 
 # Helper function to extract company name from page title
 def extract_company_name_from_title(title):
     """Extract company name from page title patterns"""
     if not title:
         return "Unknown Company"
-        
+
     # Pattern: "Company Name - Profile & Reviews - 2025 | EnergySage"
     if " - Profile & Reviews" in title:
         return title.split(" - Profile & Reviews")[0].strip()
@@ -42,75 +42,99 @@ def extract_company_name_from_title(title):
     else:
         return title
 
-try:
+def create_driver():
+    """
+    Set up a Chrome WebDriver with the scraper's options
+
+    Returns:
+        Selenium WebDriver instance
+    """
+    chrome_options = Options()
+    # chrome_options.add_argument("--headless") # Keeping this commented out for visible browser
+    chrome_options.add_argument("--no-sandbox")
+    chrome_options.add_argument("--disable-dev-shm-usage")
+    chrome_options.add_argument("user-agent=Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/58.0.3029.110 Safari/537.3")
+
     service = Service(ChromeDriverManager().install())
-    driver = webdriver.Chrome(service=service, options=chrome_options)
-except Exception as e:
-    print(f"Error setting up WebDriver: {e}")
-    print("Please ensure you have Chrome and the correct ChromeDriver installed.")
-    print("Alternatively, install webdriver-manager: pip install webdriver-manager")
-    exit()
-
-try:
+    return webdriver.Chrome(service=service, options=chrome_options)
+
+def collect_installer_links(driver, url, max_pages=MAX_LISTING_PAGES):
+    """
+    Collect the name and profile URL of every installer on a paginated listing page
+
+    Args:
+        driver: Selenium WebDriver instance
+        url: Listing page URL, e.g. LISTING_URL_TEMPLATE.format(state='ma')
+        max_pages: Safety limit on the number of listing pages to follow
+
+    Returns:
+        List of dictionaries with name, profile_url and listing_review_count ('' if not shown),
+        in listing order
+    """
     # Use Selenium to load the MAIN LIST page first
-    driver.get(url)
+    navigate(driver, url)
     print("Loading main page. You should see the browser window open...")
     WebDriverWait(driver, 15).until(
-        EC.presence_of_element_located((By.TAG_NAME, "body")) 
+        EC.presence_of_element_located((By.TAG_NAME, "body"))
     )
     print("Successfully loaded the main list page with Selenium.")
-    
+
     # Debug: Output the page title to confirm correct page loading
     print(f"Page title: {driver.title}")
-    
+
     # Add visual pause to see the page
     time.sleep(3)
-    
+
     installers_links = []
     processed_links = set()  # To avoid duplicates
-    
+
     # Initialize page counter
     current_page = 1
-    total_pages = 8  # From the pagination component we saw
-    
+
     # Process all pages
-    while current_page <= total_pages:
-        print(f"\n--- Processing Page {current_page} of {total_pages} ---")
-        
+    while current_page <= max_pages:
+        print(f"\n--- Processing Page {current_page} of {url} ---")
+
         # Wait for page content to load
         time.sleep(3)
-        
+        archive_page(url, driver.page_source, 'listing', current_page)
+
         # Find the paginated list container that has all installers
         installer_list = driver.find_elements(By.CSS_SELECTOR, "ul#paginated-list")
-        
+
         if installer_list:
             print(f"Found installer list container")
-            
+
             # Find all installer list items within the container
             installer_items = driver.find_elements(By.CSS_SELECTOR, "ul#paginated-list > li")
-            
+
             if installer_items:
                 print(f"Found {len(installer_items)} installer items on this page")
-                
+
                 # Process each installer item
                 for idx, item in enumerate(installer_items):
                     try:
                         # Try to find the company name link
                         company_link = item.find_elements(By.CSS_SELECTOR, "a.d-block.font-weight-bold")
-                        
+
                         if company_link:
                             # Extract company information
                             company_name = company_link[0].text.strip()
                             profile_url = company_link[0].get_attribute('href')
-                            
+
+                            # Review count shown on the card, used to spot installers with new reviews
+                            review_match = re.search(r'(\d[\d,]*)\s+reviews?\b', item.text, re.IGNORECASE)
+                            listing_review_count = int(review_match.group(1).replace(',', '')) if review_match else ''
+
                             # Visual feedback
                             print(f"  - Found installer {idx+1}: {company_name}")
-                            
+
                             # Basic validation and avoid duplicates
                             if company_name and profile_url and profile_url not in processed_links:
                                 installers_links.append({
                                     'name': company_name,
-                                    'profile_url': profile_url
+                                    'profile_url': profile_url,
+                                    'listing_review_count': listing_review_count
                                 })
                                 processed_links.add(profile_url)
                                 print(f"  -> Added company: {company_name} (from page listing)")
@@ -120,173 +144,227 @@ try:
                 print("No installer items found in the list container")
         else:
             print("Could not find the installer list container")
-        
+
         print(f"--- Found {len(installers_links)} unique company profile links so far ---")
-        
-        # Check if there are more pages to process
-        if current_page < total_pages:
-            print(f"\nAttempting to navigate to page {current_page + 1}...")
-            
-            try:
-                # Look for the Next Page button and click it
-                next_button = WebDriverWait(driver, 10).until(
-                    EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-pc-section='nextpagebutton']"))
-                )
-                
-                # Click the next button
-                next_button.click()
-                print(f"Clicked 'Next Page' button to navigate to page {current_page + 1}")
-                
-                # Wait for page to load after navigation
-                time.sleep(3)
-                
-                # Increment page counter
-                current_page += 1
-            except (NoSuchElementException, TimeoutException) as e:
-                print(f"Error finding or clicking next page button: {e}")
-                print("Unable to navigate to next page. Stopping pagination.")
-                break
-        else:
+
+        # The Next Page button is disabled (or missing) on the last page
+        next_buttons = driver.find_elements(By.CSS_SELECTOR, "button[data-pc-section='nextpagebutton']")
+        if not next_buttons or not next_buttons[0].is_enabled() or next_buttons[0].get_attribute('disabled'):
             print("\nReached the last page. Finished collecting company links.")
             break
 
+        print(f"\nAttempting to navigate to page {current_page + 1}...")
+
+        try:
+            # Look for the Next Page button and click it
+            next_button = WebDriverWait(driver, 10).until(
+                EC.element_to_be_clickable((By.CSS_SELECTOR, "button[data-pc-section='nextpagebutton']"))
+            )
+
+            # Click the next button
+            next_button.click()
+            print(f"Clicked 'Next Page' button to navigate to page {current_page + 1}")
+
+            # Wait for page to load after navigation
+            time.sleep(3)
+
+            # Increment page counter
+            current_page += 1
+        except (NoSuchElementException, TimeoutException) as e:
+            print(f"Error finding or clicking next page button: {e}")
+            print("Unable to navigate to next page. Stopping pagination.")
+            break
+
     print(f"\n--- Found {len(installers_links)} unique company profile links across all pages ---")
+    return installers_links
 
-    # --- Step 2: Visit Individual Pages and Scrape Details --- 
-    print("\n--- Scraping Individual Company Pages ---")
-    all_installers_data = []
+def scrape_installer_profile(driver, company_id, installer_info):
+    """
+    Visit one installer's profile page and extract its description
 
-    for index, installer_info in enumerate(installers_links):
-        profile_url = installer_info['profile_url']
-        company_name = installer_info['name']
-        # Assign a numerical ID (starting from 1)
-        company_id = index + 1
-        print(f"\nScraping ({company_id}/{len(installers_links)}): {company_name}")
-        print(f"Navigating to: {profile_url}")
+    Args:
+        driver: Selenium WebDriver instance
+        company_id: Stable record id of the installer (its supplier id, see supplier_ids.py)
+        installer_info: Dictionary with name and profile_url from the listing
 
-        try:
-            # Navigate to the profile page
-            driver.get(profile_url)
-            # Wait for page to load
-            WebDriverWait(driver, 15).until(
-                EC.presence_of_element_located((By.TAG_NAME, "body"))
-            )
-            
-            # Get the page title to extract accurate company name if needed
-            if company_name == "Unknown Company":
-                company_name = extract_company_name_from_title(driver.title)
-            
-            # Small delay to ensure content loads
-            time.sleep(2)
-            
-            # Parse with BeautifulSoup
-            profile_page_source = driver.page_source
-            profile_soup = BeautifulSoup(profile_page_source, 'html.parser')
-
-            # Description: Try multiple potential selectors
-            description = 'N/A'
-            desc_selectors = [
-                {'type': 'id', 'value': 'collapsablePitch'},
-                {'type': 'class', 'value': 'supplier-description'},
-                {'type': 'class', 'value': 'company-description'},
-                {'type': 'class', 'value': 'about-description'},
-                {'type': 'class', 'value': 'supplier-pitch'}
-            ]
-            
-            for selector in desc_selectors:
-                if selector['type'] == 'id':
-                    desc_div = profile_soup.find('div', id=selector['value'])
-                else:
-                    desc_div = profile_soup.find('div', class_=selector['value'])
-                    
-                if desc_div:
-                    description = ' '.join(desc_div.stripped_strings)
-                    print(f"Found description using {selector['type']}='{selector['value']}'")
-                    break
-
-            # Store collected data in a well-structured format - only the fields we need
-            installer_data = {
-                'id': company_id,
-                'company_name': company_name,
-                'description': description,
-                'profile_url': profile_url
-            }
-            all_installers_data.append(installer_data)
-            
-            print(f"  -> ID: {company_id}")
-            print(f"  -> Description: {description[:50]}..." if len(description) > 50 else f"  -> Description: {description}")
-
-            # Add a small delay to avoid overwhelming the server
-            time.sleep(1.5)
-
-        except Exception as page_error:
-            print(f"  -> Error scraping {profile_url}: {page_error}")
-            # Add placeholder data on error
-            all_installers_data.append({
-                'id': company_id,
-                'company_name': company_name,
-                'description': 'Error retrieving',
-                'profile_url': profile_url
-            })
-            time.sleep(1)
-
-    # --- Step 3: Output Final Data --- 
-    print("\n--- Scraping Complete --- ")
-    print(f"Successfully scraped details for {len(all_installers_data)} companies.")
-
-    # Output data in multiple formats for easy website integration
-    if all_installers_data:
-        base_filename = 'massachusetts_solar_installers'
-        
-        # 1. CSV Export with proper quoting to handle lists
-        csv_filename = f'{base_filename}.csv'
-        print(f"\nSaving data to {csv_filename}...")
-        
-        # Define field names - including the new ID field
-        fieldnames = [
-            'id', 'company_name', 'description', 'profile_url'
+    Returns:
+        Dictionary with id, company_name, description, profile_url and listing_review_count
+        (description is 'Error retrieving' if the page could not be scraped)
+    """
+    profile_url = installer_info['profile_url']
+    company_name = installer_info['name']
+    print(f"Navigating to: {profile_url}")
+
+    try:
+        # Navigate to the profile page
+        navigate(driver, profile_url)
+        # Wait for page to load
+        WebDriverWait(driver, 15).until(
+            EC.presence_of_element_located((By.TAG_NAME, "body"))
+        )
+
+        # Get the page title to extract accurate company name if needed
+        if company_name == "Unknown Company":
+            company_name = extract_company_name_from_title(driver.title)
+
+        # Small delay to ensure content loads
+        time.sleep(2)
+
+        # Parse with BeautifulSoup
+        profile_page_source = driver.page_source
+        archive_page(profile_url, profile_page_source, 'profile')
+        profile_soup = BeautifulSoup(profile_page_source, 'html.parser')
+
+        # Description: Try multiple potential selectors
+        description = 'N/A'
+        desc_selectors = [
+            {'type': 'id', 'value': 'collapsablePitch'},
+            {'type': 'class', 'value': 'supplier-description'},
+            {'type': 'class', 'value': 'company-description'},
+            {'type': 'class', 'value': 'about-description'},
+            {'type': 'class', 'value': 'supplier-pitch'}
         ]
-        
-        with open(csv_filename, 'w', newline='', encoding='utf-8') as output_file:
-            # Use DictWriter with proper quoting to handle text with commas
-            writer = csv.DictWriter(
-                output_file, 
-                fieldnames=fieldnames,
-                quoting=csv.QUOTE_ALL  # Quote all fields to prevent delimiter issues
-            )
-            # Write header
-            writer.writeheader()
-            # Write data rows - including the new ID field
-            for installer in all_installers_data:
-                writer.writerow({
-                    'id': installer['id'],
-                    'company_name': installer['company_name'],
-                    'description': installer['description'],
-                    'profile_url': installer['profile_url']
-                })
-        
-        # 2. JSON Export
-        json_filename = f'{base_filename}.json'
-        print(f"Saving data to {json_filename}...")
-        
-        with open(json_filename, 'w', encoding='utf-8') as json_file:
-            json.dump(all_installers_data, json_file, indent=2, ensure_ascii=False)
-        
-        print(f"Data successfully saved to {csv_filename} and {json_filename}")
-        print("\nTo use this data in your website:")
-        print("1. For CSV: Use pandas or csv module to read the data")
-        print("2. For JSON: Use the built-in json module to load the data structure")
-        print("3. JSON format is recommended for easier web integration")
-        
-    else:
-        print("No installer data was successfully scraped or processed.")
 
-except Exception as e:
-    print(f"An error occurred during scraping: {e}")
-finally:
-    # Ensure the browser is closed even if errors occur
-    if 'driver' in locals():
+        def find_description(selector):
+            if selector['type'] == 'id':
+                return profile_soup.find('div', id=selector['value'])
+            return profile_soup.find('div', class_=selector['value'])
+
+        selector, desc_div = DEFAULT_SELECTORS.first_match('description', desc_selectors, find_description)
+        if desc_div:
+            description = ' '.join(desc_div.stripped_strings)
+            print(f"Found description using {selector['type']}='{selector['value']}'")
+
+        # Store collected data in a well-structured format - only the fields we need
+        installer_data = {
+            'id': company_id,
+            'company_name': company_name,
+            'description': description,
+            'profile_url': profile_url,
+            'listing_review_count': installer_info.get('listing_review_count', '')
+        }
+
+        print(f"  -> ID: {company_id}")
+        print(f"  -> Description: {description[:50]}..." if len(description) > 50 else f"  -> Description: {description}")
+        return installer_data
+
+    except Exception as page_error:
+        print(f"  -> Error scraping {profile_url}: {page_error}")
+        # Add placeholder data on error
+        return {
+            'id': company_id,
+            'company_name': company_name,
+            'description': 'Error retrieving',
+            'profile_url': profile_url,
+            'listing_review_count': installer_info.get('listing_review_count', '')
+        }
+
+def save_installers(all_installers_data, base_filename, extra_fieldnames=None):
+    """
+    Write the scraped installers to CSV and JSON and update the search index
+
+    Args:
+        all_installers_data: List of installer dictionaries
+        base_filename: Output name without extension, e.g. 'massachusetts_solar_installers'
+        extra_fieldnames: Additional columns beyond id, company_name, description, profile_url
+            and listing_review_count
+    """
+    # 1. CSV Export with proper quoting to handle lists
+    csv_filename = f'{base_filename}.csv'
+    print(f"\nSaving data to {csv_filename}...")
+
+    # Define field names - including the new ID field
+    fieldnames = [
+        'id', 'company_name', 'description', 'profile_url', 'listing_review_count'
+    ] + list(extra_fieldnames or [])
+
+    with open(csv_filename, 'w', newline='', encoding='utf-8') as output_file:
+        # Use DictWriter with proper quoting to handle text with commas
+        writer = csv.DictWriter(
+            output_file,
+            fieldnames=fieldnames,
+            quoting=csv.QUOTE_ALL,  # Quote all fields to prevent delimiter issues
+            extrasaction='ignore'
+        )
+        # Write header
+        writer.writeheader()
+        # Write data rows - including the new ID field
+        for installer in all_installers_data:
+            writer.writerow(installer)
+
+    # 2. JSON Export
+    json_filename = f'{base_filename}.json'
+    print(f"Saving data to {json_filename}...")
+
+    with open(json_filename, 'w', encoding='utf-8') as json_file:
+        json.dump(all_installers_data, json_file, indent=2, ensure_ascii=False)
+
+    print(f"Data successfully saved to {csv_filename} and {json_filename}")
+
+    # 3. Full-text search index of the descriptions (only changed descriptions are re-indexed)
+    print(f"Updating search index {DEFAULT_SEARCH_INDEX}...")
+    with SearchIndex(DEFAULT_SEARCH_INDEX) as search_index:
+        search_index.add_installers(
+            installer for installer in all_installers_data
+            if installer['description'] not in ('N/A', 'Error retrieving')
+        )
+
+    print("\nTo use this data in your website:")
+    print("1. For CSV: Use pandas or csv module to read the data")
+    print("2. For JSON: Use the built-in json module to load the data structure")
+    print("3. JSON format is recommended for easier web integration")
+
+def main():
+    # URL of the page to scrape
+    url = LISTING_URL_TEMPLATE.format(state='ma')
+
+    print(f"Attempting to fetch URL using Selenium: {url}")
+
+    try:
+        driver = create_driver()
+    except Exception as e:
+        print(f"Error setting up WebDriver: {e}")
+        print("Please ensure you have Chrome and the correct ChromeDriver installed.")
+        print("Alternatively, install webdriver-manager: pip install webdriver-manager")
+        return
+
+    enable_archive()
+    DEFAULT_SELECTORS.load()
+    try:
+        installers_links = collect_installer_links(driver, url)
+
+        # --- Step 2: Visit Individual Pages and Scrape Details ---
+        print("\n--- Scraping Individual Company Pages ---")
+        all_installers_data = []
+
+        with SupplierIdMap() as id_map:
+            for index, installer_info in enumerate(installers_links):
+                # Key each installer by its supplier id, so ids survive reordering of the listing
+                company_id = id_map.id_for(installer_info['profile_url'])
+                print(f"\nScraping ({index + 1}/{len(installers_links)}): {installer_info['name']}")
+                all_installers_data.append(scrape_installer_profile(driver, company_id, installer_info))
+
+        # --- Step 3: Output Final Data ---
+        print("\n--- Scraping Complete --- ")
+        print(f"Successfully scraped details for {len(all_installers_data)} companies.")
+
+        # Output data in multiple formats for easy website integration
+        if all_installers_data:
+            save_installers(all_installers_data, 'massachusetts_solar_installers')
+        else:
+            print("No installer data was successfully scraped or processed.")
+
+    except Exception as e:
+        print(f"An error occurred during scraping: {e}")
+    finally:
+        # Ensure the browser is closed even if errors occur
         print("Scraping complete. Closing browser in 5 seconds...")
         time.sleep(5)  # Give user time to see the final state
         driver.quit()
-        print("Closed Selenium browser.") 
\ No newline at end of file
+        close_archive()
+        DEFAULT_SELECTORS.report()
+        DEFAULT_SELECTORS.save()
+        print("Closed Selenium browser.")
+
+if __name__ == "__main__":
+    main()
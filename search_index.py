@@ -0,0 +1,306 @@
+import argparse
+import csv
+import hashlib
+import os
+import re
+import sqlite3
+
+from review_sync import review_fingerprint
+
+DEFAULT_SEARCH_INDEX = 'search_index.db'
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS review_docs (
+    doc_id        INTEGER PRIMARY KEY,
+    review_key    TEXT NOT NULL UNIQUE,
+    review_id     TEXT,
+    company_id    INTEGER,
+    company_name  TEXT,
+    reviewer_name TEXT,
+    review_date   TEXT,
+    rating        REAL
+);
+CREATE INDEX IF NOT EXISTS idx_review_docs_company ON review_docs(company_id, rating);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS reviews_fts USING fts5(
+    review_text,
+    content='',
+    tokenize='porter unicode61'
+);
+
+CREATE TABLE IF NOT EXISTS installer_docs (
+    company_id   INTEGER PRIMARY KEY,
+    company_name TEXT,
+    profile_url  TEXT,
+    description  TEXT
+);
+
+CREATE VIRTUAL TABLE IF NOT EXISTS installers_fts USING fts5(
+    company_name,
+    description,
+    content='installer_docs',
+    content_rowid='company_id',
+    tokenize='porter unicode61'
+);
+"""
+
+
+def review_key(review_row):
+    """
+    Stable identity of a review across crawls.
+
+    Review ids embed the scrape timestamp, so they change every run. The key
+    is review_sync.review_fingerprint (the one the review scraper and delta
+    syncs dedupe on) scoped to the company, so every stage agrees on which
+    rows are the same review.
+
+    Args:
+        review_row: Review catalog row
+
+    Returns:
+        Hex digest string
+    """
+    fingerprint = '|'.join([
+        str(review_row.get('company_id', '')),
+        review_fingerprint(review_row.get('reviewer_name'), review_row.get('review_date'),
+                           review_row.get('review_text'))
+    ])
+    return hashlib.sha1(fingerprint.encode('utf-8')).hexdigest()
+
+
+def to_match_expression(text):
+    """
+    Turn free text into a safe FTS5 query: every word must appear.
+
+    Words are quoted so punctuation and FTS5 operators in user input
+    cannot break the query.
+
+    Args:
+        text: e.g. "Tesla Powerwall"
+
+    Returns:
+        FTS5 MATCH expression such as '"tesla" "powerwall"', or '' for empty input
+    """
+    words = re.findall(r'\w+', text.lower())
+    return ' '.join(f'"{word}"' for word in words)
+
+
+def _to_int(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class SearchIndex:
+    """
+    Full-text search over review text and installer descriptions (SQLite FTS5).
+
+    Reviews are added incrementally: a review whose key is already indexed is
+    skipped, so re-feeding a company's reviews after a new crawl only touches
+    the reviews that are actually new. Results are ranked with BM25.
+    """
+
+    def __init__(self, db_path=DEFAULT_SEARCH_INDEX):
+        self.db_path = db_path
+        self.conn = sqlite3.connect(db_path)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript(SCHEMA)
+        self.added_reviews = 0
+
+    def add_review(self, review_row):
+        """
+        Index one review if it is not indexed yet.
+
+        Returns:
+            True if the review was new
+        """
+        cursor = self.conn.execute(
+            """INSERT OR IGNORE INTO review_docs
+               (review_key, review_id, company_id, company_name, reviewer_name, review_date, rating)
+               VALUES (?, ?, ?, ?, ?, ?, ?)""",
+            (
+                review_key(review_row), review_row.get('review_id'), _to_int(review_row.get('company_id')),
+                review_row.get('company_name'), review_row.get('reviewer_name'),
+                review_row.get('review_date'), _to_float(review_row.get('rating'))
+            )
+        )
+        if not cursor.rowcount:
+            return False
+        self.conn.execute(
+            "INSERT INTO reviews_fts (rowid, review_text) VALUES (?, ?)",
+            (cursor.lastrowid, review_row.get('review_text') or '')
+        )
+        self.added_reviews += 1
+        return True
+
+    def add_reviews(self, review_rows):
+        """Index many reviews in one transaction; returns how many were new"""
+        added = 0
+        with self.conn:
+            for review_row in review_rows:
+                if self.add_review(review_row):
+                    added += 1
+        return added
+
+    def add_installer(self, installer_row):
+        """Index or re-index one installer's name and description"""
+        company_id = _to_int(installer_row.get('id'))
+        if company_id is None:
+            return
+        existing = self.conn.execute(
+            "SELECT company_name, description FROM installer_docs WHERE company_id = ?", (company_id,)
+        ).fetchone()
+        name = installer_row.get('company_name') or ''
+        description = installer_row.get('description') or ''
+        if existing and existing['company_name'] == name and existing['description'] == description:
+            return
+        if existing:
+            # External-content FTS tables need the old values to remove the old terms
+            self.conn.execute(
+                "INSERT INTO installers_fts (installers_fts, rowid, company_name, description) "
+                "VALUES ('delete', ?, ?, ?)",
+                (company_id, existing['company_name'], existing['description'])
+            )
+        self.conn.execute(
+            "INSERT OR REPLACE INTO installer_docs (company_id, company_name, profile_url, description) "
+            "VALUES (?, ?, ?, ?)",
+            (company_id, name, installer_row.get('profile_url') or '', description)
+        )
+        self.conn.execute(
+            "INSERT INTO installers_fts (rowid, company_name, description) VALUES (?, ?, ?)",
+            (company_id, name, description)
+        )
+
+    def add_installers(self, installer_rows):
+        with self.conn:
+            for installer_row in installer_rows:
+                self.add_installer(installer_row)
+
+    def checkpoint(self):
+        """Commit everything added since the last checkpoint"""
+        self.conn.commit()
+
+    def search_reviews(self, text, company_id=None, min_rating=None, max_rating=None, limit=20, offset=0):
+        """
+        Ranked review search.
+
+        Args:
+            text: Words that must all appear in the review
+            company_id: Only reviews of this installer
+            min_rating, max_rating: Rating bounds (inclusive)
+            limit, offset: Paging
+
+        Returns:
+            List of dicts with the review metadata and BM25 score (lower is better)
+        """
+        expression = to_match_expression(text)
+        if not expression:
+            return []
+        query = """SELECT d.review_id, d.company_id, d.company_name, d.reviewer_name, d.review_date,
+                          d.rating, bm25(reviews_fts) AS score
+                   FROM reviews_fts JOIN review_docs d ON d.doc_id = reviews_fts.rowid
+                   WHERE reviews_fts MATCH ?"""
+        params = [expression]
+        if company_id is not None:
+            query += " AND d.company_id = ?"
+            params.append(company_id)
+        if min_rating is not None:
+            query += " AND d.rating >= ?"
+            params.append(min_rating)
+        if max_rating is not None:
+            query += " AND d.rating <= ?"
+            params.append(max_rating)
+        query += " ORDER BY score LIMIT ? OFFSET ?"
+        params.extend([limit, offset])
+        return [dict(row) for row in self.conn.execute(query, params)]
+
+    def search_installers(self, text, limit=20):
+        """Ranked search over installer names and descriptions"""
+        expression = to_match_expression(text)
+        if not expression:
+            return []
+        rows = self.conn.execute(
+            """SELECT d.company_id, d.company_name, d.profile_url,
+                      snippet(installers_fts, 1, '[', ']', '...', 12) AS snippet,
+                      bm25(installers_fts) AS score
+               FROM installers_fts JOIN installer_docs d ON d.company_id = installers_fts.rowid
+               WHERE installers_fts MATCH ?
+               ORDER BY score LIMIT ?""",
+            (expression, limit)
+        )
+        return [dict(row) for row in rows]
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.commit()
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _iter_catalog(path):
+    delimiter = '\t' if path.endswith('.tsv') else ','
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file, delimiter=delimiter):
+            yield row
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Build or query the full-text search index")
+    parser.add_argument('--index', default=DEFAULT_SEARCH_INDEX, help="Search index database")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    update_parser = subparsers.add_parser('update', help="Add new reviews and descriptions from the catalogs")
+    update_parser.add_argument('--reviews', default='all_reviews_catalog.csv')
+    update_parser.add_argument('--installers', default='all_massachusetts_installer_details.tsv')
+
+    reviews_parser = subparsers.add_parser('reviews', help="Search review text")
+    reviews_parser.add_argument('text')
+    reviews_parser.add_argument('--company-id', type=int)
+    reviews_parser.add_argument('--min-rating', type=float)
+    reviews_parser.add_argument('--limit', type=int, default=20)
+
+    installers_parser = subparsers.add_parser('installers', help="Search installer descriptions")
+    installers_parser.add_argument('text')
+    installers_parser.add_argument('--limit', type=int, default=20)
+
+    args = parser.parse_args()
+
+    with SearchIndex(args.index) as index:
+        if args.command == 'update':
+            if os.path.exists(args.installers):
+                index.add_installers(_iter_catalog(args.installers))
+            added = index.add_reviews(_iter_catalog(args.reviews)) if os.path.exists(args.reviews) else 0
+            print(f"Indexed {added} new reviews into {os.path.abspath(args.index)}")
+        elif args.command == 'reviews':
+            results = index.search_reviews(args.text, company_id=args.company_id,
+                                           min_rating=args.min_rating, limit=args.limit)
+            print(f"Found {len(results)} matching reviews")
+            for result in results:
+                print(f"  [{result['company_name']}] {result['reviewer_name']}, {result['rating']}★ "
+                      f"({result['review_date']}) - review {result['review_id']}")
+        else:
+            results = index.search_installers(args.text, limit=args.limit)
+            print(f"Found {len(results)} matching installers")
+            for result in results:
+                print(f"  {result['company_id']}: {result['company_name']} - {result['snippet']}")
+
+
+if __name__ == "__main__":
+    main()
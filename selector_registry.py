@@ -0,0 +1,233 @@
+import argparse
+import json
+import os
+import threading
+import time
+
+DEFAULT_SELECTOR_STATS = 'selector_stats.json'
+
+# A selector that has missed this many times in a row is stale: skipped while a live selector matches
+DEFAULT_STALE_AFTER = 25
+
+# Every this many calls for a field, stale selectors are tried again in their declared position
+DEFAULT_REPROBE_EVERY = 20
+
+
+def selector_key(selector):
+    """Name a selector is tracked under: the CSS string, or type='value' for the dict selectors"""
+    if isinstance(selector, str):
+        return selector
+    return f"{selector['type']}='{selector.get('text', selector.get('value'))}'"
+
+
+def _new_counts():
+    return {'hits': 0, 'misses': 0, 'seconds': 0.0, 'misses_since_hit': 0, 'last_hit': None}
+
+
+class SelectorRegistry:
+    """
+    Hit/miss counts and timing of every fallback selector, per extracted field.
+
+    Extractors hand their fallback list to first_match(), which tries the
+    selectors and records how each one did. Selectors that have stopped
+    matching (DEFAULT_STALE_AFTER misses in a row) are skipped, so the
+    winning selector is tried first; they are tried after the live ones only
+    when none of those matches. The live selectors keep their declared
+    order: the lists go from specific to generic, and a generic selector
+    moved forward would change what is extracted. Every
+    DEFAULT_REPROBE_EVERY calls for a field, the whole list is tried in
+    declared order, so a stale selector that matches again (and would win
+    over a generic one) is seen and becomes live again.
+
+    Counts are kept for this run and for all runs; the all-run counts are
+    saved to a JSON file so the next run skips the same stale selectors.
+    """
+
+    def __init__(self, path=DEFAULT_SELECTOR_STATS, stale_after=DEFAULT_STALE_AFTER,
+                 reprobe_every=DEFAULT_REPROBE_EVERY):
+        self.path = path
+        self.stale_after = stale_after
+        self.reprobe_every = reprobe_every
+        self._calls = {}  # field -> first_match calls in this process, for the re-probes
+        self.totals = {}  # field -> selector key -> counts over all runs
+        self.run = {}  # field -> selector key -> counts for this run
+        self._lock = threading.Lock()
+
+    def load(self, path=None):
+        """Start from the counts saved by earlier runs (if the file exists)"""
+        self.path = path or self.path
+        if self.path and os.path.exists(self.path):
+            with open(self.path, 'r', encoding='utf-8') as f:
+                saved = json.load(f)
+            with self._lock:
+                self.totals = {field: {key: dict(_new_counts(), **counts) for key, counts in selectors.items()}
+                               for field, selectors in saved.items()}
+        return self
+
+    def save(self):
+        """Write the all-run counts (atomically, so a crash never leaves half a file)"""
+        if not self.path:
+            return
+        with self._lock:
+            data = json.loads(json.dumps(self.totals))
+        temp_path = f"{self.path}.{os.getpid()}.tmp"
+        with open(temp_path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, sort_keys=True)
+        os.replace(temp_path, self.path)
+
+    def _counts(self, table, field, key):
+        return table.setdefault(field, {}).setdefault(key, _new_counts())
+
+    def _is_stale(self, field, selector):
+        counts = self.totals.get(field, {}).get(selector_key(selector))
+        return counts is not None and counts['misses_since_hit'] >= self.stale_after
+
+    def is_stale(self, field, selector):
+        with self._lock:
+            return self._is_stale(field, selector)
+
+    def ordered(self, field, selectors):
+        """
+        The selectors in the order to try them.
+
+        Live selectors come first, in declared order, then the stale ones;
+        on every reprobe_every-th call the declared order is used as is.
+        """
+        with self._lock:
+            calls = self._calls.get(field, 0) + 1
+            self._calls[field] = calls
+            if calls % self.reprobe_every == 0:
+                return list(selectors)
+            live = [selector for selector in selectors if not self._is_stale(field, selector)]
+            stale = [selector for selector in selectors if self._is_stale(field, selector)]
+        return live + stale
+
+    def record(self, field, selector, hit, seconds):
+        key = selector_key(selector)
+        now = time.time()
+        with self._lock:
+            for table in (self.totals, self.run):
+                counts = self._counts(table, field, key)
+                counts['seconds'] += seconds
+                if hit:
+                    counts['hits'] += 1
+                    counts['misses_since_hit'] = 0
+                    counts['last_hit'] = now
+                else:
+                    counts['misses'] += 1
+                    counts['misses_since_hit'] += 1
+
+    def first_match(self, field, selectors, search):
+        """
+        Try fallback selectors until one finds something.
+
+        Args:
+            field: Name of the extracted field, e.g. 'logo' or 'review_items'
+            selectors: The fallback list, most specific first
+            search: Function (selector) returning what the selector found, falsy for a miss
+
+        Returns:
+            (selector, result) of the first hit, or (None, None)
+        """
+        for selector in self.ordered(field, selectors):
+            start = time.perf_counter()
+            result = search(selector)
+            self.record(field, selector, bool(result), time.perf_counter() - start)
+            if result:
+                return selector, result
+        return None, None
+
+    def take_run_counts(self):
+        """This run's counts so far, reset afterwards; lets worker processes report to the parent"""
+        with self._lock:
+            run, self.run = self.run, {}
+        return run
+
+    def merge_run_counts(self, run):
+        """Add counts taken from another process with take_run_counts"""
+        with self._lock:
+            for field, selectors in run.items():
+                for key, delta in selectors.items():
+                    for table in (self.totals, self.run):
+                        counts = self._counts(table, field, key)
+                        counts['hits'] += delta['hits']
+                        counts['misses'] += delta['misses']
+                        counts['seconds'] += delta['seconds']
+                        if delta['hits']:
+                            counts['misses_since_hit'] = delta['misses_since_hit']
+                            counts['last_hit'] = max(counts['last_hit'] or 0, delta['last_hit'])
+                        else:
+                            counts['misses_since_hit'] += delta['misses']
+
+    def stale_selectors(self):
+        """(field, selector key, counts) of every selector that no longer matches"""
+        with self._lock:
+            return [(field, key, dict(counts))
+                    for field, selectors in sorted(self.totals.items())
+                    for key, counts in selectors.items()
+                    if counts['misses_since_hit'] >= self.stale_after]
+
+    def summaries(self, table=None):
+        """One line per field and selector: hit rate and time spent, from this run unless a table is given"""
+        with self._lock:
+            table = json.loads(json.dumps(self.run if table is None else table))
+        lines = []
+        for field, selectors in sorted(table.items()):
+            lines.append(f"{field}:")
+            for key, counts in sorted(selectors.items(), key=lambda item: -item[1]['hits']):
+                attempts = counts['hits'] + counts['misses']
+                rate = counts['hits'] / attempts if attempts else 0
+                average_ms = counts['seconds'] / attempts * 1000 if attempts else 0
+                lines.append(f"  {key}: {counts['hits']}/{attempts} hits ({rate:.0%}), "
+                             f"{counts['seconds']:.2f}s total, {average_ms:.2f} ms per try")
+        return lines
+
+    def stale_summaries(self):
+        """One line per selector that no longer matches, with when it last did"""
+        lines = []
+        for field, key, counts in self.stale_selectors():
+            last_hit = time.strftime('%Y-%m-%d', time.localtime(counts['last_hit'])) if counts['last_hit'] else 'never'
+            lines.append(f"{field}: {key} (last hit {last_hit}, {counts['misses_since_hit']} misses since)")
+        return lines
+
+    def report(self):
+        """Print this run's selector statistics and the selectors that no longer match"""
+        if not self.run:
+            return
+        print("Selector hit rates this run:")
+        for line in self.summaries():
+            print(f"  {line}")
+        stale = self.stale_summaries()
+        if stale:
+            print(f"Selectors that no longer match (tried after the live ones since {self.stale_after} "
+                  f"misses in a row):")
+            for line in stale:
+                print(f"  {line}")
+
+
+# Process-wide registry used by the extractors
+DEFAULT_SELECTORS = SelectorRegistry()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show selector hit rates saved by earlier runs")
+    parser.add_argument('--stats', default=DEFAULT_SELECTOR_STATS, help="Selector statistics file")
+    parser.add_argument('--reset', metavar='FIELD', help="Forget the counts of one field, e.g. after a site change")
+    args = parser.parse_args()
+
+    registry = SelectorRegistry(args.stats).load()
+    if args.reset:
+        registry.totals.pop(args.reset, None)
+        registry.save()
+        print(f"Cleared selector counts for {args.reset}")
+        return
+    for line in registry.summaries(registry.totals):
+        print(line)
+    stale = registry.stale_summaries()
+    print(f"\n{len(stale)} selectors no longer match")
+    for line in stale:
+        print(f"  {line}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,489 @@
+import argparse
+import csv
+import os
+import sqlite3
+from urllib.request import pathname2url
+
+from output_sinks import (
+    CatalogFile, CatalogRecord, INSTALLER_FIELDNAMES, MEDIA_FIELDNAMES, REVIEW_FIELDNAMES, serialize_row
+)
+from supplier_ids import extract_supplier_id
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS installers (
+    company_id       INTEGER PRIMARY KEY,
+    supplier_id      INTEGER,
+    company_name     TEXT NOT NULL,
+    description      TEXT,
+    profile_url      TEXT,
+    headquarters     TEXT,
+    gallery_media    TEXT,
+    image_count      INTEGER DEFAULT 0,
+    video_count      INTEGER DEFAULT 0,
+    aggregate_rating REAL DEFAULT 0,
+    review_count     INTEGER DEFAULT 0
+);
+CREATE INDEX IF NOT EXISTS idx_installers_supplier ON installers(supplier_id);
+
+CREATE TABLE IF NOT EXISTS locations (
+    company_id      INTEGER NOT NULL REFERENCES installers(company_id),
+    position        INTEGER NOT NULL,
+    address         TEXT NOT NULL,
+    is_headquarters INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (company_id, position)
+);
+
+CREATE TABLE IF NOT EXISTS states_served (
+    company_id INTEGER NOT NULL REFERENCES installers(company_id),
+    state      TEXT NOT NULL,
+    PRIMARY KEY (company_id, state)
+);
+CREATE INDEX IF NOT EXISTS idx_states_served_state ON states_served(state);
+
+CREATE TABLE IF NOT EXISTS media (
+    media_id       TEXT PRIMARY KEY,
+    company_id     INTEGER NOT NULL REFERENCES installers(company_id),
+    media_type     TEXT NOT NULL,
+    url            TEXT,
+    local_path     TEXT,
+    filename       TEXT,
+    video_platform TEXT,
+    video_id       TEXT,
+    video_url      TEXT,
+    content_digest TEXT,
+    real_format    TEXT,
+    width          INTEGER,
+    height         INTEGER,
+    byte_size      INTEGER,
+    thumbnails     TEXT,
+    phash          TEXT,
+    duplicate_of   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_media_company ON media(company_id);
+
+CREATE TABLE IF NOT EXISTS reviews (
+    review_id     TEXT PRIMARY KEY,
+    company_id    INTEGER NOT NULL REFERENCES installers(company_id),
+    reviewer_name TEXT,
+    review_date   TEXT,
+    rating        REAL,
+    review_text   TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_reviews_company ON reviews(company_id);
+"""
+
+
+# Columns added after the first release of the schema, as (table, column, type)
+MIGRATED_COLUMNS = [
+    ('media', 'content_digest', 'TEXT'),
+    ('media', 'real_format', 'TEXT'),
+    ('media', 'width', 'INTEGER'),
+    ('media', 'height', 'INTEGER'),
+    ('media', 'byte_size', 'INTEGER'),
+    ('media', 'thumbnails', 'TEXT'),
+    ('media', 'phash', 'TEXT'),
+    ('media', 'duplicate_of', 'TEXT'),
+]
+
+
+def _to_int(value, default=0):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _to_float(value, default=0.0):
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return default
+
+
+def _split_list(value, separator):
+    if not value:
+        return []
+    return [item.strip() for item in str(value).split(separator) if item.strip()]
+
+
+def _pending_row(row):
+    """Records are batched as they are, since writers never reuse them; dictionaries are copied"""
+    return row if isinstance(row, CatalogRecord) else dict(row)
+
+
+class SQLiteStore:
+    """
+    SQLite storage backend for crawl output, opened in WAL mode.
+
+    Accepts the same calls as output_sinks.CrawlSinks (write_installer,
+    write_media, write_review, checkpoint, close), so the scraper can use
+    either one. Rows are collected into small batches and written in a single
+    transaction per batch or per checkpoint, whichever comes first.
+
+    Media and review ids embed the scrape time, so a re-crawl never matches
+    the rows of the last one. Instead, the first row written for an
+    installer replaces everything stored for it: its media and reviews are
+    deleted in the same transaction that inserts the new ones. An installer's
+    rows end with its installer row, so crawling it again later in the same
+    session replaces them again. Writers that only add rows to installers
+    already stored (e.g. recovered reviews) pass replace_installers=False.
+    """
+
+    def __init__(self, db_path, batch_size=500, replace_installers=True):
+        self.db_path = db_path
+        self.batch_size = batch_size
+        self.replace_installers = replace_installers
+        self.installer_count = 0
+        self.media_count = 0
+        self.review_count = 0
+
+        self.conn = connect(db_path)
+        self._pending_installers = []
+        self._pending_media = []
+        self._pending_reviews = []
+        self._pending_replaced = set()  # installers whose stored media and reviews the next flush deletes
+        self._replacing = set()  # installers whose rows are being written (installer row not seen yet)
+
+    def _replace(self, company_id):
+        company_id = _to_int(company_id)
+        if not self.replace_installers or company_id in self._replacing:
+            return
+        if company_id in self._pending_replaced:
+            # The same installer again within one batch: commit the earlier crawl before deleting it
+            self._flush()
+        self._replacing.add(company_id)
+        self._pending_replaced.add(company_id)
+
+    def write_installer(self, installer_row):
+        self._replace(installer_row['id'])
+        self._replacing.discard(_to_int(installer_row['id']))
+        self._pending_installers.append(_pending_row(installer_row))
+        self.installer_count += 1
+        self._maybe_flush()
+
+    def write_media(self, media_row):
+        self._replace(media_row['company_id'])
+        self._pending_media.append(_pending_row(media_row))
+        self.media_count += 1
+        self._maybe_flush()
+
+    def write_review(self, review_row):
+        self._replace(review_row['company_id'])
+        self._pending_reviews.append(_pending_row(review_row))
+        self.review_count += 1
+        self._maybe_flush()
+
+    def checkpoint(self):
+        """Commit every pending row in one transaction"""
+        self._flush()
+
+    def close(self):
+        if self.conn is None:
+            return
+        self._flush()
+        self.conn.close()
+        self.conn = None
+
+    def _maybe_flush(self):
+        pending = len(self._pending_installers) + len(self._pending_media) + len(self._pending_reviews)
+        if pending >= self.batch_size:
+            self._flush()
+
+    def _flush(self):
+        if not (self._pending_installers or self._pending_media or self._pending_reviews
+                or self._pending_replaced):
+            return
+
+        with self.conn:
+            for table in ('media', 'reviews'):
+                self.conn.executemany(f"DELETE FROM {table} WHERE company_id = ?",
+                                      [(company_id,) for company_id in self._pending_replaced])
+            for row in self._pending_installers:
+                _upsert_installer(self.conn, row)
+
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO media
+                   (media_id, company_id, media_type, url, local_path, filename,
+                    video_platform, video_id, video_url,
+                    content_digest, real_format, width, height, byte_size, thumbnails,
+                    phash, duplicate_of)
+                   VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+                [(
+                    str(row['media_id']), _to_int(row['company_id']), row.get('media_type') or 'image',
+                    row.get('url') or '', row.get('local_path') or '', row.get('filename') or '',
+                    row.get('video_platform') or '', row.get('video_id') or '', row.get('video_url') or '',
+                    row.get('content_digest') or '', row.get('real_format') or '',
+                    _to_int(row.get('width'), None), _to_int(row.get('height'), None),
+                    _to_int(row.get('byte_size'), None), row.get('thumbnails') or '',
+                    row.get('phash') or '', row.get('duplicate_of') or ''
+                ) for row in self._pending_media]
+            )
+
+            self.conn.executemany(
+                """INSERT OR REPLACE INTO reviews
+                   (review_id, company_id, reviewer_name, review_date, rating, review_text)
+                   VALUES (?, ?, ?, ?, ?, ?)""",
+                [(
+                    str(row['review_id']), _to_int(row['company_id']), row.get('reviewer_name') or '',
+                    row.get('review_date') or '', _to_float(row.get('rating')), row.get('review_text') or ''
+                ) for row in self._pending_reviews]
+            )
+
+        self._pending_installers = []
+        self._pending_media = []
+        self._pending_reviews = []
+        self._pending_replaced = set()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def connect(db_path):
+    """
+    Open (and if needed create) a crawl database in WAL mode.
+
+    Args:
+        db_path: Path of the SQLite database file
+
+    Returns:
+        sqlite3.Connection with the schema in place
+    """
+    conn = sqlite3.connect(db_path)
+    conn.row_factory = sqlite3.Row
+    conn.execute("PRAGMA journal_mode=WAL")
+    # WAL makes NORMAL durable across application crashes; only power loss can drop the last commits
+    conn.execute("PRAGMA synchronous=NORMAL")
+    conn.executescript(SCHEMA)
+    _add_missing_columns(conn)
+    return conn
+
+
+def connect_readonly(db_path):
+    """
+    Open an existing crawl database for reading only.
+
+    Unlike connect(), a missing file is an error rather than a new empty
+    database, and nothing is written (no schema or column migrations).
+
+    Raises:
+        FileNotFoundError: If db_path does not exist
+    """
+    if not os.path.isfile(db_path):
+        raise FileNotFoundError(f"No crawl database at {db_path}")
+    conn = sqlite3.connect(f"file:{pathname2url(os.path.abspath(db_path))}?mode=ro", uri=True)
+    conn.row_factory = sqlite3.Row
+    return conn
+
+
+def has_installers(db_path):
+    """True if db_path is a crawl database that already holds installer rows"""
+    if not os.path.isfile(db_path):
+        return False
+    conn = connect_readonly(db_path)
+    try:
+        return conn.execute("SELECT EXISTS (SELECT 1 FROM installers)").fetchone()[0] == 1
+    except sqlite3.OperationalError:
+        # No installers table: not a crawl database yet
+        return False
+    finally:
+        conn.close()
+
+
+def _add_missing_columns(conn):
+    """Bring databases created before a column was added up to the current schema"""
+    for table, column, column_type in MIGRATED_COLUMNS:
+        existing = {row['name'] for row in conn.execute(f"PRAGMA table_info({table})")}
+        if column not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {column} {column_type}")
+
+
+def _upsert_installer(conn, row):
+    """Insert or replace one installer row and its normalized locations and states"""
+    company_id = _to_int(row['id'])
+    headquarters = row.get('headquarters') or ''
+
+    conn.execute(
+        """INSERT OR REPLACE INTO installers
+           (company_id, supplier_id, company_name, description, profile_url, headquarters,
+            gallery_media, image_count, video_count, aggregate_rating, review_count)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)""",
+        (
+            company_id, extract_supplier_id(row.get('profile_url')), row.get('company_name') or '',
+            row.get('description') or '', row.get('profile_url') or '', headquarters,
+            row.get('gallery_media') or '', _to_int(row.get('image_count')), _to_int(row.get('video_count')),
+            _to_float(row.get('aggregate_rating')), _to_int(row.get('review_count'))
+        )
+    )
+
+    conn.execute("DELETE FROM locations WHERE company_id = ?", (company_id,))
+    locations = []
+    if headquarters and headquarters not in ('N/A', 'Error retrieving'):
+        locations.append((company_id, 0, headquarters, 1))
+    for position, address in enumerate(_split_list(row.get('other_locations'), '|'), 1):
+        locations.append((company_id, position, address, 0))
+    conn.executemany(
+        "INSERT INTO locations (company_id, position, address, is_headquarters) VALUES (?, ?, ?, ?)",
+        locations
+    )
+
+    conn.execute("DELETE FROM states_served WHERE company_id = ?", (company_id,))
+    conn.executemany(
+        "INSERT OR IGNORE INTO states_served (company_id, state) VALUES (?, ?)",
+        [(company_id, state) for state in _split_list(row.get('states_served'), ',')]
+    )
+
+
+def iter_installer_rows(conn):
+    """
+    Rebuild installer rows in the layout of all_massachusetts_installer_details.csv.
+
+    Yields:
+        Dictionaries keyed by output_sinks.INSTALLER_FIELDNAMES
+    """
+    cursor = conn.execute(
+        """SELECT i.*,
+                  (SELECT group_concat(state, ',') FROM
+                      (SELECT state FROM states_served s WHERE s.company_id = i.company_id ORDER BY state)
+                  ) AS states,
+                  (SELECT group_concat(address, ' | ') FROM
+                      (SELECT address FROM locations l
+                       WHERE l.company_id = i.company_id AND l.is_headquarters = 0 ORDER BY position)
+                  ) AS other_locations
+           FROM installers i ORDER BY i.company_id"""
+    )
+    for row in cursor:
+        yield {
+            'id': row['company_id'],
+            'company_name': row['company_name'],
+            'description': row['description'],
+            'profile_url': row['profile_url'],
+            'states_served': row['states'] or '',
+            'headquarters': row['headquarters'],
+            'other_locations': row['other_locations'] or '',
+            'gallery_media': row['gallery_media'],
+            'image_count': row['image_count'],
+            'video_count': row['video_count'],
+            'aggregate_rating': row['aggregate_rating'],
+            'review_count': row['review_count']
+        }
+
+
+def iter_media_rows(conn, company_id=None):
+    """Yield media catalog rows, optionally for a single company"""
+    query = """SELECT m.*, i.company_name FROM media m
+               LEFT JOIN installers i ON i.company_id = m.company_id"""
+    params = ()
+    if company_id is not None:
+        query += " WHERE m.company_id = ?"
+        params = (company_id,)
+    cursor = conn.execute(query + " ORDER BY m.company_id, m.rowid", params)
+    # A database opened read-only may predate some media columns
+    columns = {description[0] for description in cursor.description}
+    for row in cursor:
+        yield {field: row[field] if field in columns and row[field] is not None else ''
+               for field in MEDIA_FIELDNAMES}
+
+
+def iter_review_rows(conn, company_id=None):
+    """Yield review catalog rows, optionally for a single company"""
+    query = """SELECT r.*, i.company_name FROM reviews r
+               LEFT JOIN installers i ON i.company_id = r.company_id"""
+    params = ()
+    if company_id is not None:
+        query += " WHERE r.company_id = ?"
+        params = (company_id,)
+    for row in conn.execute(query + " ORDER BY r.company_id, r.rowid", params):
+        yield {field: row[field] if row[field] is not None else '' for field in REVIEW_FIELDNAMES}
+
+
+def export_catalogs(db_path, output_dir='.', output_name='massachusetts'):
+    """
+    Regenerate the CSV/TSV catalogs from a crawl database.
+
+    The database is opened read-only and must exist. The catalogs are written
+    to temporary files that replace the existing ones only once all four are
+    complete, so a failed export leaves the old catalogs in place.
+
+    Args:
+        db_path: Path of the SQLite database
+        output_dir: Directory to write the catalogs into
+        output_name: Name used in all_<name>_installer_details.csv/.tsv
+
+    Returns:
+        Dictionary mapping each written file path to its number of rows
+
+    Raises:
+        FileNotFoundError: If db_path does not exist
+    """
+    conn = connect_readonly(db_path)
+    os.makedirs(output_dir, exist_ok=True)
+    outputs = {
+        'installers_csv': os.path.join(output_dir, f'all_{output_name}_installer_details.csv'),
+        'installers_tsv': os.path.join(output_dir, f'all_{output_name}_installer_details.tsv'),
+        'media': os.path.join(output_dir, 'all_media_catalog.csv'),
+        'reviews': os.path.join(output_dir, 'all_reviews_catalog.csv')
+    }
+    temp_paths = {key: f"{path}.tmp" for key, path in outputs.items()}
+    for path in temp_paths.values():
+        if os.path.exists(path):
+            os.remove(path)
+
+    catalogs = {}
+    try:
+        installers_csv = CatalogFile(temp_paths['installers_csv'], INSTALLER_FIELDNAMES, quoting=csv.QUOTE_ALL)
+        installers_tsv = CatalogFile(temp_paths['installers_tsv'], INSTALLER_FIELDNAMES, delimiter='\t',
+                                     quoting=csv.QUOTE_MINIMAL)
+        catalogs.update(installers_csv=installers_csv, installers_tsv=installers_tsv)
+        for row in iter_installer_rows(conn):
+            values = serialize_row(row, INSTALLER_FIELDNAMES)
+            installers_csv.write_values(values)
+            installers_tsv.write_values(values)
+
+        media_catalog = CatalogFile(temp_paths['media'], MEDIA_FIELDNAMES, quoting=csv.QUOTE_ALL)
+        catalogs['media'] = media_catalog
+        for row in iter_media_rows(conn):
+            media_catalog.write_values(serialize_row(row, MEDIA_FIELDNAMES))
+
+        reviews_catalog = CatalogFile(temp_paths['reviews'], REVIEW_FIELDNAMES, quoting=csv.QUOTE_ALL)
+        catalogs['reviews'] = reviews_catalog
+        for row in iter_review_rows(conn):
+            reviews_catalog.write_values(serialize_row(row, REVIEW_FIELDNAMES))
+
+        for catalog in catalogs.values():
+            catalog.close()
+    except BaseException:
+        for catalog in catalogs.values():
+            catalog.close()
+        for path in temp_paths.values():
+            if os.path.exists(path):
+                os.remove(path)
+        raise
+    finally:
+        conn.close()
+
+    written = {}
+    for key, catalog in catalogs.items():
+        os.replace(temp_paths[key], outputs[key])
+        written[outputs[key]] = catalog.rows_written
+    return written
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Generate the CSV/TSV catalogs from a crawl database")
+    parser.add_argument('db_path', help="SQLite database written by the scraper (--sqlite)")
+    parser.add_argument('--output-dir', default='.', help="Directory for the exported catalogs")
+    parser.add_argument('--output-name', default='massachusetts',
+                        help="Name used in all_<name>_installer_details.csv/.tsv")
+    args = parser.parse_args()
+
+    written = export_catalogs(args.db_path, args.output_dir, args.output_name)
+    for path, rows in written.items():
+        print(f"Exported {rows} rows to {os.path.abspath(path)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,293 @@
+import argparse
+import csv
+import json
+import os
+import re
+import shutil
+import threading
+
+# Persistent id map shared by every scraper run in this directory
+DEFAULT_ID_MAP = 'supplier_id_map.json'
+
+# Ids handed out to profiles without a /supplier/<id>/ URL start here, well above real supplier ids
+LOCAL_ID_BASE = 1_000_000_000
+
+
+def extract_supplier_id(profile_url):
+    """
+    Extract the numeric EnergySage supplier id from a profile URL.
+
+    Args:
+        profile_url: URL such as https://www.energysage.com/supplier/20385/all-energy-solar/
+
+    Returns:
+        The supplier id as an int, or None if the URL has no /supplier/<id>/ part
+    """
+    match = re.search(r'/supplier/(\d+)', profile_url or '')
+    return int(match.group(1)) if match else None
+
+
+def legacy_scope(catalog_path):
+    """
+    Name the positional ids of one catalog are kept under.
+
+    Positional ids restart at 1 in every listing and run, so an id only
+    means something together with the catalog it came from. The CSV and TSV
+    copies of a catalog share a scope.
+
+    Args:
+        catalog_path: Listing or installer catalog path, e.g. all_massachusetts_installer_details.tsv
+
+    Returns:
+        The file name without directory and extension
+    """
+    return os.path.splitext(os.path.basename(catalog_path))[0]
+
+
+def normalize_profile_url(profile_url):
+    """Profile URL without query string, fragment or trailing slash, for use as a map key"""
+    url = (profile_url or '').strip().split('#')[0].split('?')[0]
+    return url.rstrip('/').lower()
+
+
+class SupplierIdMap:
+    """
+    Persistent map from profile URLs to stable record ids.
+
+    The record id of an installer is its EnergySage supplier id, so it does
+    not change when the listing order does. The map remembers the few
+    profiles whose URL has no supplier id (they get a local id once and keep
+    it) and the positional ids used by older runs, so old catalogs can still
+    be joined to new ones. Positional ids are kept per source catalog (see
+    legacy_scope): id 5 of one listing is unrelated to id 5 of another, or
+    to supplier 5.
+    """
+
+    def __init__(self, path=DEFAULT_ID_MAP):
+        self.path = path
+        self.urls = {}
+        self.legacy = {}  # scope -> positional id -> stable id
+        self.migrated = set()  # scopes whose catalogs migrate_catalogs already rewrote
+        self.next_local_id = LOCAL_ID_BASE
+        self._dirty = False
+        self._lock = threading.Lock()
+
+        if path and os.path.exists(path):
+            with open(path, 'r', encoding='utf-8') as f:
+                data = json.load(f)
+            self.urls = {url: int(record_id) for url, record_id in data.get('urls', {}).items()}
+            for scope, ids in data.get('legacy', {}).items():
+                if isinstance(ids, dict):
+                    self.legacy[scope] = {str(old): int(record_id) for old, record_id in ids.items()}
+                else:
+                    # Maps written before ids were scoped: keep them under the unnamed scope
+                    self.legacy.setdefault('', {})[str(scope)] = int(ids)
+            self.migrated = set(data.get('migrated', []))
+            self.next_local_id = int(data.get('next_local_id', LOCAL_ID_BASE))
+
+    def id_for(self, profile_url):
+        """
+        Args:
+            profile_url: Installer profile URL
+
+        Returns:
+            The stable record id for this installer
+        """
+        supplier_id = extract_supplier_id(profile_url)
+        if supplier_id is not None:
+            return supplier_id
+
+        key = normalize_profile_url(profile_url)
+        with self._lock:
+            record_id = self.urls.get(key)
+            if record_id is None:
+                record_id = self.next_local_id
+                self.next_local_id += 1
+                self.urls[key] = record_id
+                self._dirty = True
+            return record_id
+
+    def remember_legacy(self, legacy_id, profile_url, scope):
+        """
+        Record the positional id an older run gave this installer.
+
+        Args:
+            legacy_id: Positional id from the catalog
+            profile_url: Installer profile URL
+            scope: legacy_scope() of the catalog the id comes from
+
+        Returns:
+            The stable id
+        """
+        record_id = self.id_for(profile_url)
+        with self._lock:
+            scoped = self.legacy.setdefault(scope, {})
+            if scoped.get(str(legacy_id)) != record_id:
+                scoped[str(legacy_id)] = record_id
+                self._dirty = True
+        return record_id
+
+    def resolve(self, record_id, scope):
+        """
+        Translate a positional id from an older catalog to the stable id.
+
+        Args:
+            record_id: Positional id from an older run
+            scope: legacy_scope() of the catalog the id comes from
+
+        Returns:
+            The stable id as an int, or None if the scope has no such id
+        """
+        return self.legacy.get(scope, {}).get(str(record_id).strip())
+
+    def mark_migrated(self, scope):
+        """Remember that the catalogs of this scope now hold stable ids"""
+        with self._lock:
+            if scope not in self.migrated:
+                self.migrated.add(scope)
+                self._dirty = True
+
+    def save(self):
+        """Write the map if it changed (atomically, so a crash never leaves half a file)"""
+        with self._lock:
+            if not self._dirty or not self.path:
+                return
+            data = {'urls': self.urls, 'legacy': self.legacy, 'migrated': sorted(self.migrated),
+                    'next_local_id': self.next_local_id}
+            temp_path = f"{self.path}.tmp"
+            with open(temp_path, 'w', encoding='utf-8') as f:
+                json.dump(data, f, indent=2, sort_keys=True)
+            os.replace(temp_path, self.path)
+            self._dirty = False
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.save()
+        return False
+
+
+def index_by_id(rows, id_map=None, url_field='profile_url'):
+    """
+    Key rows by their stable record id for O(1) joins between outputs.
+
+    Args:
+        rows: Iterable of row dictionaries with a profile URL
+        id_map: SupplierIdMap to use (ids come straight from the URLs if omitted)
+        url_field: Name of the profile URL field
+
+    Returns:
+        Dictionary mapping record id to row (later rows win)
+    """
+    indexed = {}
+    for row in rows:
+        url = row.get(url_field)
+        record_id = id_map.id_for(url) if id_map else extract_supplier_id(url)
+        if record_id is not None:
+            indexed[record_id] = row
+    return indexed
+
+
+def _catalog_format(path):
+    if path.lower().endswith('.tsv'):
+        return '\t', csv.QUOTE_MINIMAL
+    return ',', csv.QUOTE_ALL
+
+
+def _rewrite_catalog(path, id_field, translate):
+    """Rewrite one id column of a catalog in place, keeping a .bak copy; returns the rows changed"""
+    delimiter, quoting = _catalog_format(path)
+    with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+        reader = csv.DictReader(f, delimiter=delimiter)
+        fieldnames = reader.fieldnames
+        rows = list(reader)
+
+    changed = 0
+    for row in rows:
+        new_id = translate(row)
+        if new_id is not None and str(new_id) != row[id_field]:
+            row[id_field] = str(new_id)
+            changed += 1
+    if not changed:
+        return 0
+
+    shutil.copy2(path, f"{path}.bak")
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', newline='', encoding='utf-8-sig') as f:
+        writer = csv.DictWriter(f, fieldnames=fieldnames, delimiter=delimiter, quoting=quoting)
+        writer.writeheader()
+        writer.writerows(rows)
+    os.replace(temp_path, path)
+    return changed
+
+
+def migrate_catalogs(id_map, installer_catalogs, other_catalogs=()):
+    """
+    Rewrite the catalogs of one older run so every row uses the stable record id.
+
+    Installer catalogs provide the id -> profile URL pairs; media and review
+    catalogs only carry company_id, which is translated through those pairs.
+    The ids are scoped to the run's installer catalog, so migrate one run per
+    call. A run is migrated once: its catalogs then hold supplier ids, which
+    a second pass would mistake for positional ids.
+
+    Args:
+        id_map: SupplierIdMap that receives the legacy ids
+        installer_catalogs: The run's installer CSV and/or TSV (id and profile_url columns)
+        other_catalogs: The run's media/review catalog paths (company_id column)
+
+    Returns:
+        Dictionary mapping each path to the number of rows rewritten
+
+    Raises:
+        ValueError: If the installer catalogs belong to different runs, or the run was already migrated
+    """
+    scopes = {legacy_scope(path) for path in installer_catalogs}
+    if len(scopes) != 1:
+        raise ValueError(f"Installer catalogs of more than one run: {', '.join(sorted(scopes))}; "
+                         f"migrate one run at a time")
+    scope = scopes.pop()
+    if scope in id_map.migrated:
+        raise ValueError(f"{scope} was already migrated to stable ids")
+
+    # Collect every legacy pair before rewriting anything, so the TSV copy still maps
+    for path in installer_catalogs:
+        delimiter, _ = _catalog_format(path)
+        with open(path, 'r', newline='', encoding='utf-8-sig') as f:
+            for row in csv.DictReader(f, delimiter=delimiter):
+                if row.get('id') and row.get('profile_url'):
+                    id_map.remember_legacy(row['id'], row['profile_url'], scope)
+
+    changed = {}
+    for path in installer_catalogs:
+        changed[path] = _rewrite_catalog(path, 'id', lambda row: id_map.id_for(row['profile_url']))
+    for path in other_catalogs:
+        changed[path] = _rewrite_catalog(path, 'company_id', lambda row: id_map.resolve(row['company_id'], scope))
+    id_map.mark_migrated(scope)
+    id_map.save()
+    return changed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Rewrite catalogs from older runs to supplier-id keys")
+    parser.add_argument('installer_catalogs', nargs='+',
+                        help="Installer CSV and/or TSV of one run, with id and profile_url")
+    parser.add_argument('--catalog', action='append', default=[],
+                        help="Media or review catalog of the same run to rewrite (company_id column); may be repeated")
+    parser.add_argument('--id-map', default=DEFAULT_ID_MAP, help="Persistent id map file")
+    args = parser.parse_args()
+
+    with SupplierIdMap(args.id_map) as id_map:
+        try:
+            changed = migrate_catalogs(id_map, args.installer_catalogs, args.catalog)
+        except ValueError as e:
+            print(f"Not migrating: {e}")
+            return
+    for path, count in changed.items():
+        print(f"{path}: {count} rows rewritten")
+    print(f"Legacy ids recorded in {args.id_map}: {sum(len(ids) for ids in id_map.legacy.values())}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,375 @@
+import argparse
+import csv
+import json
+import os
+import socket
+import sqlite3
+import time
+
+from crawl_frontier import DEFAULT_CRAWL_STATE, CrawlFrontier, CrawlState
+from output_sinks import CatalogFile, INSTALLER_FIELDNAMES, MEDIA_FIELDNAMES, REVIEW_FIELDNAMES, serialize_row
+from search_index import review_key
+from supplier_ids import SupplierIdMap
+
+DEFAULT_QUEUE = 'crawl_queue.db'
+
+# Seconds a worker owns a job before another worker may take it over
+DEFAULT_VISIBILITY_TIMEOUT = 900
+
+# A job that has been leased this many times without completing is parked as failed
+DEFAULT_MAX_ATTEMPTS = 3
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS jobs (
+    job_id        TEXT PRIMARY KEY,
+    company_id    INTEGER NOT NULL,
+    payload       TEXT NOT NULL,
+    state         TEXT NOT NULL DEFAULT 'pending',
+    attempts      INTEGER NOT NULL DEFAULT 0,
+    lease_owner   TEXT,
+    lease_expires REAL,
+    last_error    TEXT,
+    enqueued_at   REAL NOT NULL,
+    completed_at  REAL
+);
+CREATE INDEX IF NOT EXISTS idx_jobs_state ON jobs(state, lease_expires);
+"""
+
+PENDING = 'pending'
+LEASED = 'leased'
+DONE = 'done'
+FAILED = 'failed'
+
+
+def default_worker_id():
+    """Host name plus process id, unique across the machines sharing a queue"""
+    return f"{socket.gethostname()}-{os.getpid()}"
+
+
+class Job:
+    """One leased installer job"""
+
+    def __init__(self, job_id, company_id, payload, attempts):
+        self.job_id = job_id
+        self.company_id = company_id
+        self.payload = payload
+        self.attempts = attempts
+
+    def __repr__(self):
+        return f"Job({self.job_id!r}, attempt {self.attempts})"
+
+
+class WorkQueue:
+    """
+    Durable installer job queue with at-least-once leases.
+
+    A worker leases a job for `visibility_timeout` seconds. If it does not
+    complete (or renew) the job in time, the lease expires and the job
+    goes to the next worker, so a crashed worker never loses a job. Because
+    the same job may then run twice, completion is idempotent and catalogs
+    written by different workers are merged with deduplication (see
+    merge_catalogs).
+
+    The queue is a single SQLite file. Workers on several machines can
+    share it over a network filesystem with working file locks. For that
+    reason it uses the rollback journal: WAL needs shared memory, which
+    does not work across hosts.
+    """
+
+    def __init__(self, db_path=DEFAULT_QUEUE, visibility_timeout=DEFAULT_VISIBILITY_TIMEOUT,
+                 max_attempts=DEFAULT_MAX_ATTEMPTS):
+        self.db_path = db_path
+        self.visibility_timeout = visibility_timeout
+        self.max_attempts = max_attempts
+        # Autocommit mode, so lease() can take the write lock up front with BEGIN IMMEDIATE
+        self.conn = sqlite3.connect(db_path, timeout=60, isolation_level=None)
+        self.conn.row_factory = sqlite3.Row
+        self.conn.execute("PRAGMA journal_mode=DELETE")
+        self.conn.executescript(SCHEMA)
+
+    def enqueue(self, installers, id_map=None):
+        """
+        Queue one job per installer, in the order given.
+
+        Installers whose job is done or failed are queued again with a fresh
+        payload and attempt count, so a recurring enqueue of the same listing
+        re-crawls it. Pending and leased jobs are left alone.
+
+        Args:
+            installers: Iterable of listing rows with at least company_name and profile_url
+            id_map: SupplierIdMap used to key the jobs
+
+        Returns:
+            Number of jobs queued (new or re-queued)
+        """
+        id_map = id_map or SupplierIdMap()
+        now = time.time()
+        rows = []
+        for position, installer in enumerate(installers):
+            company_id = id_map.id_for(installer['profile_url'])
+            # Leases go by enqueued_at, so spacing the times keeps the order given (e.g. the frontier's)
+            rows.append((f"installer:{company_id}", company_id, json.dumps(dict(installer)), now + position * 1e-6))
+
+        before = self.conn.total_changes
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            self.conn.executemany(
+                "INSERT INTO jobs (job_id, company_id, payload, enqueued_at) VALUES (?, ?, ?, ?) "
+                "ON CONFLICT(job_id) DO UPDATE SET state = ?, attempts = 0, payload = excluded.payload, "
+                "enqueued_at = excluded.enqueued_at, lease_owner = NULL, lease_expires = NULL, last_error = NULL "
+                "WHERE state IN (?, ?)",
+                [row + (PENDING, DONE, FAILED) for row in rows]
+            )
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        return self.conn.total_changes - before
+
+    def lease(self, worker_id):
+        """
+        Take the next available job: pending, or leased with an expired lease.
+
+        Args:
+            worker_id: Identity of the worker taking the job
+
+        Returns:
+            Job, or None if nothing is available right now
+        """
+        now = time.time()
+        self.conn.execute("BEGIN IMMEDIATE")
+        try:
+            # Expired leases that used up their attempts are parked instead of handed out again
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, last_error = COALESCE(last_error, 'lease expired') "
+                "WHERE state = ? AND lease_expires < ? AND attempts >= ?",
+                (FAILED, LEASED, now, self.max_attempts)
+            )
+            row = self.conn.execute(
+                "SELECT job_id, company_id, payload, attempts FROM jobs "
+                "WHERE state = ? OR (state = ? AND lease_expires < ?) "
+                "ORDER BY attempts, enqueued_at, rowid LIMIT 1",
+                (PENDING, LEASED, now)
+            ).fetchone()
+            if row is None:
+                self.conn.execute("COMMIT")
+                return None
+            self.conn.execute(
+                "UPDATE jobs SET state = ?, attempts = attempts + 1, lease_owner = ?, lease_expires = ? "
+                "WHERE job_id = ?",
+                (LEASED, worker_id, now + self.visibility_timeout, row['job_id'])
+            )
+        except Exception:
+            self.conn.execute("ROLLBACK")
+            raise
+        self.conn.execute("COMMIT")
+        return Job(row['job_id'], row['company_id'], json.loads(row['payload']), row['attempts'] + 1)
+
+    def renew(self, job, worker_id):
+        """Extend a lease this worker still holds; returns False if the job was taken over"""
+        cursor = self.conn.execute(
+            "UPDATE jobs SET lease_expires = ? WHERE job_id = ? AND state = ? AND lease_owner = ?",
+            (time.time() + self.visibility_timeout, job.job_id, LEASED, worker_id)
+        )
+        return cursor.rowcount == 1
+
+    def complete(self, job):
+        """
+        Mark a job done. Safe to call more than once, and by a worker whose lease expired.
+
+        Returns:
+            True if this call completed the job, False if it was already done
+        """
+        cursor = self.conn.execute(
+            "UPDATE jobs SET state = ?, completed_at = ?, last_error = NULL WHERE job_id = ? AND state != ?",
+            (DONE, time.time(), job.job_id, DONE)
+        )
+        return cursor.rowcount == 1
+
+    def fail(self, job, worker_id, error):
+        """Give a job back after an error; it is retried until max_attempts, then parked as failed"""
+        self.conn.execute(
+            "UPDATE jobs SET state = CASE WHEN attempts >= ? THEN ? ELSE ? END, "
+            "lease_owner = NULL, lease_expires = NULL, last_error = ? "
+            "WHERE job_id = ? AND state = ? AND lease_owner = ?",
+            (self.max_attempts, FAILED, PENDING, str(error)[:500], job.job_id, LEASED, worker_id)
+        )
+
+    def requeue_failed(self):
+        """Give parked jobs a fresh set of attempts; returns the number requeued"""
+        cursor = self.conn.execute(
+            "UPDATE jobs SET state = ?, attempts = 0, lease_owner = NULL, lease_expires = NULL WHERE state = ?",
+            (PENDING, FAILED)
+        )
+        return cursor.rowcount
+
+    def counts(self):
+        """Number of jobs in each state; leases that have expired count as pending"""
+        counts = {PENDING: 0, LEASED: 0, DONE: 0, FAILED: 0}
+        rows = self.conn.execute(
+            "SELECT CASE WHEN state = ? AND lease_expires < ? THEN ? ELSE state END AS s, COUNT(*) "
+            "FROM jobs GROUP BY s",
+            (LEASED, time.time(), PENDING)
+        )
+        for state, count in rows:
+            counts[state] = counts.get(state, 0) + count
+        return counts
+
+    def close(self):
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+        return False
+
+
+def _iter_catalog(path):
+    delimiter = '\t' if path.endswith('.tsv') else ','
+    with open(path, 'r', newline='', encoding='utf-8-sig') as file:
+        for row in csv.DictReader(file, delimiter=delimiter):
+            yield row
+
+
+def _media_key(row):
+    return (row.get('company_id'), row.get('media_type'), row.get('video_url') or row.get('url') or row.get('media_id'))
+
+
+# Endings of the catalog files a worker writes (all_<worker>_installer_details.csv, ...)
+CATALOG_SUFFIXES = ('_installer_details.csv', '_installer_details.tsv', '_media_catalog.csv', '_reviews_catalog.csv')
+
+
+def catalog_run(path):
+    """Name shared by the catalogs one worker wrote: the path without its catalog suffix"""
+    for suffix in CATALOG_SUFFIXES:
+        if path.endswith(suffix):
+            return path[:-len(suffix)]
+    return path
+
+
+def merge_catalogs(installer_catalogs, media_catalogs, review_catalogs, output_name='merged', output_dir='.'):
+    """
+    Merge the catalogs written by several workers into one set.
+
+    Jobs run at least once, so the same installer can show up in more than
+    one worker's output. For every installer id one worker's output wins (the
+    last installer catalog that has it), and the installer row, media and
+    reviews are all taken from that worker, so a merged installer never mixes
+    a row from one crawl with media or reviews from another. Within the
+    winning worker, media are deduplicated by URL and reviews by their stable
+    fingerprint. Catalogs are matched to their worker by file name
+    (all_<worker>_media_catalog.csv goes with all_<worker>_installer_details.csv).
+
+    Args:
+        installer_catalogs: Installer CSV/TSV files from the workers
+        media_catalogs: Media catalog CSVs from the workers
+        review_catalogs: Review catalog CSVs from the workers
+        output_name: Name used in all_<name>_installer_details.csv/.tsv
+        output_dir: Directory for the merged catalogs
+
+    Returns:
+        Dictionary with the number of installers, media items and reviews written
+
+    Raises:
+        ValueError: If a media or review catalog has no installer catalog from the same worker
+    """
+    installers = {}
+    winning_run = {}
+    for path in installer_catalogs:
+        for row in _iter_catalog(path):
+            installers[row['id']] = row
+            winning_run[row['id']] = catalog_run(path)
+
+    installer_runs = {catalog_run(path) for path in installer_catalogs}
+    for path in list(media_catalogs) + list(review_catalogs):
+        if catalog_run(path) not in installer_runs:
+            raise ValueError(f"No installer catalog from the same worker as {path}")
+
+    media = {}
+    for path in media_catalogs:
+        run = catalog_run(path)
+        for row in _iter_catalog(path):
+            if winning_run.get(row['company_id']) == run:
+                media[_media_key(row)] = row
+
+    reviews = {}
+    for path in review_catalogs:
+        run = catalog_run(path)
+        for row in _iter_catalog(path):
+            if winning_run.get(row['company_id']) == run:
+                reviews[review_key(row)] = row
+
+    outputs = [
+        (f'all_{output_name}_installer_details.csv', INSTALLER_FIELDNAMES, ',', csv.QUOTE_ALL, installers),
+        (f'all_{output_name}_installer_details.tsv', INSTALLER_FIELDNAMES, '\t', csv.QUOTE_MINIMAL, installers),
+        (f'all_{output_name}_media_catalog.csv', MEDIA_FIELDNAMES, ',', csv.QUOTE_ALL, media),
+        (f'all_{output_name}_reviews_catalog.csv', REVIEW_FIELDNAMES, ',', csv.QUOTE_ALL, reviews),
+    ]
+    for filename, fieldnames, delimiter, quoting, rows in outputs:
+        path = os.path.join(output_dir, filename)
+        temp_path = f"{path}.tmp"
+        if os.path.exists(temp_path):
+            os.remove(temp_path)
+        catalog = CatalogFile(temp_path, fieldnames, delimiter=delimiter, quoting=quoting)
+        for row in rows.values():
+            catalog.write_values(serialize_row(row, fieldnames))
+        catalog.close()
+        os.replace(temp_path, path)
+        print(f"Wrote {len(rows)} rows to {path}")
+
+    return {'installers': len(installers), 'media': len(media), 'reviews': len(reviews)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Manage the distributed crawl queue")
+    parser.add_argument('--queue', default=DEFAULT_QUEUE, help="Queue database (shared by all workers)")
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    enqueue_parser = subparsers.add_parser('enqueue', help="Queue every installer of a listing CSV")
+    enqueue_parser.add_argument('listing_csv', help="e.g. massachusetts_solar_installers.csv")
+    enqueue_parser.add_argument('--prioritize', action='store_true',
+                                help="Queue stale and recently active installers first (see crawl_frontier.py)")
+    enqueue_parser.add_argument('--crawl-state', default=DEFAULT_CRAWL_STATE, help="Crawl state database")
+
+    subparsers.add_parser('status', help="Show job counts")
+    subparsers.add_parser('requeue-failed', help="Retry jobs that used up their attempts")
+
+    merge_parser = subparsers.add_parser('merge', help="Merge worker catalogs into one deduplicated set")
+    merge_parser.add_argument('--installers', nargs='+', required=True, help="Worker installer CSV/TSV files")
+    merge_parser.add_argument('--media', nargs='*', default=[], help="Worker media catalogs")
+    merge_parser.add_argument('--reviews', nargs='*', default=[], help="Worker review catalogs")
+    merge_parser.add_argument('--output-name', default='merged')
+    merge_parser.add_argument('--output-dir', default='.')
+
+    args = parser.parse_args()
+
+    if args.command == 'merge':
+        totals = merge_catalogs(args.installers, args.media, args.reviews, args.output_name, args.output_dir)
+        print(f"Merged {totals['installers']} installers, {totals['media']} media items, "
+              f"{totals['reviews']} reviews")
+        return
+
+    with WorkQueue(args.queue) as queue:
+        if args.command == 'enqueue':
+            with SupplierIdMap() as id_map:
+                installers = _iter_catalog(args.listing_csv)
+                if args.prioritize:
+                    with CrawlState(args.crawl_state) as crawl_state:
+                        frontier = CrawlFrontier(crawl_state, id_map)
+                        frontier.add_all(installers)
+                        installers = [installer for _, installer, _ in frontier.drain()]
+                added = queue.enqueue(installers, id_map)
+            print(f"Queued {added} installer jobs (new or finished ones again) in {os.path.abspath(args.queue)}")
+        elif args.command == 'requeue-failed':
+            print(f"Requeued {queue.requeue_failed()} failed jobs")
+        counts = queue.counts()
+        print(f"Jobs: {counts[PENDING]} pending, {counts[LEASED]} leased, "
+              f"{counts[DONE]} done, {counts[FAILED]} failed")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+import queue
+import threading
+from contextlib import contextmanager
+
+
+class WorkerResources:
+    """
+    Pool of expensive resources (e.g. browsers) shared by the tasks of worker threads.
+
+    A task checks a resource out for its duration and hands it back after,
+    so resources are created only when every existing one is busy. The pool
+    never holds more resources than tasks ever ran at the same time, even
+    when several executors use it one after another.
+
+    Usage:
+        resources = WorkerResources(create_driver, lambda driver: driver.quit())
+        ... with resources.checkout() as driver: ... inside a task ...
+        resources.close_all()
+    """
+
+    def __init__(self, factory, close=None):
+        self.factory = factory
+        self.close = close
+        self._idle = queue.Queue()
+        self._created = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def checkout(self):
+        """Lend an idle resource (or a new one if all are busy) for the duration of the with block"""
+        try:
+            resource = self._idle.get_nowait()
+        except queue.Empty:
+            resource = self.factory()
+            with self._lock:
+                self._created.append(resource)
+        try:
+            yield resource
+        finally:
+            self._idle.put(resource)
+
+    def close_all(self):
+        with self._lock:
+            created, self._created = self._created, []
+        self._idle = queue.Queue()
+        for resource in created:
+            try:
+                if self.close:
+                    self.close(resource)
+            except Exception as e:
+                print(f"Error closing worker resource: {e}")